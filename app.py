@@ -5,13 +5,11 @@ Deploy su Railway con IP statico
 Supporto: BackMarket, Refurbed, CDiscount, Magento
 """
 
-from flask import Flask, request, jsonify, send_file
-import pandas as pd
+from flask import Flask, Response, request, jsonify, stream_with_context
+from functools import wraps
 import os
 from datetime import datetime
-from io import BytesIO
 import logging
-import requests
 
 # Import moduli locali
 from config import (
@@ -21,19 +19,35 @@ from config import (
     MAGENTO_URL, MAGENTO_TOKEN,
     INVOICEX_CONFIG,
     INVOICEX_API_URL, INVOICEX_API_KEY,
-    ANASTASIA_DB_CONFIG, ANASTASIA_URL
+    ANASTASIA_DB_CONFIG, ANASTASIA_URL,
+    TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID
 )
 from clients import BackMarketClient, RefurbishedClient, OctopiaClient
 from clients.invoicex_api import InvoiceXAPIClient
 from clients.magento_api import MagentoAPIClient
 from clients.anastasia_api import AnastasiaClient
+from clients.telegram import TelegramClient
+from clients.transport import get_all_metrics as get_http_metrics
 from services import (
-    get_pending_orders, 
-    disable_product_on_channels,
+    fetch_pending_orders,
+    disable_products_on_channels,
 )
 from services.ddt_service import DDTService
 from services.magento_service import MagentoService
 from services.automation_service import AutomationService
+from services.order_cache import OrderCache
+from services.ticket_snapshot import TicketSnapshotService
+from services.telegram_notifier import TelegramNotifier
+from services.registry import ServiceRegistry
+from services.event_broker import EventBroker, TooManySubscribers
+from services.dashboard_feed import DashboardFeed
+from utils.packlink_csv import iter_packlink_csv, packlink_rows
+from utils.static_assets import (
+    StaticBundle,
+    IMMUTABLE_CACHE,
+    REVALIDATE_CACHE,
+    make_response_for as make_asset_response
+)
 from apscheduler.schedulers.background import BackgroundScheduler
 
 # Configurazione logging
@@ -43,7 +57,10 @@ logger = logging.getLogger(__name__)
 # ============================================================================
 # INIZIALIZZAZIONE FLASK APP
 # ============================================================================
-app = Flask(__name__)
+app = Flask(__name__, static_folder=None)
+
+# Asset dashboard (static/ + templates/dashboard.html) serviti dalla memoria
+static_bundle = StaticBundle(os.path.join(app.root_path, 'static'))
 
 # Scheduler globale per automazione
 scheduler = None
@@ -52,31 +69,35 @@ scheduler = None
 # INIZIALIZZAZIONE CLIENTS
 # ============================================================================
 
-# Inizializza clients marketplace
-bm_client = BackMarketClient(BACKMARKET_TOKEN, BACKMARKET_BASE_URL)
-rf_client = RefurbishedClient(REFURBED_TOKEN, REFURBED_BASE_URL)
-oct_client = OctopiaClient(OCTOPIA_CLIENT_ID, OCTOPIA_CLIENT_SECRET, OCTOPIA_SELLER_ID)
-logger.info("✅ Clients marketplace inizializzati")
+# I client vengono costruiti al primo utilizzo o dal warm-up in background:
+# l'import di app.py non apre connessioni verso gli upstream
+registry = ServiceRegistry()
+registry.register('backmarket', lambda: BackMarketClient(BACKMARKET_TOKEN, BACKMARKET_BASE_URL))
+registry.register('refurbed', lambda: RefurbishedClient(REFURBED_TOKEN, REFURBED_BASE_URL))
+registry.register('octopia', lambda: OctopiaClient(OCTOPIA_CLIENT_ID, OCTOPIA_CLIENT_SECRET, OCTOPIA_SELLER_ID))
+registry.register('magento', lambda: MagentoAPIClient(MAGENTO_URL, MAGENTO_TOKEN))
+registry.register('invoicex', lambda: InvoiceXAPIClient(base_url=INVOICEX_API_URL, api_key=INVOICEX_API_KEY))
+# Anastasia alimenta solo il widget ticket: non blocca la readiness
+registry.register('anastasia', lambda: AnastasiaClient(ANASTASIA_DB_CONFIG), required=False)
+
+bm_client = registry.lazy('backmarket')
+rf_client = registry.lazy('refurbed')
+oct_client = registry.lazy('octopia')
+magento_client = registry.lazy('magento')
+invoicex_api_client = registry.lazy('invoicex')
+anastasia_client = registry.lazy('anastasia')
 
-# Inizializza Magento client
-magento_client = MagentoAPIClient(MAGENTO_URL, MAGENTO_TOKEN)
 magento_service = MagentoService(magento_client)
-logger.info("✅ MagentoService inizializzato")
 
-# Inizializza InvoiceX API client
-invoicex_api_client = InvoiceXAPIClient(
-    base_url=INVOICEX_API_URL,
-    api_key=INVOICEX_API_KEY
-)
-logger.info("✅ InvoiceX client inizializzato")
+# Snapshot ticket condiviso da tutte le schede della dashboard
+ticket_snapshot = TicketSnapshotService(anastasia_client)
 
-# Inizializza Anastasia client
-try:
-    anastasia_client = AnastasiaClient(ANASTASIA_DB_CONFIG)
-    logger.info("✅ Client Anastasia inizializzato")
-except Exception as e:
-    logger.error(f"❌ Errore inizializzazione Anastasia: {e}")
-    anastasia_client = None
+# Notifiche Telegram: coda + worker in background
+telegram_client = TelegramClient(TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID)
+telegram_notifier = TelegramNotifier(telegram_client)
+if telegram_notifier.configured:
+    telegram_notifier.start()
+    logger.info("✅ Notifiche Telegram attive")
 
 # ============================================================================
 # INIZIALIZZAZIONE SERVICES (ORDINE IMPORTANTE!)
@@ -86,6 +107,19 @@ except Exception as e:
 ddt_service = DDTService(invoicex_api_client)
 logger.info("✅ DDTService inizializzato")
 
+# Cache ordini condivisa tra dashboard, API e CSV
+order_cache = OrderCache(
+    lambda: fetch_pending_orders(
+        bm_client, rf_client, oct_client, magento_service,
+        raw_order_sink=order_service.remember_raw_orders
+    )
+)
+logger.info("✅ OrderCache inizializzata")
+
+# Stream SSE della dashboard: differenze ordini/ticket al posto del polling
+event_broker = EventBroker()
+dashboard_feed = DashboardFeed(event_broker, order_cache, ticket_snapshot)
+
 # Order Service (usa la nuova classe)
 from services.order_service import OrderService
 from utils.order_tracker import OrderTracker
@@ -100,7 +134,9 @@ order_service = OrderService(
     magento_client=magento_client,
     octopia_client=oct_client,
     anastasia_client=anastasia_client,
-    order_tracker=order_tracker  # ✅ PASSA IL TRACKER
+    order_tracker=order_tracker,  # ✅ PASSA IL TRACKER
+    order_cache=order_cache,
+    magento_service=magento_service
 )
 logger.info("✅ OrderService inizializzato")
 
@@ -110,15 +146,42 @@ automation_service = AutomationService(
     refurbed_client=rf_client,
     magento_service=magento_service,
     ddt_service=ddt_service,
-    order_service=order_service
+    order_service=order_service,
+    notifier=telegram_notifier
 )
 logger.info("✅ AutomationService inizializzato")
 
+# Warm-up in background: client, poi indice DDT e snapshot ticket
+registry.warm_up(extra=[ddt_service.warm_index, ticket_snapshot.start, dashboard_feed.start])
+
 
 # ============================================================================
 # FUNZIONI UTILITY
 # ============================================================================
 
+def run_automation() -> dict:
+    """Esegue un giro di automazione e invalida la cache ordini"""
+    try:
+        return automation_service.process_all_pending_orders()
+    finally:
+        order_cache.invalidate('automazione')
+        dashboard_feed.poke()
+
+
+def invalidates_order_cache(func):
+    """Decoratore per le azioni che modificano un ordine: se la risposta
+    è un successo (status < 400) invalida la cache ordini"""
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        response = func(*args, **kwargs)
+        status = response[1] if isinstance(response, tuple) else getattr(response, 'status_code', 200)
+        if status < 400:
+            order_cache.invalidate(func.__name__)
+            dashboard_feed.poke()
+        return response
+    return wrapper
+
+
 def generate_tracking_url(carrier: str, tracking_number: str) -> str:
     """Genera l'URL di tracking completo basato sul corriere"""
     carrier = carrier.upper().strip()
@@ -178,46 +241,65 @@ def get_payment_label(payment_method: str) -> str:
 
 
 def send_telegram_order_confirmed(order: dict, ddt_number: str):
-    """Notifica Telegram quando ordine pending viene confermato"""
-    token = os.getenv("TELEGRAM_BOT_TOKEN")
-    chat_id = os.getenv("TELEGRAM_CHAT_ID")
-    
-    if not token or not chat_id:
-        return
-    
-    try:
-        message = (
-            f"✅ *Ordine confermato!*\n\n"
-            f"🔢 Ordine: `{order.get('order_id', 'N/A')}`\n"
-            f"👤 Cliente: {order.get('customer_name', 'N/A')}\n"
-            f"💰 Totale: €{order.get('total', 0):.2f}\n"
-            f"📄 DDT: `{ddt_number}`\n\n"
-            f"_Prodotti disabilitati su tutti i canali_"
-        )
-        
-        url = f"https://api.telegram.org/bot{token}/sendMessage"
-        requests.post(url, json={
-            "chat_id": chat_id,
-            "text": message,
-            "parse_mode": "Markdown"
-        }, timeout=10)
-    except Exception as e:
-        logger.error(f"Errore notifica Telegram: {e}")
+    """Notifica Telegram quando ordine pending viene confermato (accodata, non blocca)"""
+    message = (
+        f"✅ *Ordine confermato!*\n\n"
+        f"🔢 Ordine: `{order.get('order_id', 'N/A')}`\n"
+        f"👤 Cliente: {order.get('customer_name', 'N/A')}\n"
+        f"💰 Totale: €{order.get('total', 0):.2f}\n"
+        f"📄 DDT: `{ddt_number}`\n\n"
+        f"_Prodotti disabilitati su tutti i canali_"
+    )
+    telegram_notifier.notify(message)
 
 
 # ============================================================================
 # API ANASTASIA TICKETS
 # ============================================================================
 
+def _ticket_snapshot_or_error():
+    """Snapshot ticket corrente, oppure (None, risposta di errore)"""
+    snapshot = ticket_snapshot.get()
+    if snapshot is None:
+        return None, (jsonify({'error': 'Database Anastasia non raggiungibile'}), 503)
+    
+    return snapshot, None
+
+
+@app.route('/api/tickets/snapshot')
+def api_tickets_snapshot():
+    """API: statistiche + ticket aperti + chiusi oggi (snapshot condiviso, ETag/304)"""
+    try:
+        snapshot, error = _ticket_snapshot_or_error()
+        if error:
+            return error
+        
+        data = snapshot['data']
+        response = jsonify({
+            'success': True,
+            'stats': data['stats'],
+            'open_tickets': data['open_tickets'],
+            'closed_today': data['closed_today'],
+            'generated_at': snapshot['generated_at']
+        })
+        # Il browser rivalida con If-None-Match: se nulla è cambiato 304 senza body
+        response.set_etag(snapshot['etag'], weak=True)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response.make_conditional(request)
+    except Exception as e:
+        logger.error(f"Errore API tickets snapshot: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
 @app.route('/api/tickets/stats')
 def api_tickets_stats():
     """API: Statistiche ticket Anastasia"""
     try:
-        if not anastasia_client:
-            return jsonify({'error': 'Client Anastasia non disponibile'}), 503
+        snapshot, error = _ticket_snapshot_or_error()
+        if error:
+            return error
         
-        stats = anastasia_client.get_ticket_stats()
-        return jsonify(stats)
+        return jsonify(snapshot['data']['stats'])
     except Exception as e:
         logger.error(f"Errore API tickets stats: {e}")
         return jsonify({'error': str(e)}), 500
@@ -227,11 +309,16 @@ def api_tickets_stats():
 def api_tickets_open():
     """API: Lista ultimi ticket aperti"""
     try:
-        if not anastasia_client:
-            return jsonify({'error': 'Client Anastasia non disponibile'}), 503
-        
         limit = request.args.get('limit', 10, type=int)
-        tickets = anastasia_client.get_open_tickets(limit=limit)
+        
+        if limit > ticket_snapshot.open_limit:
+            # Oltre quanto tiene lo snapshot: query diretta
+            tickets = anastasia_client.get_open_tickets(limit=limit)
+        else:
+            snapshot, error = _ticket_snapshot_or_error()
+            if error:
+                return error
+            tickets = snapshot['data']['open_tickets'][:limit]
         
         return jsonify({
             'success': True,
@@ -247,10 +334,11 @@ def api_tickets_open():
 def api_tickets_closed_today():
     """API: Lista ticket chiusi oggi"""
     try:
-        if not anastasia_client:
-            return jsonify({'error': 'Client Anastasia non disponibile'}), 503
+        snapshot, error = _ticket_snapshot_or_error()
+        if error:
+            return error
         
-        tickets = anastasia_client.get_recent_closed_tickets(limit=5)
+        tickets = snapshot['data']['closed_today']
         
         return jsonify({
             'success': True,
@@ -260,1053 +348,50 @@ def api_tickets_closed_today():
     except Exception as e:
         logger.error(f"Errore API tickets closed today: {e}")
         return jsonify({'error': str(e)}), 500
+
+
+@app.route('/static/<path:filename>')
+def static_asset(filename):
+    """Asset della dashboard: URL con fingerprint, precompressi, cache immutabile"""
+    variant, fingerprinted = static_bundle.resolve(filename)
+    if variant is None:
+        return jsonify({'error': 'Not found'}), 404
+    # Fingerprint vecchio o assente: contenuto attuale ma senza cache a lungo termine
+    cache_control = IMMUTABLE_CACHE if fingerprinted else REVALIDATE_CACHE
+    return make_asset_response(variant, request, cache_control)
+
+
 @app.route('/')
 def dashboard():
     """Dashboard principale con tabella ordini + widget Anastasia"""
-    
-    html = """
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <title>ReflexMania - Gestione Unificata</title>
-        <meta charset="utf-8">
-        <meta name="viewport" content="width=device-width, initial-scale=1">
-        <style>
-            * { margin: 0; padding: 0; box-sizing: border-box; }
-            
-            body { 
-                font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Arial, sans-serif;
-                background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-                min-height: 100vh;
-                padding: 20px;
-            }
-            
-            .container { 
-                max-width: 1600px; 
-                margin: 0 auto; 
-            }
-            
-            .header {
-                background: rgba(255,255,255,0.95);
-                backdrop-filter: blur(10px);
-                padding: 30px;
-                border-radius: 16px;
-                margin-bottom: 20px;
-                box-shadow: 0 8px 32px rgba(0,0,0,0.1);
-            }
-            
-            .header h1 { 
-                color: #333; 
-                font-size: 32px;
-                margin-bottom: 10px;
-                font-weight: 700;
-            }
-            
-            .header-subtitle {
-                color: #666;
-                font-size: 14px;
-            }
-            
-            .main-grid {
-                display: grid;
-                grid-template-columns: 1fr 380px;
-                gap: 20px;
-                margin-bottom: 20px;
-            }
-            
-            @media (max-width: 1200px) {
-                .main-grid {
-                    grid-template-columns: 1fr;
-                }
-            }
-            
-            .stats {
-                display: grid;
-                grid-template-columns: repeat(auto-fit, minmax(150px, 1fr));
-                gap: 15px;
-                margin-bottom: 20px;
-            }
-            
-            .stat-card {
-                background: rgba(255,255,255,0.95);
-                backdrop-filter: blur(10px);
-                padding: 20px;
-                border-radius: 12px;
-                box-shadow: 0 4px 16px rgba(0,0,0,0.1);
-                transition: transform 0.2s;
-            }
-            
-            .stat-card:hover {
-                transform: translateY(-4px);
-                box-shadow: 0 8px 24px rgba(0,0,0,0.15);
-            }
-            
-            .stat-card h3 {
-                color: #666;
-                font-size: 12px;
-                margin-bottom: 8px;
-                text-transform: uppercase;
-                letter-spacing: 0.5px;
-                font-weight: 600;
-            }
-            
-            .stat-card .number {
-                font-size: 36px;
-                font-weight: 700;
-                background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-                -webkit-background-clip: text;
-                -webkit-text-fill-color: transparent;
-                background-clip: text;
-            }
-            
-            .orders-section {
-                background: rgba(255,255,255,0.95);
-                backdrop-filter: blur(10px);
-                border-radius: 16px;
-                padding: 25px;
-                box-shadow: 0 8px 32px rgba(0,0,0,0.1);
-            }
-            
-            .section-header {
-                display: flex;
-                justify-content: space-between;
-                align-items: center;
-                margin-bottom: 20px;
-            }
-            
-            .section-header h2 {
-                font-size: 24px;
-                color: #333;
-                font-weight: 700;
-            }
-            
-            .actions {
-                display: flex;
-                gap: 10px;
-            }
-            
-            .btn {
-                padding: 10px 20px;
-                border: none;
-                border-radius: 8px;
-                cursor: pointer;
-                font-size: 14px;
-                font-weight: 600;
-                transition: all 0.3s;
-                display: inline-flex;
-                align-items: center;
-                gap: 8px;
-            }
-            
-            .btn-primary { 
-                background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-                color: white; 
-            }
-            
-            .btn-primary:hover { 
-                transform: translateY(-2px);
-                box-shadow: 0 4px 12px rgba(102, 126, 234, 0.4);
-            }
-            
-            .btn-success { 
-                background: linear-gradient(135deg, #11998e 0%, #38ef7d 100%);
-                color: white; 
-            }
-            
-            .btn-success:hover { 
-                transform: translateY(-2px);
-                box-shadow: 0 4px 12px rgba(17, 153, 142, 0.4);
-            }
-            
-            .btn-small { 
-                padding: 6px 12px; 
-                font-size: 12px; 
-            }
-            
-            table {
-                width: 100%;
-                background: white;
-                border-radius: 12px;
-                overflow: hidden;
-            }
-            
-            th {
-                background: #f8f9fa;
-                padding: 15px;
-                text-align: left;
-                font-weight: 600;
-                color: #333;
-                font-size: 13px;
-                text-transform: uppercase;
-                letter-spacing: 0.5px;
-                border-bottom: 2px solid #e9ecef;
-            }
-            
-            td {
-                padding: 15px;
-                border-bottom: 1px solid #f1f3f5;
-            }
-            
-            tr:hover { 
-                background: #f8f9fa; 
-            }
-            
-            .badge {
-                display: inline-block;
-                padding: 4px 10px;
-                border-radius: 6px;
-                font-size: 11px;
-                font-weight: 700;
-                text-transform: uppercase;
-                letter-spacing: 0.5px;
-            }
-            
-            .badge-backmarket { background: #e3f2fd; color: #1976d2; }
-            .badge-refurbed { background: #f3e5f5; color: #7b1fa2; }
-            .badge-cdiscount { background: #fff3e0; color: #f57c00; }
-            .badge-magento { background: #ffe0e0; color: #c62828; }
-            .badge-accepted { background: #d4edda; color: #155724; }
-            .badge-pending { background: #fff3cd; color: #856404; }
-            
-            .anastasia-widget {
-                background: rgba(255,255,255,0.95);
-                backdrop-filter: blur(10px);
-                border-radius: 16px;
-                padding: 25px;
-                box-shadow: 0 8px 32px rgba(0,0,0,0.1);
-                height: fit-content;
-                position: sticky;
-                top: 20px;
-            }
-            
-            .widget-header {
-                display: flex;
-                align-items: center;
-                gap: 12px;
-                margin-bottom: 20px;
-            }
-            
-            .widget-header h2 {
-                font-size: 24px;
-                color: #333;
-                font-weight: 700;
-            }
-            
-            .widget-icon {
-                font-size: 32px;
-            }
-            
-            .ticket-stats {
-                display: grid;
-                grid-template-columns: 1fr 1fr;
-                gap: 12px;
-                margin-bottom: 20px;
-            }
-            
-            .ticket-stat {
-                background: #f8f9fa;
-                padding: 15px;
-                border-radius: 10px;
-                text-align: center;
-            }
-            
-            .ticket-stat .label {
-                font-size: 11px;
-                color: #666;
-                text-transform: uppercase;
-                letter-spacing: 0.5px;
-                margin-bottom: 8px;
-                font-weight: 600;
-            }
-            
-            .ticket-stat .value {
-                font-size: 32px;
-                font-weight: 700;
-            }
-            
-            .ticket-stat.open .value { color: #dc3545; }
-            .ticket-stat.closed .value { color: #28a745; }
-            
-            .ticket-list {
-                margin-bottom: 20px;
-            }
-            
-            .ticket-item {
-                background: #f8f9fa;
-                padding: 12px;
-                border-radius: 8px;
-                margin-bottom: 10px;
-                transition: all 0.2s;
-                cursor: pointer;
-            }
-            
-            .ticket-item:hover {
-                background: #e9ecef;
-                transform: translateX(4px);
-            }
-            
-            .ticket-item .ticket-title {
-                font-weight: 600;
-                color: #333;
-                font-size: 14px;
-                margin-bottom: 4px;
-                display: block;
-                overflow: hidden;
-                text-overflow: ellipsis;
-                white-space: nowrap;
-            }
-            
-            .ticket-item .ticket-meta {
-                display: flex;
-                justify-content: space-between;
-                align-items: center;
-                font-size: 12px;
-                color: #666;
-            }
-            
-            .ticket-item .customer-name {
-                font-weight: 500;
-            }
-            
-            .ticket-item .ticket-time {
-                font-size: 11px;
-                color: #999;
-            }
-            
-            .btn-anastasia {
-                width: 100%;
-                background: linear-gradient(135deg, #f093fb 0%, #f5576c 100%);
-                color: white;
-                padding: 14px;
-                border: none;
-                border-radius: 10px;
-                font-size: 15px;
-                font-weight: 700;
-                cursor: pointer;
-                transition: all 0.3s;
-                text-align: center;
-                text-decoration: none;
-                display: block;
-            }
-            
-            .btn-anastasia:hover {
-                transform: translateY(-2px);
-                box-shadow: 0 6px 20px rgba(245, 87, 108, 0.4);
-            }
-            
-            .empty-state {
-                text-align: center;
-                padding: 40px 20px;
-                color: #999;
-            }
-            
-            .empty-state-icon {
-                font-size: 48px;
-                margin-bottom: 10px;
-                opacity: 0.3;
-            }
-            
-            #loading {
-                display: none;
-                text-align: center;
-                padding: 20px;
-                color: #666;
-                background: rgba(255,255,255,0.9);
-                border-radius: 10px;
-                margin: 20px 0;
-            }
-            
-            .spinner {
-                border: 3px solid #f3f3f3;
-                border-top: 3px solid #667eea;
-                border-radius: 50%;
-                width: 30px;
-                height: 30px;
-                animation: spin 1s linear infinite;
-                margin: 0 auto 10px;
-            }
-            
-            @keyframes spin {
-                0% { transform: rotate(0deg); }
-                100% { transform: rotate(360deg); }
-            }
-            
-            .error-widget {
-                background: #fff3cd;
-                border: 2px solid #ffc107;
-                border-radius: 10px;
-                padding: 15px;
-                margin-bottom: 15px;
-                color: #856404;
-                font-size: 13px;
-            }
-            .pending-section {
-                background: rgba(255,255,255,0.95);
-                backdrop-filter: blur(10px);
-                border-radius: 16px;
-                padding: 25px;
-                box-shadow: 0 8px 32px rgba(0,0,0,0.1);
-                border-left: 4px solid #ffc107;
-                margin-top: 30px;
-            }
-            
-            .pending-section h2 { color: #856404; }
-            
-            .badge-bonifico { background: #e3f2fd; color: #1565c0; }
-            .badge-manuale { background: #fff3e0; color: #e65100; }
-            
-            .waiting-time {
-                font-size: 12px;
-                padding: 4px 8px;
-                border-radius: 4px;
-                background: #fff3cd;
-                color: #856404;
-            }
-            
-            .waiting-time.warning { background: #f8d7da; color: #721c24; }
-            
-            .btn-confirm {
-                background: linear-gradient(135deg, #11998e 0%, #38ef7d 100%);
-                color: white;
-            }
-        </style>
-    </head>
-    <body>
-        <div class="container">
-            <div class="header">
-                <h1>🚀 ReflexMania - Gestione Unificata</h1>
-                <div class="header-subtitle">Dashboard ordini marketplace + ticket valutazioni</div>
-            </div>
-            
-            <div class="stats">
-                <div class="stat-card">
-                    <h3>📦 Ordini Totali</h3>
-                    <div class="number" id="pending-count">-</div>
-                </div>
-                <div class="stat-card">
-                    <h3>BackMarket</h3>
-                    <div class="number" id="bm-count">-</div>
-                </div>
-                <div class="stat-card">
-                    <h3>Refurbed</h3>
-                    <div class="number" id="rf-count">-</div>
-                </div>
-                <div class="stat-card">
-                    <h3>CDiscount</h3>
-                    <div class="number" id="cd-count">-</div>
-                </div>
-                <div class="stat-card">
-                    <h3>Magento</h3>
-                    <div class="number" id="mg-count">-</div>
-                </div>
-                <div class="stat-card">
-                    <h3>🎫 Ticket Aperti</h3>
-                    <div class="number" id="tickets-open-header">-</div>
-                </div>
-            </div>
-            
-            <div class="main-grid">
-                <div class="orders-section">
-                    <div class="section-header">
-                        <h2>📦 Ordini Marketplace</h2>
-                        <div class="actions">
-                            <button class="btn btn-primary" onclick="refreshOrders()">
-                                🔄 Aggiorna
-                            </button>
-                            <button class="btn btn-success" onclick="downloadCSV()">
-                                📥 CSV Packlink
-                            </button>
-                        </div>
-                    </div>
-                    
-                    <div id="loading">
-                        <div class="spinner"></div>
-                        Caricamento in corso...
-                    </div>
-                    
-                    <div style="overflow-x: auto;">
-                        <table id="orders-table">
-                            <thead>
-                                <tr>
-                                    <th>Numero Ordine</th>
-                                    <th>Canale</th>
-                                    <th>Cliente</th>
-                                    <th>Prodotto</th>
-                                    <th>SKU / Seriale</th>
-                                    <th>Data</th>
-                                    <th>Importo</th>
-                                    <th>Stato</th>
-                                    <th>Azioni</th>
-                                </tr>
-                            </thead>
-                            <tbody id="orders-body">
-                                <tr><td colspan="9" style="text-align: center; padding: 40px;">Caricamento ordini...</td></tr>
-                            </tbody>
-                        </table>
-                    </div>
-                </div>
-                <div class="anastasia-widget">
-                    <div class="widget-header">
-                        <span class="widget-icon">🎫</span>
-                        <h2>Ticket Anastasia</h2>
-                    </div>
-                    
-                    <div id="anastasia-error" class="error-widget" style="display: none;">
-                        ⚠️ Impossibile connettersi al sistema Anastasia
-                    </div>
-                    
-                    <div class="ticket-stats">
-                        <div class="ticket-stat open">
-                            <div class="label">Aperti</div>
-                            <div class="value" id="tickets-open">0</div>
-                        </div>
-                        <div class="ticket-stat closed">
-                            <div class="label">Chiusi Oggi</div>
-                            <div class="value" id="tickets-closed-today">0</div>
-                        </div>
-                    </div>
-                    
-                    <div class="ticket-list" id="ticket-list">
-                        <div class="empty-state">
-                            <div class="empty-state-icon">🔭</div>
-                            <div>Caricamento ticket...</div>
-                        </div>
-                    </div>
-                    
-                    <a href="https://anastasia.reflexmania.com" target="_blank" class="btn-anastasia">
-                        Apri Anastasia →
-                    </a>
-                </div>
-                <!-- Ordini in attesa pagamento -->
-                    <div class="pending-section" id="pending-section" style="display: none;">
-                        <div class="section-header">
-                            <h2>⏳ Ordini in Attesa Pagamento</h2>
-                            <div class="actions">
-                                <button class="btn btn-primary" onclick="refreshPendingOrders()">🔄 Aggiorna</button>
-                            </div>
-                        </div>
-                        
-                        <div style="overflow-x: auto;">
-                            <table id="pending-table">
-                                <thead>
-                                    <tr>
-                                        <th>Ordine</th>
-                                        <th>Cliente</th>
-                                        <th>Prodotto</th>
-                                        <th>Importo</th>
-                                        <th>Pagamento</th>
-                                        <th>In Attesa Da</th>
-                                        <th>Azioni</th>
-                                    </tr>
-                                </thead>
-                                <tbody id="pending-body">
-                                    <tr><td colspan="7" style="text-align: center;">Caricamento...</td></tr>
-                                </tbody>
-                            </table>
-                        </div>
-                    </div>
-            </div>
-        </div>
-    <script>
-            let orders = [];
-            
-            function refreshOrders() {
-                document.getElementById('loading').style.display = 'block';
-                fetch('/api/orders/all')
-                    .then(r => r.json())
-                    .then(data => {
-                        orders = data.orders;
-                        updateStats();
-                        renderOrders();
-                        refreshPendingOrders();
-                        document.getElementById('loading').style.display = 'none';
-                    })
-                    .catch(err => {
-                        console.error(err);
-                        alert('Errore nel caricamento ordini');
-                        document.getElementById('loading').style.display = 'none';
-                    });
-            }
-            
-            function updateStats() {
-                const bm = orders.filter(o => o.source === 'BackMarket').length;
-                const rf = orders.filter(o => o.source === 'Refurbed').length;
-                const cd = orders.filter(o => o.source === 'CDiscount').length;
-                const mg = orders.filter(o => o.source === 'Magento').length;
-                
-                document.getElementById('pending-count').textContent = orders.length;
-                document.getElementById('bm-count').textContent = bm;
-                document.getElementById('rf-count').textContent = rf;
-                document.getElementById('cd-count').textContent = cd;
-                document.getElementById('mg-count').textContent = mg;
-            }
-            
-            function renderOrders() {
-                const tbody = document.getElementById('orders-body');
-                
-                if (orders.length === 0) {
-                    tbody.innerHTML = '<tr><td colspan="9" class="empty-state"><div class="empty-state-icon">✅</div><div>Nessun ordine pendente</div></td></tr>';
-                    return;
-                }
-                
-                tbody.innerHTML = orders.map(order => {
-                    const badgeClass = 'badge-' + order.source.toLowerCase();
-                    const date = new Date(order.date).toLocaleDateString('it-IT');
-                    
-                    let productInfo = 'N/A';
-                    let skuInfo = 'N/A';
-                    
-                    if (order.items && order.items.length > 0) {
-                        const item = order.items[0];
-                        productInfo = item.name || 'N/A';
-                        skuInfo = item.sku || 'N/A';
-                        
-                        if (order.items.length > 1) {
-                            productInfo += ` (+${order.items.length - 1})`;
-                        }
-                    }
-                    
-                    let actionButtons = '';
-                    let statusBadge = '';
-                    
-                    if (order.source === 'Magento') {
-                        const entityId = order.entity_id || 0;
-                        actionButtons = `
-                            <button class="btn btn-success btn-small" 
-                                    onclick="createDDTOnly('${order.order_id}', '${order.source}')" 
-                                    style="margin-right: 5px;">
-                                Crea DDT
-                            </button>
-                            <button class="btn btn-primary btn-small" 
-                                    onclick="shipMagentoOrder('${order.order_id}', ${entityId})" 
-                                    style="background: #17a2b8;">
-                                📦 Spedito
-                            </button>
-                        `;
-                        statusBadge = '<span class="badge badge-pending">Processing</span>';
-                    } else if (order.source === 'BackMarket') {
-                        const stateNum = order.status;
-                        
-                        let packingSlipBtn = '';
-                        if (order.delivery_note) {
-                            packingSlipBtn = `<a href="${order.delivery_note}" target="_blank" class="btn btn-primary btn-small" style="margin-right: 5px; background: #6c757d;">Packing Slip</a>`;
-                        }
-                        
-                        if (stateNum === 1 || order.status === 'waiting_acceptance') {
-                            actionButtons = `${packingSlipBtn}<button class="btn btn-primary btn-small" onclick="acceptOrderOnly('${order.order_id}', '${order.source}')" style="margin-right: 5px;">Accetta</button><button class="btn btn-success btn-small" onclick="createDDTOnly('${order.order_id}', '${order.source}')">Crea DDT</button>`;
-                            statusBadge = '<span class="badge badge-pending">Da Accettare</span>';
-                        } else if (stateNum === 2 || order.status === 'accepted') {
-                            actionButtons = `${packingSlipBtn}<button class="btn btn-success btn-small" onclick="createDDTOnly('${order.order_id}', '${order.source}')" style="margin-right: 5px;">Crea DDT</button><button class="btn btn-primary btn-small" onclick="markAsShipped('${order.order_id}', '${order.source}')" style="background: #17a2b8;">Spedito</button>`;
-                            statusBadge = '<span class="badge badge-accepted">Accettato</span>';
-                        } else if (stateNum === 3 || order.status === 'to_ship') {
-                            actionButtons = `${packingSlipBtn}<button class="btn btn-success btn-small" onclick="createDDTOnly('${order.order_id}', '${order.source}')" style="margin-right: 5px;">Crea DDT</button><button class="btn btn-primary btn-small" onclick="markAsShipped('${order.order_id}', '${order.source}')" style="background: #17a2b8;">Spedito</button>`;
-                            statusBadge = '<span class="badge badge-accepted">Da Spedire</span>';
-                        } else {
-                            actionButtons = `${packingSlipBtn}<button class="btn btn-primary btn-small" onclick="acceptOrderOnly('${order.order_id}', '${order.source}')" style="margin-right: 5px;">Accetta</button><button class="btn btn-success btn-small" onclick="createDDTOnly('${order.order_id}', '${order.source}')">Crea DDT</button>`;
-                            statusBadge = '<span class="badge badge-pending">Pendente</span>';
-                        }
-                    } else if (order.source === 'Refurbed') {
-                        const orderState = order.status;
-                        
-                        if (orderState === 'NEW') {
-                            actionButtons = `<button class="btn btn-primary btn-small" onclick="acceptOrderOnly('${order.order_id}', '${order.source}')" style="margin-right: 5px;">Accetta</button><button class="btn btn-success btn-small" onclick="createDDTOnly('${order.order_id}', '${order.source}')">Crea DDT</button>`;
-                            statusBadge = '<span class="badge badge-pending">Da Accettare</span>';
-                        } else if (orderState === 'ACCEPTED') {
-                            actionButtons = `<button class="btn btn-success btn-small" onclick="createDDTOnly('${order.order_id}', '${order.source}')" style="margin-right: 5px;">Crea DDT</button><button class="btn btn-primary btn-small" onclick="markAsShipped('${order.order_id}', '${order.source}')" style="background: #17a2b8;">Spedito</button>`;
-                            statusBadge = '<span class="badge badge-accepted">Accettato</span>';
-                        } else {
-                            actionButtons = `<button class="btn btn-success btn-small" onclick="createDDTOnly('${order.order_id}', '${order.source}')">Crea DDT</button>`;
-                            statusBadge = '<span class="badge badge-pending">Pendente</span>';
-                        }
-                    } else {
-                        actionButtons = `<button class="btn btn-success btn-small" onclick="createDDTOnly('${order.order_id}', '${order.source}')">Crea DDT</button>`;
-                        statusBadge = '<span class="badge badge-pending">Pendente</span>';
-                    }
-                    
-                    return `<tr>
-                        <td><strong>${order.order_id}</strong></td>
-                        <td><span class="badge ${badgeClass}">${order.source}</span></td>
-                        <td>${order.customer_name}</td>
-                        <td>${productInfo}</td>
-                        <td><code>${skuInfo}</code></td>
-                        <td>${date}</td>
-                        <td><strong>€${order.total.toFixed(2)}</strong></td>
-                        <td>${statusBadge}</td>
-                        <td>${actionButtons}</td>
-                    </tr>`;
-                }).join('');
-            }
-            
-            function shipMagentoOrder(orderNumber, entityId) {
-                const trackingNumber = prompt(`Inserisci il numero di tracking per l'ordine Magento ${orderNumber}:`);
-                
-                if (!trackingNumber || trackingNumber.trim() === '') {
-                    alert('Numero di tracking obbligatorio');
-                    return;
-                }
-                
-                const carrier = prompt(`Inserisci il corriere (BRT, UPS, DHL, FEDEX, TNT, GLS):`, 'BRT');
-                
-                if (!carrier || carrier.trim() === '') {
-                    alert('Corriere obbligatorio');
-                    return;
-                }
-                
-                const validCarriers = ['BRT', 'UPS', 'DHL', 'FEDEX', 'TNT', 'GLS'];
-                const carrierUpper = carrier.trim().toUpperCase();
-                
-                if (!validCarriers.includes(carrierUpper)) {
-                    alert(`Corriere non valido. Usa uno tra: ${validCarriers.join(', ')}`);
-                    return;
-                }
-                
-                if (!confirm(`Confermi la spedizione dell'ordine Magento ${orderNumber}?\\n\\nTracking: ${trackingNumber}\\nCorriere: ${carrierUpper}`)) {
-                    return;
-                }
-                
-                document.getElementById('loading').style.display = 'block';
-                
-                fetch('/api/magento/ship_order', {
-                    method: 'POST',
-                    headers: {'Content-Type': 'application/json'},
-                    body: JSON.stringify({
-                        order_id: orderNumber,
-                        entity_id: entityId,
-                        tracking_number: trackingNumber,
-                        carrier: carrierUpper
-                    })
-                })
-                .then(response => {
-                    if (!response.ok) {
-                        throw new Error(`HTTP error! status: ${response.status}`);
-                    }
-                    return response.json();
-                })
-                .then(data => {
-                    document.getElementById('loading').style.display = 'none';
-                    
-                    if (data.success) {
-                        alert(`✅ Ordine Magento ${orderNumber} spedito con successo!\\n\\n` +
-                              `Shipment ID: ${data.shipment_id}\\n` +
-                              `Tracking: ${data.tracking_number}\\n` +
-                              `Corriere: ${data.carrier}\\n\\n` +
-                              `I prodotti sono stati disabilitati su tutti i marketplace.`);
-                        refreshOrders();
-                    } else {
-                        alert('❌ Errore: ' + (data.error || 'Errore sconosciuto'));
-                    }
-                })
-                .catch(err => {
-                    document.getElementById('loading').style.display = 'none';
-                    alert('❌ Errore di connessione: ' + err.message);
-                    console.error('Errore shipment:', err);
-                });
-            }
-            
-            function markAsShipped(orderId, source) {
-                const trackingNumber = prompt(`Inserisci il numero di tracking per l'ordine ${orderId}:`);
-                
-                if (!trackingNumber || trackingNumber.trim() === '') {
-                    alert('Numero di tracking obbligatorio');
-                    return;
-                }
-                
-                let carrier = 'BRT';
-                let trackingUrl = '';
-                
-                // Chiedi corriere sia per Refurbed che per BackMarket
-                if (source === 'Refurbed' || source === 'BackMarket') {
-                    carrier = prompt(
-                        `Seleziona il corriere per ${orderId}:\\n\\n` +
-                        `Digita uno tra:\\n` +
-                        `- UPS\\n` +
-                        `- DHL\\n` +
-                        `- BRT (default)\\n` +
-                        `- GLS\\n` +
-                        `- TNT\\n` +
-                        `- FEDEX\\n` +
-                        `- POSTE\\n` +
-                        `- SDA`,
-                        'BRT'
-                    );
-                    
-                    if (!carrier || carrier.trim() === '') {
-                        carrier = 'BRT';
-                    }
-                    
-                    carrier = carrier.toUpperCase().trim();
-                    
-                    const validCarriers = ['UPS', 'DHL', 'BRT', 'GLS', 'TNT', 'FEDEX', 'POSTE', 'SDA'];
-                    if (!validCarriers.includes(carrier)) {
-                        alert(`Corriere non valido. Usa uno tra: ${validCarriers.join(', ')}`);
-                        return;
-                    }
-                } else {
-                    trackingUrl = prompt(`Inserisci l'URL di tracking (opzionale):`) || '';
-                }
-                
-                // Messaggio conferma con corriere per Refurbed e BackMarket
-                const confirmMsg = (source === 'Refurbed' || source === 'BackMarket')
-                    ? `Confermi la spedizione dell'ordine ${orderId}?\\n\\nTracking: ${trackingNumber}\\nCorriere: ${carrier}`
-                    : `Confermi la spedizione dell'ordine ${orderId}?\\n\\nTracking: ${trackingNumber}`;
-                
-                if (!confirm(confirmMsg)) {
-                    return;
-                }
-                
-                document.getElementById('loading').style.display = 'block';
-                
-                const requestBody = {
-                    order_id: orderId,
-                    source: source,
-                    tracking_number: trackingNumber
-                };
-                
-                // Aggiungi carrier per Refurbed e BackMarket
-                if (source === 'Refurbed' || source === 'BackMarket') {
-                    requestBody.carrier = carrier;
-                } else if (trackingUrl) {
-                    requestBody.tracking_url = trackingUrl;
-                }
-                
-                fetch('/api/mark_shipped', {
-                    method: 'POST',
-                    headers: {'Content-Type': 'application/json'},
-                    body: JSON.stringify(requestBody)
-                })
-                .then(response => {
-                    return response.json().then(data => ({
-                        ok: response.ok,
-                        data: data
-                    }));
-                })
-                .then(result => {
-                    document.getElementById('loading').style.display = 'none';
-                    
-                    if (result.ok) {
-                        let message = `✅ Ordine ${orderId} marcato come spedito!\\n\\nTracking: ${trackingNumber}`;
-                        
-                        if (result.data.tracking_url) {
-                            message += `\\n\\nURL tracking: ${result.data.tracking_url}`;
-                        }
-                        
-                        if (result.data.carrier) {
-                            message += `\\nCorriere: ${result.data.carrier}`;
-                        }
-                        
-                        if (result.data.items_shipped) {
-                            message += `\\n\\nItems spediti: ${result.data.items_shipped}`;
-                        }
-                        
-                        message += '\\n\\nTracking comunicato al marketplace.';
-                        
-                        alert(message);
-                        refreshOrders();
-                    } else {
-                        alert(`❌ Errore: ${result.data.error || 'Errore sconosciuto'}`);
-                    }
-                })
-                .catch(err => {
-                    document.getElementById('loading').style.display = 'none';
-                    alert(`❌ Errore di connessione: ${err.message}`);
-                    console.error(err);
-                });
-            }
-            
-            function acceptOrderOnly(orderId, source) {
-                if (!confirm(`Confermi l'accettazione dell'ordine ${orderId} su ${source}?`)) {
-                    return;
-                }
-                
-                document.getElementById('loading').style.display = 'block';
-                
-                fetch('/api/accept_order_only', {
-                    method: 'POST',
-                    headers: {'Content-Type': 'application/json'},
-                    body: JSON.stringify({
-                        order_id: orderId,
-                        source: source
-                    })
-                })
-                .then(response => {
-                    return response.json().then(data => ({
-                        ok: response.ok,
-                        status: response.status,
-                        data: data
-                    }));
-                })
-                .then(result => {
-                    document.getElementById('loading').style.display = 'none';
-                    
-                    if (result.ok) {
-                        const message = result.data.message || `Ordine ${orderId} accettato con successo`;
-                        alert(`✅ ${message}\\n\\nLa tabella ordini verrà aggiornata tra 3 secondi...`);
-                        
-                        setTimeout(() => {
-                            console.log('🔄 Refresh automatico dopo accettazione...');
-                            refreshOrders();
-                        }, 3000);
-                    } else {
-                        const errorMsg = result.data.error || 'Errore sconosciuto';
-                        const details = result.data.details || '';
-                        
-                        let fullMessage = `❌ Errore durante l'accettazione:\\n\\n${errorMsg}`;
-                        if (details) {
-                            fullMessage += `\\n\\n${details}`;
-                        }
-                        
-                        alert(fullMessage);
-                        console.error('Errore accettazione:', result.data);
-                    }
-                })
-                .catch(err => {
-                    document.getElementById('loading').style.display = 'none';
-                    alert(`❌ Errore di connessione:\\n\\n${err.message}`);
-                    console.error('Errore fetch:', err);
-                });
-            }
-            
-            function createDDTOnly(orderId, source) {
-                if (!confirm(`Confermi la creazione del DDT per l'ordine ${orderId}?\\n\\nQuesto:\\n- Disabiliterà i prodotti su tutti i canali\\n- Creerà il DDT su InvoiceX`)) return;
-                document.getElementById('loading').style.display = 'block';
-                fetch('/api/create_ddt_only', { method: 'POST', headers: {'Content-Type': 'application/json'}, body: JSON.stringify({order_id: orderId, source: source}) })
-                .then(r => r.json()).then(data => { if (data.success) { alert(`DDT creato con successo!\\n\\nNumero DDT: ${data.ddt_number}\\n\\nL'ordine è ora pronto per la spedizione.`); refreshOrders(); } else { alert('Errore: ' + data.error); document.getElementById('loading').style.display = 'none'; } })
-                .catch(err => { alert('Errore di connessione'); console.error(err); document.getElementById('loading').style.display = 'none'; });
-            }
-            
-            function downloadCSV() { window.location.href = '/api/packlink_csv'; }
-            
-            function refreshTickets() {
-                fetch('/api/tickets/stats')
-                    .then(r => r.json())
-                    .then(data => {
-                        if (data.error) {
-                            document.getElementById('anastasia-error').style.display = 'block';
-                            return;
-                        }
-                        document.getElementById('anastasia-error').style.display = 'none';
-                        document.getElementById('tickets-open').textContent = data.open || 0;
-                        document.getElementById('tickets-closed-today').textContent = data.today_closed || 0;
-                        document.getElementById('tickets-open-header').textContent = data.open || 0;
-                    })
-                    .catch(err => {
-                        console.error('Errore stats Anastasia:', err);
-                        document.getElementById('anastasia-error').style.display = 'block';
-                    });
-                
-                fetch('/api/tickets/open?limit=5')
-                    .then(r => r.json())
-                    .then(data => {
-                        if (data.error || !data.tickets) {
-                            return;
-                        }
-                        
-                        const list = document.getElementById('ticket-list');
-                        
-                        if (data.tickets.length === 0) {
-                            list.innerHTML = '<div class="empty-state"><div class="empty-state-icon">✅</div><div>Nessun ticket aperto</div></div>';
-                            return;
-                        }
-                        
-                        list.innerHTML = data.tickets.map(ticket => `
-                            <div class="ticket-item" onclick="window.open('https://anastasia.reflexmania.com', '_blank')">
-                                <span class="ticket-title">${ticket.title}</span>
-                                <div class="ticket-meta">
-                                    <span class="customer-name">👤 ${ticket.customer_name}</span>
-                                    <span class="ticket-time">${ticket.last_update}</span>
-                                </div>
-                            </div>
-                        `).join('');
-                    })
-                    .catch(err => {
-                        console.error('Errore lista Anastasia:', err);
-                    });
-            }
-            
-            refreshOrders();
-            refreshTickets();
-            
-            setInterval(refreshOrders, 120000);
-            setInterval(refreshTickets, 30000);
-        let pendingOrders = [];
-            
-            function refreshPendingOrders() {
-                fetch('/api/orders/pending_magento')
-                    .then(r => r.json())
-                    .then(data => {
-                        if (data.success) {
-                            pendingOrders = data.orders;
-                            renderPendingOrders();
-                            document.getElementById('pending-section').style.display = 
-                                pendingOrders.length > 0 ? 'block' : 'none';
-                        }
-                    })
-                    .catch(err => console.error('Errore pending:', err));
-            }
-            
-            function renderPendingOrders() {
-                const tbody = document.getElementById('pending-body');
-                
-                if (pendingOrders.length === 0) {
-                    tbody.innerHTML = '<tr><td colspan="7" class="empty-state">✅ Nessun ordine in attesa</td></tr>';
-                    return;
-                }
-                
-                tbody.innerHTML = pendingOrders.map(order => {
-                    let productInfo = order.items?.[0]?.name || 'N/A';
-                    if (order.items?.length > 1) productInfo += ` (+${order.items.length - 1})`;
-                    
-                    const pm = order.payment_method || '';
-                    let paymentBadge = pm.includes('banktransfer') 
-                        ? '<span class="badge badge-bonifico">🏦 Bonifico</span>'
-                        : `<span class="badge badge-pending">${order.payment_label || pm}</span>`;
-                    
-                    const waiting = order.waiting_time || {};
-                    const waitingClass = waiting.days >= 3 ? 'warning' : '';
-                    
-                    return `<tr>
-                        <td><strong>${order.order_id}</strong></td>
-                        <td>${order.customer_name}</td>
-                        <td>${productInfo}</td>
-                        <td><strong>€${order.total.toFixed(2)}</strong></td>
-                        <td>${paymentBadge}</td>
-                        <td><span class="waiting-time ${waitingClass}">${waiting.label || 'N/A'}</span></td>
-                        <td><button class="btn btn-confirm btn-small" onclick="confirmPendingOrder(${order.entity_id}, '${order.order_id}')">✅ Conferma</button></td>
-                    </tr>`;
-                }).join('');
-            }
-            
-            function confirmPendingOrder(entityId, orderId) {
-                if (!confirm(`Confermi il pagamento per ordine ${orderId}?\\n\\nQuesto creerà il DDT e disabiliterà i prodotti.`)) return;
-                
-                document.getElementById('loading').style.display = 'block';
-                
-                fetch(`/api/pending_magento/confirm/${entityId}`, { method: 'POST' })
-                    .then(r => r.json())
-                    .then(data => {
-                        document.getElementById('loading').style.display = 'none';
-                        if (data.success) {
-                            alert(`✅ Ordine ${orderId} confermato!\\nDDT: ${data.ddt_number}`);
-                            refreshPendingOrders();
-                            refreshOrders();
-                        } else {
-                            alert('❌ Errore: ' + data.error);
-                        }
-                    })
-                    .catch(err => {
-                        document.getElementById('loading').style.display = 'none';
-                        alert('❌ Errore: ' + err.message);
-                    });
-            }
-            
-            // Carica pending all'avvio
-            refreshPendingOrders();    
-        </script>
-    </body>
-    </html>
-    """
-    
-    return html
+    page = static_bundle.page(
+        'dashboard',
+        lambda: app.jinja_env.get_template('dashboard.html').render(asset_url=static_bundle.asset_url)
+    )
+    return make_asset_response(page, request, REVALIDATE_CACHE)
+
+
+@app.route('/api/stream')
+def api_stream():
+    """Stream SSE della dashboard: eventi 'orders' (differenze), 'tickets' e 'resync'"""
+    try:
+        events = event_broker.stream(request.headers.get('Last-Event-ID'))
+    except TooManySubscribers as e:
+        # La dashboard torna al polling
+        return jsonify({'error': str(e)}), 503
+
+    dashboard_feed.start()
+    return Response(
+        stream_with_context(events),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            # Niente buffering sui proxy (nginx/Railway): gli eventi escono subito
+            'X-Accel-Buffering': 'no'
+        }
+    )
+
+
 # ============================================================================
 # API MARKETPLACE (BackMarket, Refurbed, CDiscount)
 # ============================================================================
@@ -1315,7 +400,7 @@ def dashboard():
 def api_orders():
     """API: ritorna lista ordini pendenti marketplace"""
     try:
-        orders = get_pending_orders(bm_client, rf_client, oct_client)
+        orders = [o for o in order_cache.get()['orders'] if o['source'] != 'Magento']
         return jsonify({'orders': orders, 'count': len(orders)})
     except Exception as e:
         logger.error(f"Errore API orders: {e}")
@@ -1344,6 +429,7 @@ def api_pending_magento_orders():
 
 
 @app.route('/api/pending_magento/confirm/<int:entity_id>', methods=['POST'])
+@invalidates_order_cache
 def confirm_pending_magento(entity_id):
     """Conferma ordine pending e avvia flusso DDT"""
     try:
@@ -1358,20 +444,17 @@ def confirm_pending_magento(entity_id):
         
         # Crea DDT
         ddt_result = ddt_service.crea_ddt_da_ordine_marketplace(order, 'magento')
-        if not ddt_result.get('success'):
+        if not ddt_result.get('success') and not ddt_result.get('skip'):
             return jsonify({
                 'success': False,
                 'error': f"Ordine confermato ma errore DDT: {ddt_result.get('error')}",
                 'order_confirmed': True
             }), 500
         
-        ddt_number = ddt_result.get('ddt_id', 'N/A')
+        ddt_number = ddt_result.get('ddt_id') or 'N/A'
         
         # Disabilita prodotti
-        for item in order.get('items', []):
-            sku = item.get('sku', '')
-            if sku:
-                order_service.disable_product_all_channels(sku)
+        order_service.disable_products_all_channels(order.get('items', []))
         
         # Notifica Telegram
         send_telegram_order_confirmed(order, ddt_number)
@@ -1388,6 +471,7 @@ def confirm_pending_magento(entity_id):
         return jsonify({'success': False, 'error': str(e)}), 500
     
 @app.route('/api/mark_shipped', methods=['POST'])
+@invalidates_order_cache
 def api_mark_shipped():
     """API: marca ordine come spedito e comunica tracking al marketplace"""
     try:
@@ -1417,8 +501,12 @@ def api_mark_shipped():
                 logger.info(f"🔗 URL tracking BackMarket generato: {tracking_url}")
             
             # Passa carrier alla funzione mark_as_shipped
-            if not bm_client.mark_as_shipped(order_id, tracking_number, tracking_url, carrier):
+            if not bm_client.mark_as_shipped(
+                order_id, tracking_number, tracking_url, carrier,
+                order_data=order_service.get_raw_order('backmarket', order_id)
+            ):
                 return jsonify({'success': False, 'error': 'Errore comunicazione tracking'}), 500
+            order_service.forget_raw_order('backmarket', order_id)
             
             return jsonify({
                 'success': True,
@@ -1443,8 +531,7 @@ def api_mark_shipped():
             items_url = f"{rf_client.base_url}/refb.merchant.v1.OrderItemService/ListOrderItemsByOrder"
             items_body = {"order_id": order_id}
             
-            import requests
-            items_response = requests.post(
+            items_response = rf_client.http.post(
                 items_url,
                 headers=rf_client.headers,
                 json=items_body,
@@ -1520,6 +607,7 @@ def api_mark_shipped():
         return jsonify({'success': False, 'error': str(e)}), 500
     
 @app.route('/api/accept_order_only', methods=['POST'])
+@invalidates_order_cache
 def api_accept_order_only():
     """API: accetta solo l'ordine sul marketplace (senza DDT)"""
     try:
@@ -1541,7 +629,10 @@ def api_accept_order_only():
         
         # BackMarket
         if source == 'BackMarket':
-            success = bm_client.accept_order(order_id)
+            success = bm_client.accept_order(
+                order_id,
+                order_data=order_service.get_raw_order('backmarket', order_id)
+            )
             
             if not success:
                 logger.error(f"❌ BackMarket: Accettazione fallita per {order_id}")
@@ -1550,6 +641,7 @@ def api_accept_order_only():
                     'error': 'Impossibile accettare l\'ordine su BackMarket. Verifica lo stato dell\'ordine.'
                 }), 500
             
+            order_service.forget_raw_order('backmarket', order_id)
             logger.info(f"✅ BackMarket: Ordine {order_id} accettato")
             return jsonify({
                 'success': True,
@@ -1562,6 +654,16 @@ def api_accept_order_only():
         elif source == 'Refurbed':
             success, message = rf_client.accept_order(order_id)
             
+            # Verifica subito (con backoff breve) se la risposta non era conclusiva
+            if success:
+                verification = rf_client.verify_pending_acceptances([order_id]).get(order_id)
+                if verification and not verification['verified']:
+                    success = False
+                    message = (
+                        f"L'update API è stato accettato ma gli items {', '.join(verification['stuck_items'])} "
+                        f"sono rimasti in stato NEW. Possibile problema con Refurbed API."
+                    )
+            
             if not success:
                 logger.error(f"❌ Refurbed: {message}")
                 return jsonify({
@@ -1598,6 +700,7 @@ def api_accept_order_only():
 
 
 @app.route('/api/create_ddt_only', methods=['POST'])
+@invalidates_order_cache
 def api_create_ddt_only():
     """API: crea solo DDT e disabilita prodotti"""
     try:
@@ -1610,11 +713,13 @@ def api_create_ddt_only():
             if not order:
                 return jsonify({'success': False, 'error': 'Ordine Magento non trovato'}), 404
             
-            for item in order['items']:
-                disable_product_on_channels(item['sku'], '', bm_client, rf_client, oct_client, magento_client)
+            disable_products_on_channels(
+                [{'sku': item['sku']} for item in order['items']],
+                bm_client, rf_client, oct_client, magento_client
+            )
             
             result = ddt_service.crea_ddt_da_ordine_marketplace(order, 'magento')
-            if not result['success']:
+            if not result['success'] and not result.get('skip'):
                 return jsonify({'success': False, 'error': result.get('error', 'Errore creazione DDT')}), 500
             
             if order.get('entity_id'):
@@ -1622,32 +727,29 @@ def api_create_ddt_only():
             
             return jsonify({
                 'success': True,
-                'ddt_number': result['ddt_id'],
+                'ddt_number': result.get('ddt_id') or 'N/A',
                 'order_id': order_id,
-                'message': 'DDT creato con successo'
+                'message': 'DDT già esistente' if result.get('skip') else 'DDT creato con successo'
             })
         
-        all_orders = get_pending_orders(bm_client, rf_client, oct_client)
-        order = next((o for o in all_orders if o['order_id'] == order_id and o['source'] == source), None)
+        order = order_service.get_order(source, order_id)
         
         if not order:
             return jsonify({'success': False, 'error': 'Ordine non trovato'}), 404
         
-        for item in order['items']:
-            listing_id = item.get('listing_id', '')
-            disable_product_on_channels(item['sku'], listing_id, bm_client, rf_client, oct_client, magento_client)
+        disable_products_on_channels(order['items'], bm_client, rf_client, oct_client, magento_client)
         
         result = ddt_service.crea_ddt_da_ordine_marketplace(order, source.lower())
-        if not result['success']:
+        if not result['success'] and not result.get('skip'):
             return jsonify({'success': False, 'error': result.get('error', 'Errore creazione DDT')}), 500
         
-        ddt_number = result['ddt_id']
+        ddt_number = result.get('ddt_id') or 'N/A'
         
         return jsonify({
             'success': True,
             'ddt_number': ddt_number,
             'order_id': order_id,
-            'message': 'DDT creato con successo'
+            'message': 'DDT già esistente' if result.get('skip') else 'DDT creato con successo'
         })
         
     except Exception as e:
@@ -1657,83 +759,17 @@ def api_create_ddt_only():
 
 @app.route('/api/packlink_csv')
 def api_packlink_csv():
-    """API: genera CSV Packlink per ordini accettati"""
+    """API: genera CSV Packlink per ordini accettati (righe validate prima, codifica in streaming)"""
     try:
-        marketplace_orders = get_pending_orders(bm_client, rf_client, oct_client)
-        magento_orders = magento_service.get_all_pending_orders()
-        
-        magento_converted = []
-        for order in magento_orders:
-            magento_converted.append({
-                'order_id': order['order_id'],
-                'source': 'Magento',
-                'customer_name': f"{order['customer']['name']} {order['customer']['surname']}",
-                'customer_email': order['customer']['email'],
-                'customer_phone': order['customer']['phone'],
-                'address': order['customer']['address'],
-                'postal_code': order['customer']['zip'],
-                'city': order['customer']['city'],
-                'country': order['customer']['country'],
-                'total': order['total'],
-                'items': order['items']
-            })
-        
-        all_orders = marketplace_orders + magento_converted
-        
-        rows = []
-        for order in all_orders:
-            name_parts = order['customer_name'].split()
-            first_name = name_parts[0] if name_parts else ''
-            last_name = ' '.join(name_parts[1:]) if len(name_parts) > 1 else ''
-            
-            row = {
-                'Numero di ordine': f"{order['source']}-{order['order_id']}",
-                'nome mittente': 'ReflexMania',
-                'Cognome mittente': 'SRL',
-                'Azienda mittente': 'ReflexMania SRL',
-                'Indirizzo Di Spedizione 1': 'Via primo maggio 16',
-                'Indirizzo Di Spedizione 2': '',
-                'CAP Spedizione': '60131',
-                'citta Spedizione': 'Ancona',
-                'provincia di Spedizione': 'AN',
-                'Paese di spedizione': 'IT',
-                'Telefono spedizione': '0712916347',
-                'Email Spedizione': 'info@reflexmania.it',
-                'Nome destinatario': first_name,
-                'Cognome destinatario': last_name,
-                'Azienda destinatario': '',
-                'Indirizzo di consegna 1': order['address'],
-                'Indirizzo di consegna 2': '',
-                'CAP di consegna': order['postal_code'],
-                'citta di consegna': order['city'],
-                'provincia di consegna': '',
-                'Paese di consegna': order['country'],
-                'Telefono di consegna': order['customer_phone'],
-                'Email di consegna': order['customer_email'],
-                'assicurazione': 'NO',
-                'Titolo dell\'oggetto': order['items'][0]['name'] if order['items'] else 'Prodotto',
-                'Valore merce': str(int(order['total'])),
-                'Larghezza oggetto': '20',
-                'Altezza oggetto': '25',
-                'Lughezza oggetto': '29',
-                'Peso dell\'oggetto': '3'
-            }
-            rows.append(row)
-        
-        df = pd.DataFrame(rows)
-        
-        csv_buffer = BytesIO()
-        csv_string = df.to_csv(sep=';', index=False, encoding='utf-8')
-        csv_buffer.write(csv_string.encode('utf-8'))
-        csv_buffer.seek(0)
+        # Gli ordini sono già in memoria (cache): un ordine non valido dà 500 prima di iniziare la risposta
+        rows = packlink_rows(order_cache.get()['orders'])
         
         filename = f"packlink_orders_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
         
-        return send_file(
-            csv_buffer,
+        return Response(
+            iter_packlink_csv(rows),
             mimetype='text/csv',
-            as_attachment=True,
-            download_name=filename
+            headers={'Content-Disposition': f'attachment; filename={filename}'}
         )
         
     except Exception as e:
@@ -1775,6 +811,7 @@ def get_magento_order(order_id):
 
 
 @app.route('/api/magento/ship_order', methods=['POST'])
+@invalidates_order_cache
 def ship_magento_order():
     """API: Crea shipment per ordine Magento con tracking"""
     try:
@@ -1805,13 +842,11 @@ def ship_magento_order():
         if shipment_id:
             order = magento_service.get_order_by_id(order_id)
             if order and order.get('items'):
-                for item in order['items']:
-                    sku = item.get('sku')
-                    if sku:
-                        logger.info(f"🔧 Disabilitazione prodotto {sku} su tutti i marketplace")
-                        disable_product_on_channels(
-                            sku, '', bm_client, rf_client, oct_client, magento_client
-                        )
+                logger.info(f"🔧 Disabilitazione prodotti ordine {order_id} su tutti i marketplace")
+                disable_products_on_channels(
+                    [{'sku': item.get('sku')} for item in order['items']],
+                    bm_client, rf_client, oct_client, magento_client
+                )
             
             return jsonify({
                 'success': True,
@@ -1832,47 +867,63 @@ def ship_magento_order():
 
 @app.route('/api/orders/all', methods=['GET'])
 def get_all_orders():
-    """API: recupera TUTTI gli ordini da tutti i canali"""
+    """
+    API: recupera TUTTI gli ordini da tutti i canali (in parallelo)
+
+    La risposta porta 'version' (anche come ETag):
+    - If-None-Match con la versione corrente -> 304 senza corpo
+    - ?since=<version> -> solo differenze (added, updated, removed); se la
+      versione non è più disponibile si riceve la lista completa
+    """
     try:
-        marketplace_orders = get_pending_orders(bm_client, rf_client, oct_client)
-        magento_orders = magento_service.get_all_pending_orders()
-        magento_converted = []
-        
-        for order in magento_orders:
-            magento_converted.append({
-                'order_id': order['order_id'],
-                'entity_id': order.get('entity_id', 0),
-                'source': 'Magento',
-                'customer_name': f"{order['customer']['name']} {order['customer']['surname']}",
-                'customer_email': order['customer']['email'],
-                'customer_phone': order['customer']['phone'],
-                'address': order['customer']['address'],
-                'postal_code': order['customer']['zip'],
-                'city': order['customer']['city'],
-                'country': order['customer']['country'],
-                'total': order['total'],
-                'date': order['order_date'],
-                'status': order['status'],
-                'items': order['items']
-            })
-        
-        all_orders = marketplace_orders + magento_converted
-        
-        return jsonify({
+        refresh = request.args.get('refresh') == '1'
+        fetched = order_cache.get(force_refresh=refresh)
+        version = fetched['version']
+
+        if not refresh and request.if_none_match.contains_weak(version):
+            response = app.response_class(status=304)
+            response.set_etag(version)
+            response.headers['Cache-Control'] = 'no-cache'
+            return response
+
+        common = {
             'success': True,
-            'total_count': len(all_orders),
-            'orders': all_orders,
-            'channels': {
-                'backmarket': len([o for o in all_orders if o['source'] == 'BackMarket']),
-                'refurbed': len([o for o in all_orders if o['source'] == 'Refurbed']),
-                'cdiscount': len([o for o in all_orders if o['source'] == 'CDiscount']),
-                'magento': len(magento_converted)
-            }
-        }), 200
+            'channel_status': fetched['channels'],
+            'degraded': any(c['degraded'] for c in fetched['channels'].values()),
+            'cache': {'age_seconds': fetched['age_seconds'], 'stale': fetched['stale']}
+        }
+
+        since = request.args.get('since')
+        delta = order_cache.changes_since(since) if since and not refresh else None
+        if delta is not None:
+            body = dict(common, delta=True, since=since, **delta)
+            version = delta['version']
+        else:
+            all_orders = fetched['orders']
+            body = dict(
+                common,
+                delta=False,
+                version=version,
+                total_count=len(all_orders),
+                orders=all_orders,
+                channels={
+                    'backmarket': len([o for o in all_orders if o['source'] == 'BackMarket']),
+                    'refurbed': len([o for o in all_orders if o['source'] == 'Refurbed']),
+                    'cdiscount': len([o for o in all_orders if o['source'] == 'CDiscount']),
+                    'magento': len([o for o in all_orders if o['source'] == 'Magento'])
+                }
+            )
+
+        response = jsonify(body)
+        response.set_etag(version)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response, 200
         
     except Exception as e:
         logger.error(f"Errore recupero ordini unificati: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
+
+
 # ============================================================================
 # DEBUG ENDPOINTS
 # ============================================================================
@@ -1895,7 +946,7 @@ def debug_refurbed_order(order_id):
         list_url = f"{rf_client.base_url}/refb.merchant.v1.OrderItemService/ListOrderItemsByOrder"
         list_body = {"order_id": order_id}
         
-        response = requests.post(list_url, headers=rf_client.headers, json=list_body, timeout=30)
+        response = rf_client.http.post(list_url, headers=rf_client.headers, json=list_body, timeout=30)
         
         items_info = []
         can_accept_any = False
@@ -1971,7 +1022,7 @@ def verify_refurbed_order_state(order_id):
         order_url = f"{rf_client.base_url}/refb.merchant.v1.OrderService/GetOrder"
         order_body = {"order_id": order_id}
         
-        order_response = requests.post(order_url, headers=rf_client.headers, json=order_body, timeout=30)
+        order_response = rf_client.http.post(order_url, headers=rf_client.headers, json=order_body, timeout=30)
         
         if order_response.status_code != 200:
             return jsonify({
@@ -1985,7 +1036,7 @@ def verify_refurbed_order_state(order_id):
         items_url = f"{rf_client.base_url}/refb.merchant.v1.OrderItemService/ListOrderItemsByOrder"
         items_body = {"order_id": order_id}
         
-        items_response = requests.post(items_url, headers=rf_client.headers, json=items_body, timeout=30)
+        items_response = rf_client.http.post(items_url, headers=rf_client.headers, json=items_body, timeout=30)
         
         items = []
         if items_response.status_code == 200:
@@ -2076,19 +1127,42 @@ def test_accept_refurbed(order_id):
 # HEALTH CHECK
 # ============================================================================
 
+@app.route('/health/live')
+def health_live():
+    """Liveness: il processo risponde (nessuna chiamata agli upstream)"""
+    return jsonify({'status': 'alive', 'timestamp': datetime.now().isoformat()})
+
+
+@app.route('/health/ready')
+def health_ready():
+    """
+    Readiness: client obbligatori inizializzati
+
+    Solo informativo: dipende dai marketplace (OAuth Octopia), quindi non è
+    l'healthcheck di Railway (che usa /health/live)
+    """
+    ready = registry.ready
+    return jsonify({
+        'status': 'ready' if ready else 'starting',
+        'warm_up_completed': registry.warmed_up,
+        'services': registry.status()
+    }), 200 if ready else 503
+
+
 @app.route('/health')
 def health():
     """Health check con verifica Anastasia"""
     anastasia_status = 'ok'
+    anastasia = registry.get_if_built('anastasia')
     
-    if anastasia_client:
+    if anastasia:
         try:
-            if not anastasia_client.health_check():
+            if not anastasia.health_check():
                 anastasia_status = 'error'
         except:
             anastasia_status = 'error'
     else:
-        anastasia_status = 'unavailable'
+        anastasia_status = registry.status()['anastasia']['state']
     
     return jsonify({
         'status': 'healthy',
@@ -2100,8 +1174,19 @@ def health():
             'magento': 'ok',
             'invoicex': 'ok',
             'anastasia': anastasia_status
-        }
+        },
+        'registry': registry.status(),
+        'http': get_http_metrics(),
+        'order_cache': order_cache.get_stats(),
+        'invoicex_customer_cache': invoicex_api_client.customer_cache.get_stats(),
+        'ddt_index': ddt_service.ddt_index.get_stats(),
+        'anastasia_pool': anastasia.get_pool_stats() if anastasia else None,
+        'ticket_snapshot': ticket_snapshot.get_stats(),
+        'event_stream': event_broker.get_stats(),
+        'telegram': telegram_notifier.get_stats()
     })
+
+
 # ============================================================
 # ROUTES - AUTOMAZIONE (Flask)
 # ============================================================
@@ -2114,7 +1199,7 @@ def trigger_automation():
     """
     try:
         logger.info("🚀 Automazione triggerata manualmente via API")
-        results = automation_service.process_all_pending_orders()
+        results = run_automation()
         
         return jsonify({
             "success": True,
@@ -2162,39 +1247,27 @@ def automation_status():
 @app.route('/api/test-telegram', methods=['GET'])
 def test_telegram():
     """Test notifica Telegram"""
-    token = os.getenv("TELEGRAM_BOT_TOKEN")
-    chat_id = os.getenv("TELEGRAM_CHAT_ID")
-    
-    if not token or not chat_id:
+    if not telegram_client.configured:
         return jsonify({
             "success": False,
             "error": "TELEGRAM_BOT_TOKEN o TELEGRAM_CHAT_ID non configurati"
         })
     
-    try:
-        url = f"https://api.telegram.org/bot{token}/sendMessage"
-        response = requests.post(url, json={
-            "chat_id": chat_id,
-            "text": "✅ Test notifica da ReflexMania Automation!\n\nSe ricevi questo messaggio, Telegram è configurato correttamente.",
-            "parse_mode": "Markdown"
-        }, timeout=10)
-        
-        if response.status_code == 200:
-            return jsonify({
-                "success": True,
-                "message": "Notifica Telegram inviata con successo!"
-            })
-        else:
-            return jsonify({
-                "success": False,
-                "error": f"Errore Telegram: {response.status_code}",
-                "response": response.text
-            })
-    except Exception as e:
+    # Invio diretto (non dalla coda): il test deve riportare l'esito
+    result = telegram_client.send_message(
+        "✅ Test notifica da ReflexMania Automation!\n\nSe ricevi questo messaggio, Telegram è configurato correttamente."
+    )
+    
+    if result['ok']:
         return jsonify({
-            "success": False,
-            "error": str(e)
+            "success": True,
+            "message": "Notifica Telegram inviata con successo!"
         })
+    return jsonify({
+        "success": False,
+        "error": f"Errore Telegram: {result['status_code'] or result['error']}",
+        "response": result['error']
+    })
 
 @app.route('/api/tracker/status', methods=['GET'])
 def tracker_status():
@@ -2203,8 +1276,9 @@ def tracker_status():
         # ✅ USA IL TRACKER DI order_service (stesso istanza)
         return jsonify({
             "success": True,
-            "tracker_file": "/tmp/ordini_processati.json",
+            "tracker_file": order_service.order_tracker.backend.location,
             "stats": order_service.order_tracker.get_stats(),
+            "filter_metrics": order_service.order_tracker.filter_metrics,
             "data": order_service.order_tracker.data,
             "total_orders": order_service.order_tracker._count_orders(order_service.order_tracker.data)
         })
@@ -2228,7 +1302,7 @@ def start_automation_scheduler():
     
     scheduler = BackgroundScheduler()
     scheduler.add_job(
-        func=lambda: automation_service.process_all_pending_orders(),
+        func=run_automation,
         trigger="interval",
         minutes=int(os.getenv("AUTOMATION_INTERVAL_MINUTES", "15")),
         id="automation_job",
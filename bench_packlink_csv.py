@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Benchmark CSV Packlink: vecchia generazione con pandas vs writer in streaming
+
+Per N ordini sintetici misura tempo e picco di memoria (tracemalloc) di
+entrambe le versioni, verifica che il CSV prodotto sia identico e riporta il
+costo di `import pandas` in un processo nuovo (quello tolto dall'avvio di app.py).
+
+pandas non è più in requirements.txt: per il confronto installarlo a parte
+(`pip install pandas`), altrimenti viene misurata solo la versione in streaming.
+
+Uso:
+    python bench_packlink_csv.py             # 10000 ordini, 5 giri
+    python bench_packlink_csv.py 50000 3
+"""
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from io import BytesIO
+
+from utils.packlink_csv import COLUMNS, iter_packlink_csv, packlink_row, packlink_rows
+
+
+def make_orders(count: int) -> list:
+    sources = ['BackMarket', 'Refurbed', 'CDiscount', 'Magento']
+    return [
+        {
+            'source': sources[i % len(sources)],
+            'order_id': str(100000 + i),
+            'customer_name': f"Mario{i} De Rossi",
+            'address': f"Via Roma {i % 300}; scala \"B\"",
+            'postal_code': f"{60000 + i % 1000:05d}",
+            'city': 'Ancona',
+            'country': 'IT',
+            'customer_phone': f"+39 333 {i:07d}",
+            'customer_email': f"cliente{i}@example.com",
+            'items': [{'name': f"Canon EOS {i % 90}D, corpo"}],
+            'total': 199.99 + i % 500
+        }
+        for i in range(count)
+    ]
+
+
+def pandas_csv(orders: list) -> bytes:
+    """Implementazione precedente dell'endpoint (lista di dict -> DataFrame -> stringa -> BytesIO)"""
+    import pandas as pd
+
+    rows = [dict(zip(COLUMNS, packlink_row(order))) for order in orders]
+    df = pd.DataFrame(rows)
+    csv_buffer = BytesIO()
+    csv_string = df.to_csv(sep=';', index=False, encoding='utf-8')
+    csv_buffer.write(csv_string.encode('utf-8'))
+    csv_buffer.seek(0)
+    return csv_buffer.getvalue()
+
+
+def streaming_csv(orders: list) -> int:
+    # In produzione i blocchi vanno direttamente sul socket: qui si contano solo
+    size = 0
+    for chunk in iter_packlink_csv(packlink_rows(orders)):
+        size += len(chunk)
+    return size
+
+
+def measure(func, orders: list, rounds: int) -> dict:
+    func(orders)  # riscaldamento (import pandas escluso dalla misura)
+
+    times = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        func(orders)
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    func(orders)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {'median_s': statistics.median(times), 'min_s': min(times), 'peak_mb': peak / 1024 / 1024}
+
+
+def pandas_import_seconds() -> float:
+    result = subprocess.run(
+        [sys.executable, '-c', 'import time; t = time.perf_counter(); import pandas; print(time.perf_counter() - t)'],
+        capture_output=True,
+        text=True,
+        timeout=120
+    )
+    return float(result.stdout.strip()) if result.returncode == 0 else float('nan')
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    orders = make_orders(count)
+
+    try:
+        identical = pandas_csv(orders) == b''.join(iter_packlink_csv(packlink_rows(orders)))
+    except ImportError:
+        print("pandas non installato: misuro solo la versione in streaming")
+        identical = None
+
+    results = {'streaming': measure(streaming_csv, orders, rounds)}
+    if identical is not None:
+        results['pandas'] = measure(pandas_csv, orders, rounds)
+
+    print(f"{count} ordini, {rounds} giri")
+    for name, r in results.items():
+        print(
+            f"{name:10} mediana {r['median_s'] * 1000:8.1f}ms  "
+            f"min {r['min_s'] * 1000:8.1f}ms  picco memoria {r['peak_mb']:7.1f}MB"
+        )
+    if identical is not None:
+        print(f"CSV identico: {'sì' if identical else 'NO'}")
+        print(f"import pandas (processo nuovo): {pandas_import_seconds():.3f}s")
+
+
+if __name__ == '__main__':
+    main()
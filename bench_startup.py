@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Benchmark avvio app: tempo di import di app.py e prima risposta di /health/live
+
+Ogni giro è un processo Python nuovo (cold start). Gli upstream lenti sono
+simulati con un host che non risponde: l'avvio deve dipendere solo dal lavoro locale.
+
+Uso:
+    python bench_startup.py             # 5 giri
+    python bench_startup.py 10
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+PROBE = r"""
+import json, time
+t0 = time.perf_counter()
+import app
+t1 = time.perf_counter()
+client = app.app.test_client()
+live = client.get('/health/live').status_code
+t2 = time.perf_counter()
+print(json.dumps({'import_s': t1 - t0, 'live_s': t2 - t0, 'live_status': live}))
+"""
+
+
+def run_once(env: dict) -> dict:
+    result = subprocess.run(
+        [sys.executable, '-c', PROBE],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=env,
+        capture_output=True,
+        text=True,
+        timeout=120
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr[-2000:])
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+
+    env = dict(os.environ)
+    env.update({
+        'ENABLE_AUTOMATION': 'false',
+        'LOG_LEVEL': 'WARNING',
+        'LOCAL_DB_PATH': os.path.join(tempfile.mkdtemp(), 'bench.db'),
+        # Indirizzo non instradabile: una connessione qui resta appesa fino al timeout
+        'ANASTASIA_HOST': '10.255.255.1',
+        'INVOICEX_API_URL': 'http://10.255.255.1/',
+    })
+
+    samples = [run_once(env) for _ in range(rounds)]
+
+    for key in ('import_s', 'live_s'):
+        values = [s[key] for s in samples]
+        print(
+            f"{key:10} min {min(values):.3f}s  "
+            f"mediana {statistics.median(values):.3f}s  max {max(values):.3f}s"
+        )
+    print(f"/health/live: {sorted({s['live_status'] for s in samples})}")
+
+
+if __name__ == '__main__':
+    main()
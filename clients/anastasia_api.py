@@ -4,40 +4,253 @@ Client per interrogare il database Anastasia (MySQL A2Hosting)
 Sistema di ticketing valutazioni materiale fotografico
 """
 
-import mysql.connector
-from typing import List, Dict, Optional
+from mysql.connector import errors as mysql_errors
+from mysql.connector.pooling import MySQLConnectionPool
+from contextlib import contextmanager
+from typing import Callable, List, Dict
 from datetime import datetime, timedelta
+import threading
+import time
 import logging
 
+from config import ANASTASIA_POOL_SIZE, ANASTASIA_POOL_TIMEOUT, ANASTASIA_TICKET_TS_COLUMN
+
 logger = logging.getLogger(__name__)
 
 
 class AnastasiaClient:
-    """Client per connessione database Anastasia"""
+    """
+    Client per connessione database Anastasia
+    
+    Le connessioni restano aperte in un MySQLConnectionPool: le richieste del
+    widget ticket non rifanno l'handshake TCP/TLS verso A2Hosting ogni volta.
+    Al prelievo il pool verifica la connessione (ping) e la riapre se il server
+    l'ha chiusa; una query fallita per connessione persa viene ritentata una volta.
+    """
     
-    def __init__(self, config: Dict):
+    def __init__(self, config: Dict, pool_size: int = ANASTASIA_POOL_SIZE):
         """
         Inizializza client Anastasia
         
         Args:
             config: Dict con host, port, database, user, password
+            pool_size: Connessioni mantenute aperte
         """
         self.config = config
+        self.pool_size = max(1, pool_size)
+        self.ts_column = ANASTASIA_TICKET_TS_COLUMN
+        
+        # Il pool non attende connessioni libere (PoolError subito):
+        # il semaforo mette in coda i chiamanti oltre pool_size
+        self._slots = threading.BoundedSemaphore(self.pool_size)
+        self._stats_lock = threading.Lock()
+        self._stats = {'checkouts': 0, 'in_use': 0, 'waits': 0, 'timeouts': 0, 'retries': 0, 'errors': 0}
+        self._checkout_ms_total = 0.0
+        
+        self.pool = self._create_pool()
         self._test_connection()
     
+    def _create_pool(self) -> MySQLConnectionPool:
+        """Apre le connessioni del pool (errore se il database non è raggiungibile)"""
+        try:
+            return MySQLConnectionPool(
+                pool_name='anastasia',
+                pool_size=self.pool_size,
+                # Solo letture in autocommit: niente reset di sessione al rilascio
+                # (eviterebbe un round trip per ogni richiesta)
+                pool_reset_session=False,
+                **self.config
+            )
+        except Exception as e:
+            logger.error(f"❌ Errore creazione pool Anastasia: {e}")
+            raise
+    
     def _test_connection(self):
         """Testa la connessione al database"""
         try:
-            conn = self._get_connection()
-            conn.close()
-            logger.info("✅ Connessione Anastasia database OK")
+            with self._connection() as conn:
+                conn.ping()
+            logger.info(f"✅ Connessione Anastasia database OK (pool {self.pool_size} connessioni)")
         except Exception as e:
             logger.error(f"❌ Errore connessione Anastasia: {e}")
             raise
     
-    def _get_connection(self):
-        """Crea nuova connessione MySQL"""
-        return mysql.connector.connect(**self.config)
+    @contextmanager
+    def _connection(self):
+        """Preleva una connessione dal pool e la restituisce a fine blocco"""
+        start = time.monotonic()
+        if not self._slots.acquire(blocking=False):
+            self._count('waits')
+            if not self._slots.acquire(timeout=ANASTASIA_POOL_TIMEOUT):
+                self._count('timeouts')
+                raise mysql_errors.PoolError(
+                    f"Nessuna connessione Anastasia libera entro {ANASTASIA_POOL_TIMEOUT}s"
+                )
+        
+        try:
+            conn = self.pool.get_connection()
+        except Exception:
+            self._slots.release()
+            self._count('errors')
+            raise
+        
+        with self._stats_lock:
+            self._stats['checkouts'] += 1
+            self._stats['in_use'] += 1
+            self._checkout_ms_total += (time.monotonic() - start) * 1000
+        
+        try:
+            yield conn
+        finally:
+            try:
+                # close() su una connessione del pool la restituisce al pool
+                conn.close()
+            finally:
+                with self._stats_lock:
+                    self._stats['in_use'] -= 1
+                self._slots.release()
+    
+    def _with_cursor(self, work: Callable):
+        """
+        Esegue work(cursor) su una connessione del pool
+        
+        Ritenta una volta se la connessione cade durante la query
+        (es. chiusa dal server per wait_timeout dopo il ping)
+        """
+        for attempt in range(2):
+            try:
+                with self._connection() as conn:
+                    cursor = conn.cursor(dictionary=True)
+                    try:
+                        return work(cursor)
+                    finally:
+                        cursor.close()
+            except (mysql_errors.OperationalError, mysql_errors.InterfaceError) as e:
+                if attempt:
+                    raise
+                self._count('retries')
+                logger.warning(f"⚠️ Connessione Anastasia persa, nuovo tentativo: {e}")
+    
+    def _run_query(self, sql: str, params: tuple = (), fetch_one: bool = False):
+        """Esegue una SELECT su una connessione del pool"""
+        def work(cursor):
+            cursor.execute(sql, params)
+            return cursor.fetchone() if fetch_one else cursor.fetchall()
+        
+        return self._with_cursor(work)
+    
+    def _run_many(self, statements: List[tuple]) -> List[List[Dict]]:
+        """
+        Esegue più SELECT in sequenza sulla stessa connessione del pool e
+        ritorna le righe di ciascuna
+        
+        Niente execute(multi=True): non esiste più in mysql-connector 9.x
+        """
+        def work(cursor):
+            results = []
+            for sql, params in statements:
+                cursor.execute(sql, params)
+                results.append(cursor.fetchall())
+            return results
+        
+        return self._with_cursor(work)
+    
+    def _count(self, key: str):
+        with self._stats_lock:
+            self._stats[key] += 1
+    
+    def get_pool_stats(self) -> Dict:
+        """Utilizzo del pool connessioni (per /health)"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+            checkouts = stats['checkouts']
+            stats['avg_checkout_ms'] = round(self._checkout_ms_total / checkouts, 1) if checkouts else 0
+        stats['pool_size'] = self.pool_size
+        return stats
+    
+    # ------------------------------------------------------------------
+    # Query ticket
+    #
+    # last_update è un timestamp Unix salvato come stringa: il filtro
+    # CAST(last_update AS UNSIGNED) non può usare indici. Se sul database è
+    # presente la colonna numerica consigliata (ANASTASIA_TICKET_TS_COLUMN,
+    # vedi README) le query la usano direttamente.
+    # ------------------------------------------------------------------
+    
+    def _ts(self) -> str:
+        """Espressione SQL del timestamp numerico di ultimo aggiornamento"""
+        if self.ts_column:
+            return f"t.{self.ts_column}"
+        return "CAST(t.last_update AS UNSIGNED)"
+    
+    def _order_column(self) -> str:
+        return f"t.{self.ts_column or 'last_update'}"
+    
+    def _today_closed_condition(self) -> str:
+        # Equivale a DATE(FROM_UNIXTIME(ts)) = CURDATE(), ma come intervallo
+        ts = self._ts()
+        return (
+            f"{ts} >= UNIX_TIMESTAMP(CURDATE()) "
+            f"AND {ts} < UNIX_TIMESTAMP(CURDATE() + INTERVAL 1 DAY)"
+        )
+    
+    def _stats_query(self) -> str:
+        return f"""
+            SELECT 
+                COUNT(*) as total,
+                SUM(CASE WHEN t.status = 0 AND {self._ts()} >= %s THEN 1 ELSE 0 END) as open,
+                SUM(CASE WHEN t.status = 1 THEN 1 ELSE 0 END) as closed,
+                SUM(CASE 
+                    WHEN t.status = 1 AND {self._today_closed_condition()} 
+                    THEN 1 ELSE 0 
+                END) as today_closed
+            FROM ticket t
+            WHERE t.is_auto = 0 OR t.is_auto IS NULL
+        """
+    
+    def _open_query(self) -> str:
+        return f"""
+            SELECT 
+                t.id,
+                t.email,
+                t.title,
+                t.creation_date,
+                t.last_update,
+                t.status,
+                t.blue_tick,
+                c.nome,
+                c.cognome,
+                c.phone
+            FROM ticket t
+            LEFT JOIN customer c ON t.user_id_id = c.id
+            WHERE t.status = 0 
+              AND (t.is_auto = 0 OR t.is_auto IS NULL)
+              AND {self._ts()} >= %s
+            ORDER BY {self._order_column()} DESC
+            LIMIT %s
+        """
+    
+    def _closed_today_query(self) -> str:
+        return f"""
+            SELECT 
+                t.id,
+                t.email,
+                t.title,
+                t.last_update,
+                c.nome,
+                c.cognome
+            FROM ticket t
+            LEFT JOIN customer c ON t.user_id_id = c.id
+            WHERE t.status = 1
+              AND (t.is_auto = 0 OR t.is_auto IS NULL)
+              AND {self._today_closed_condition()}
+            ORDER BY {self._order_column()} DESC
+            LIMIT %s
+        """
+    
+    @staticmethod
+    def _six_months_ago() -> int:
+        return int((datetime.now() - timedelta(days=180)).timestamp())
     
     def get_ticket_stats(self) -> Dict:
         """
@@ -47,49 +260,8 @@ class AnastasiaClient:
             Dict con: total, open, closed, today_closed
         """
         try:
-            conn = self._get_connection()
-            cursor = conn.cursor(dictionary=True)
-            
-            # Calcola timestamp 6 mesi fa
-            six_months_ago = int((datetime.now() - timedelta(days=180)).timestamp())
-            
-            # Query separata per open (con filtro 6 mesi) e closed/total
-            query_open = """
-                SELECT COUNT(*) as open
-                FROM ticket
-                WHERE status = 0 
-                  AND (is_auto = 0 OR is_auto IS NULL)
-                  AND CAST(last_update AS UNSIGNED) >= %s
-            """
-            
-            cursor.execute(query_open, (six_months_ago,))
-            open_count = cursor.fetchone()['open']
-            
-            query_other = """
-                SELECT 
-                    COUNT(*) as total,
-                    SUM(CASE WHEN status = 1 THEN 1 ELSE 0 END) as closed,
-                    SUM(CASE 
-                        WHEN status = 1 
-                        AND DATE(FROM_UNIXTIME(CAST(last_update AS UNSIGNED))) = CURDATE() 
-                        THEN 1 ELSE 0 
-                    END) as today_closed
-                FROM ticket
-                WHERE is_auto = 0 OR is_auto IS NULL
-            """
-            
-            cursor.execute(query_other)
-            stats = cursor.fetchone()
-            
-            cursor.close()
-            conn.close()
-            
-            return {
-                'total': stats['total'] or 0,
-                'open': open_count or 0,
-                'closed': stats['closed'] or 0,
-                'today_closed': stats['today_closed'] or 0
-            }
+            stats = self._run_query(self._stats_query(), (self._six_months_ago(),), fetch_one=True)
+            return self._format_stats(stats)
             
         except Exception as e:
             logger.error(f"Errore get_ticket_stats: {e}")
@@ -106,55 +278,8 @@ class AnastasiaClient:
             Lista di dict con info ticket
         """
         try:
-            conn = self._get_connection()
-            cursor = conn.cursor(dictionary=True)
-            
-            # Timestamp 6 mesi fa
-            six_months_ago = int((datetime.now() - timedelta(days=180)).timestamp())
-            
-            query = """
-                SELECT 
-                    t.id,
-                    t.email,
-                    t.title,
-                    t.creation_date,
-                    t.last_update,
-                    t.status,
-                    t.blue_tick,
-                    c.nome,
-                    c.cognome,
-                    c.phone
-                FROM ticket t
-                LEFT JOIN customer c ON t.user_id_id = c.id
-                WHERE t.status = 0 
-                  AND (t.is_auto = 0 OR t.is_auto IS NULL)
-                  AND CAST(t.last_update AS UNSIGNED) >= %s
-                ORDER BY t.last_update DESC
-                LIMIT %s
-            """
-            
-            cursor.execute(query, (six_months_ago, limit))
-            tickets = cursor.fetchall()
-            
-            # Formatta i risultati
-            formatted_tickets = []
-            for ticket in tickets:
-                formatted_tickets.append({
-                    'id': ticket['id'],
-                    'email': ticket['email'],
-                    'title': ticket['title'] or 'Senza titolo',
-                    'customer_name': f"{ticket['nome'] or ''} {ticket['cognome'] or ''}".strip() or 'N/A',
-                    'phone': ticket['phone'],
-                    'creation_date': self._format_timestamp(ticket['creation_date']),
-                    'last_update': self._format_timestamp(ticket['last_update']),
-                    'last_update_raw': ticket['last_update'],
-                    'blue_tick': ticket['blue_tick'] or 0
-                })
-            
-            cursor.close()
-            conn.close()
-            
-            return formatted_tickets
+            tickets = self._run_query(self._open_query(), (self._six_months_ago(), limit))
+            return [self._format_open_ticket(t) for t in tickets]
             
         except Exception as e:
             logger.error(f"Errore get_open_tickets: {e}")
@@ -171,48 +296,69 @@ class AnastasiaClient:
             Lista di dict con info ticket chiusi
         """
         try:
-            conn = self._get_connection()
-            cursor = conn.cursor(dictionary=True)
-            
-            query = """
-                SELECT 
-                    t.id,
-                    t.email,
-                    t.title,
-                    t.last_update,
-                    c.nome,
-                    c.cognome
-                FROM ticket t
-                LEFT JOIN customer c ON t.user_id_id = c.id
-                WHERE t.status = 1
-                  AND (t.is_auto = 0 OR t.is_auto IS NULL)
-                  AND DATE(FROM_UNIXTIME(CAST(t.last_update AS UNSIGNED))) = CURDATE()
-                ORDER BY t.last_update DESC
-                LIMIT %s
-            """
-            
-            cursor.execute(query, (limit,))
-            tickets = cursor.fetchall()
-            
-            formatted_tickets = []
-            for ticket in tickets:
-                formatted_tickets.append({
-                    'id': ticket['id'],
-                    'email': ticket['email'],
-                    'title': ticket['title'] or 'Senza titolo',
-                    'customer_name': f"{ticket['nome'] or ''} {ticket['cognome'] or ''}".strip() or 'N/A',
-                    'last_update': self._format_timestamp(ticket['last_update'])
-                })
-            
-            cursor.close()
-            conn.close()
-            
-            return formatted_tickets
+            tickets = self._run_query(self._closed_today_query(), (limit,))
+            return [self._format_closed_ticket(t) for t in tickets]
             
         except Exception as e:
             logger.error(f"Errore get_recent_closed_tickets: {e}")
             return []
     
+    def get_ticket_snapshot(self, open_limit: int = 10, closed_limit: int = 5) -> Dict:
+        """
+        Statistiche + ticket aperti + chiusi oggi con un solo prelievo dal
+        pool (tre SELECT in sequenza sulla stessa connessione)
+        
+        Returns:
+            Dict con 'stats', 'open_tickets', 'closed_today'
+            
+        Raises:
+            Exception se il database non risponde (il chiamante tiene lo snapshot precedente)
+        """
+        six_months_ago = self._six_months_ago()
+        stats_rows, open_rows, closed_rows = self._run_many([
+            (self._stats_query(), (six_months_ago,)),
+            (self._open_query(), (six_months_ago, open_limit)),
+            (self._closed_today_query(), (closed_limit,))
+        ])
+        
+        return {
+            'stats': self._format_stats(stats_rows[0] if stats_rows else {}),
+            'open_tickets': [self._format_open_ticket(t) for t in open_rows],
+            'closed_today': [self._format_closed_ticket(t) for t in closed_rows]
+        }
+    
+    @staticmethod
+    def _format_stats(stats: Dict) -> Dict:
+        return {
+            'total': int(stats.get('total') or 0),
+            'open': int(stats.get('open') or 0),
+            'closed': int(stats.get('closed') or 0),
+            'today_closed': int(stats.get('today_closed') or 0)
+        }
+    
+    def _format_open_ticket(self, ticket: Dict) -> Dict:
+        return {
+            'id': ticket['id'],
+            'email': ticket['email'],
+            'title': ticket['title'] or 'Senza titolo',
+            'customer_name': f"{ticket['nome'] or ''} {ticket['cognome'] or ''}".strip() or 'N/A',
+            'phone': ticket['phone'],
+            'creation_date': self._format_timestamp(ticket['creation_date']),
+            'last_update': self._format_timestamp(ticket['last_update']),
+            'last_update_raw': ticket['last_update'],
+            'blue_tick': ticket['blue_tick'] or 0
+        }
+    
+    def _format_closed_ticket(self, ticket: Dict) -> Dict:
+        return {
+            'id': ticket['id'],
+            'email': ticket['email'],
+            'title': ticket['title'] or 'Senza titolo',
+            'customer_name': f"{ticket['nome'] or ''} {ticket['cognome'] or ''}".strip() or 'N/A',
+            'last_update': self._format_timestamp(ticket['last_update']),
+            'last_update_raw': ticket['last_update']
+        }
+    
     def _format_timestamp(self, timestamp) -> str:
         """
         Converte timestamp (Unix o stringa MySQL) in stringa leggibile
@@ -279,12 +425,7 @@ class AnastasiaClient:
             True se connessione OK, False altrimenti
         """
         try:
-            conn = self._get_connection()
-            cursor = conn.cursor()
-            cursor.execute("SELECT 1")
-            cursor.fetchone()
-            cursor.close()
-            conn.close()
+            self._run_query("SELECT 1", fetch_one=True)
             return True
         except Exception as e:
             logger.error(f"Health check failed: {e}")
@@ -4,7 +4,18 @@ Client BackMarket API
 """
 import requests
 import logging
-from typing import List, Dict
+import threading
+import time
+from functools import partial
+from typing import List, Dict, Optional
+
+from config import (
+    BACKMARKET_ORDERLINE_CONCURRENCY,
+    BACKMARKET_TASK_MAX_CHECKS,
+    BACKMARKET_TASK_MAX_AGE
+)
+from utils.concurrency import run_parallel
+from .transport import get_transport
 
 logger = logging.getLogger(__name__)
 
@@ -18,14 +29,29 @@ class BackMarketClient:
             'Content-Type': 'application/json',
             'Accept': 'application/json'
         }
+        self.http = get_transport('backmarket')
+        
+        # Upload catalogo asincroni in attesa di esito:
+        # task_id -> {'skus', 'enqueued_at', 'checks'}
+        self._pending_listing_tasks: Dict[str, Dict] = {}
+        self._tasks_lock = threading.Lock()
     
-    def get_orders(self, status: str = None, limit: int = 500) -> List[Dict]:
+    def get_orders(
+        self,
+        status: str = None,
+        limit: int = 500,
+        modified_since: str = None,
+        raise_errors: bool = False
+    ) -> List[Dict]:
         """
         Recupera ordini BackMarket
         
         Args:
             status: Filtra per stato (es. 'new', 'to_ship')
             limit: Numero massimo di ordini da recuperare (default 500 per includere ordini più vecchi)
+            modified_since: Solo ordini modificati dopo questa data ('YYYY-MM-DD HH:MM:SS', sync incrementale)
+            raise_errors: Rilancia gli errori invece di ritornare [] (il chiamante
+                deve distinguere "nessun ordine" da "canale non raggiungibile")
         """
         try:
             url = f"{self.base_url}/ws/orders"
@@ -34,9 +60,12 @@ class BackMarketClient:
             if status:
                 params['status'] = status
             
-            logger.info(f"[BACKMARKET] Recupero ordini (status={status}, limit={limit})")
+            if modified_since:
+                params['date_modification'] = modified_since
+            
+            logger.info(f"[BACKMARKET] Recupero ordini (status={status}, limit={limit}, modified_since={modified_since})")
             
-            response = requests.get(url, headers=self.headers, params=params)
+            response = self.http.get(url, headers=self.headers, params=params)
             response.raise_for_status()
             data = response.json()
             orders = data.get('results', [])
@@ -44,47 +73,48 @@ class BackMarketClient:
             return orders
         except Exception as e:
             logger.error(f"Errore BackMarket get_orders: {e}")
+            if raise_errors:
+                raise
             return []
     
-    def accept_order(self, order_id: str) -> bool:
-        """Accetta un ordine su BackMarket aggiornando le orderlines allo stato 2"""
+    def get_order(self, order_id: str) -> Optional[Dict]:
+        """Recupera un singolo ordine BackMarket per ID (None se non trovato)"""
         try:
-            order_url = f"{self.base_url}/ws/orders/{order_id}"
-            order_response = requests.get(order_url, headers=self.headers)
+            response = self.http.get(f"{self.base_url}/ws/orders/{order_id}", headers=self.headers)
             
-            if order_response.status_code != 200:
+            if response.status_code == 404:
+                logger.warning(f"[BACKMARKET] Ordine {order_id} non trovato")
+                return None
+            
+            response.raise_for_status()
+            return response.json()
+        except Exception as e:
+            logger.error(f"Errore BackMarket get_order {order_id}: {e}")
+            return None
+    
+    def accept_order(self, order_id: str, order_data: Dict = None) -> bool:
+        """
+        Accetta un ordine su BackMarket aggiornando le orderlines allo stato 2
+        
+        Args:
+            order_id: ID ordine BackMarket
+            order_data: Ordine già recuperato (con 'orderlines'); se assente viene riletto
+        """
+        try:
+            order_data = self._resolve_order(order_id, order_data)
+            if order_data is None:
                 logger.error(f"Impossibile recuperare dettagli ordine {order_id}")
                 return False
             
-            order_data = order_response.json()
             orderlines = order_data.get('orderlines', [])
             
             if not orderlines:
                 logger.error(f"Nessuna orderline trovata per ordine {order_id}")
                 return False
             
-            success_count = 0
-            for orderline in orderlines:
-                sku = orderline.get('listing') or orderline.get('serial_number')
-                
-                if not sku:
-                    logger.warning(f"SKU mancante per orderline in ordine {order_id}")
-                    continue
-                
-                update_url = f"{self.base_url}/ws/orders/{order_id}"
-                data = {
-                    "order_id": int(order_id),
-                    "new_state": 2,
-                    "sku": sku
-                }
-                
-                response = requests.post(update_url, headers=self.headers, json=data)
-                
-                if response.status_code == 200:
-                    logger.info(f"Orderline {sku} accettata per ordine {order_id}")
-                    success_count += 1
-                else:
-                    logger.error(f"Errore accettazione orderline {sku}: {response.status_code} - {response.text}")
+            success_count = self._update_orderlines(
+                order_id, orderlines, {"new_state": 2}, 'accettata'
+            )
             
             if success_count > 0:
                 logger.info(f"Ordine {order_id} accettato: {success_count}/{len(orderlines)} orderlines")
@@ -99,37 +129,96 @@ class BackMarketClient:
             logger.error(f"Errore imprevisto: {e}")
             return False
     
+    def _resolve_order(self, order_id: str, order_data: Dict = None) -> Optional[Dict]:
+        """Usa l'ordine già recuperato se contiene le orderlines, altrimenti lo rilegge"""
+        if order_data and order_data.get('orderlines'):
+            return order_data
+        return self.get_order(order_id)
+    
+    def _update_orderlines(self, order_id: str, orderlines: List[Dict], changes: Dict, label: str) -> int:
+        """
+        Invia in parallelo (max BACKMARKET_ORDERLINE_CONCURRENCY) un cambio
+        di stato per ogni orderline
+        
+        Returns:
+            Numero di orderlines aggiornate con successo
+        """
+        update_url = f"{self.base_url}/ws/orders/{order_id}"
+        
+        def _post(sku: str) -> bool:
+            data = {"order_id": int(order_id), "sku": sku, **changes}
+            response = self.http.post(update_url, headers=self.headers, json=data)
+            if response.status_code == 200:
+                logger.info(f"Orderline {sku} {label} per ordine {order_id}")
+                return True
+            logger.error(f"Errore orderline {sku} ({label}): {response.status_code} - {response.text}")
+            return False
+        
+        # Chiave per posizione: due orderlines con lo stesso SKU restano due POST
+        tasks = {}
+        for idx, orderline in enumerate(orderlines):
+            sku = orderline.get('listing') or orderline.get('serial_number')
+            
+            if not sku:
+                logger.warning(f"SKU mancante per orderline in ordine {order_id}")
+                continue
+            
+            tasks[f"{idx}:{sku}"] = partial(_post, sku)
+        
+        fetched = run_parallel(tasks, max_workers=BACKMARKET_ORDERLINE_CONCURRENCY)
+        return sum(1 for outcome in fetched.values() if outcome['result'])
+    
     def disable_listing(self, listing_id: str) -> bool:
         """
         Disabilita un listing su BackMarket impostando quantity a 0
         
-        Usa l'endpoint POST /ws/listings con formato CSV batch.
+        Args:
+            listing_id: SKU del prodotto da disabilitare
+            
+        Returns:
+            True se successo o listing non trovato, False se errore critico
+        """
+        if not listing_id or listing_id.strip() == '':
+            logger.error(f"[BACKMARKET-DISABLE] ❌ SKU vuoto!")
+            return False
+        
+        return self.disable_listings([listing_id])['success']
+    
+    def disable_listings(self, skus: List[str]) -> Dict:
+        """
+        Disabilita più listing su BackMarket con un solo upload di catalogo
+        
+        Usa l'endpoint POST /ws/listings con formato CSV batch (una riga per SKU).
         Secondo il supporto BackMarket: "This endpoint has very few required fields, 
         and you could update a listing with only its SKU and quantity."
+        L'elaborazione è asincrona (202): il task viene registrato e il suo
+        esito controllato al giro successivo con check_listing_tasks().
         
         Documentazione: https://api.backmarket.dev/#/paths/ws-listings/post
         
         Args:
-            listing_id: SKU del prodotto da disabilitare
+            skus: SKU dei prodotti da disabilitare
             
         Returns:
-            True se successo o listing non trovato, False se errore critico
+            Dict con success, skus, task_id, status_code, message
         """
+        # Dedup mantenendo l'ordine, scarta SKU vuoti
+        skus = list(dict.fromkeys(s.strip() for s in skus if s and s.strip()))
+        result = {'success': False, 'skus': skus, 'task_id': None, 'status_code': None, 'message': ''}
+        
+        if not skus:
+            result['message'] = 'Nessuno SKU da disabilitare'
+            return result
+        
         try:
             logger.info(f"\n{'='*60}")
-            logger.info(f"[BACKMARKET-DISABLE] 🔧 Disabilitazione listing BackMarket")
-            logger.info(f"[BACKMARKET-DISABLE] SKU: '{listing_id}'")
+            logger.info(f"[BACKMARKET-DISABLE] 🔧 Disabilitazione {len(skus)} listing BackMarket")
+            logger.info(f"[BACKMARKET-DISABLE] SKU: {skus}")
             logger.info(f"{'='*60}")
             
-            if not listing_id or listing_id.strip() == '':
-                logger.error(f"[BACKMARKET-DISABLE] ❌ SKU vuoto!")
-                return False
-            
-            sku = listing_id.strip()
-            
-            # Crea CSV con header e una riga: sku,quantity
+            # CSV con header e una riga per SKU: sku,quantity
             # Usa \r\n per line endings come nell'esempio BackMarket
-            csv_content = f"sku,quantity\r\n{sku},0"
+            csv_content = "sku,quantity\r\n" + "\r\n".join(f"{sku},0" for sku in skus)
             
             url = f"{self.base_url}/ws/listings"
             data = {
@@ -141,96 +230,197 @@ class BackMarketClient:
             
             logger.info(f"[BACKMARKET-DISABLE] POST {url}")
             logger.info(f"[BACKMARKET-DISABLE] CSV Content: {repr(csv_content)}")
-            logger.info(f"[BACKMARKET-DISABLE] Body: {data}")
             
-            response = requests.post(url, headers=self.headers, json=data, timeout=10)
+            response = self.http.post(url, headers=self.headers, json=data, timeout=10)
+            result['status_code'] = response.status_code
             
             logger.info(f"[BACKMARKET-DISABLE] Status: {response.status_code}")
             logger.info(f"[BACKMARKET-DISABLE] Response: {response.text[:500]}")
             
             # 200 = success, 201 = created (shouldn't happen), 202 = accepted (async processing)
             if response.status_code in [200, 201, 202]:
-                logger.info(f"✅ Listing BackMarket con SKU {sku} disabilitato con successo")
-                return True
+                result['success'] = True
+                result['task_id'] = self._extract_task_id(response)
+                result['message'] = f"{len(skus)} listing in aggiornamento"
+                if result['task_id']:
+                    with self._tasks_lock:
+                        self._pending_listing_tasks[result['task_id']] = {
+                            'skus': skus,
+                            'enqueued_at': time.monotonic(),
+                            'checks': 0
+                        }
+                logger.info(f"✅ {len(skus)} listing BackMarket inviati per disabilitazione (task: {result['task_id']})")
             elif response.status_code == 404:
-                logger.warning(f"⚠️ Listing con SKU {sku} non trovato su BackMarket")
-                logger.warning(f"⚠️ Il prodotto potrebbe non essere presente su questo marketplace")
-                return True  # Non blocchiamo il flusso
+                logger.warning(f"⚠️ Listing {skus} non trovati su BackMarket")
+                logger.warning(f"⚠️ I prodotti potrebbero non essere presenti su questo marketplace")
+                result['success'] = True  # Non blocchiamo il flusso
+                result['message'] = 'Listing non trovati'
             elif response.status_code == 400:
                 response_text = response.text[:300]
-                logger.warning(f"⚠️ Errore 400 per SKU {sku}")
+                logger.warning(f"⚠️ Errore 400 per SKU {skus}")
                 logger.warning(f"⚠️ Response: {response_text}")
                 
                 # Controlla se è un errore "listing non trovato"
                 if any(err in response_text.lower() for err in ['not found', 'non trouvé', 'does not exist', 'n\'existe pas']):
                     logger.warning(f"⚠️ Il listing non esiste su BackMarket")
-                    return True  # Non blocchiamo il flusso
-                
-                # Altri errori 400 sono problemi di formato/validazione
-                logger.error(f"❌ Errore di validazione BackMarket (possibile problema formato CSV)")
-                return False
+                    result['success'] = True  # Non blocchiamo il flusso
+                    result['message'] = 'Listing non trovati'
+                else:
+                    # Altri errori 400 sono problemi di formato/validazione
+                    logger.error(f"❌ Errore di validazione BackMarket (possibile problema formato CSV)")
+                    result['message'] = f"HTTP 400: {response_text}"
             else:
                 logger.error(f"❌ Disabilitazione fallita - HTTP {response.status_code}")
                 logger.error(f"❌ Response: {response.text[:300]}")
-                return False
+                result['message'] = f"HTTP {response.status_code}"
         
         except requests.exceptions.Timeout:
             logger.error(f"[BACKMARKET-DISABLE] ⏱️ Timeout durante disabilitazione")
-            return False
+            result['message'] = 'Timeout'
         except requests.exceptions.RequestException as e:
             logger.error(f"[BACKMARKET-DISABLE] ❌ Errore richiesta HTTP: {e}")
-            return False
+            result['message'] = str(e)
         except Exception as e:
             logger.error(f"[BACKMARKET-DISABLE] ❌ Errore generico: {e}")
             logger.exception(e)
-            return False
+            result['message'] = str(e)
+        
+        return result
+    
+    # Stati del task BackMarket ancora in corso / concluso con successo
+    TASK_RUNNING_STATUSES = {'pending', 'processing', 'in_progress', 'waiting', 'queued', 'running'}
+    TASK_DONE_STATUSES = {'done', 'completed', 'complete', 'success', 'succeeded', 'finished'}
     
-    def mark_as_shipped(self, order_id: str, tracking_number: str, tracking_url: str = '', carrier: str = 'BRT') -> bool:
+    def check_listing_tasks(self) -> Dict:
         """
-        Marca un ordine come spedito
+        Controlla l'esito dei task asincroni di aggiornamento catalogo
+        
+        I task conclusi vengono rimossi dai pendenti; quelli ancora in
+        elaborazione (o non verificabili) restano per il controllo successivo
+        fino a BACKMARKET_TASK_MAX_CHECKS controlli / BACKMARKET_TASK_MAX_AGE
+        secondi, poi vengono abbandonati e i loro SKU ritentati. Un 404 (task
+        scaduto o sconosciuto) abbandona subito il task.
+        
+        Returns:
+            Dict con 'completed' (task_id), 'failed' (SKU da ritentare), 'pending' (task_id)
+        """
+        with self._tasks_lock:
+            tasks = dict(self._pending_listing_tasks)
+        
+        summary = {'completed': [], 'failed': [], 'pending': []}
+        
+        for task_id, task in tasks.items():
+            skus = task['skus']
+            status = None
+            reason = None
+            try:
+                response = self.http.get(f"{self.base_url}/ws/tasks/{task_id}", headers=self.headers, timeout=10)
+                if response.status_code == 404:
+                    reason = 'task non trovato (404)'
+                elif response.status_code != 200:
+                    logger.warning(f"[BACKMARKET-TASK] Task {task_id}: HTTP {response.status_code}")
+                else:
+                    status = str(response.json().get('status', '')).lower()
+            except Exception as e:
+                logger.warning(f"[BACKMARKET-TASK] Impossibile verificare task {task_id}: {e}")
+            
+            if status in self.TASK_DONE_STATUSES:
+                self._drop_listing_task(task_id)
+                logger.info(f"✅ [BACKMARKET-TASK] Task {task_id} completato ({status}): {len(skus)} listing")
+                summary['completed'].append(task_id)
+                continue
+            
+            if status in ['failed', 'error']:
+                reason = f"stato '{status}'"
+            elif reason is None:
+                if status and status not in self.TASK_RUNNING_STATUSES:
+                    logger.warning(f"[BACKMARKET-TASK] Task {task_id}: stato sconosciuto '{status}'")
+                # In corso o esito non disponibile: conta il controllo
+                task['checks'] += 1
+                age = time.monotonic() - task['enqueued_at']
+                if task['checks'] < BACKMARKET_TASK_MAX_CHECKS and age < BACKMARKET_TASK_MAX_AGE:
+                    summary['pending'].append(task_id)
+                    continue
+                reason = f"nessun esito dopo {task['checks']} controlli ({int(age)}s)"
+            
+            self._drop_listing_task(task_id)
+            logger.error(f"❌ [BACKMARKET-TASK] Task {task_id} fallito ({reason}), da ritentare: {skus}")
+            summary['failed'].extend(skus)
+        
+        return summary
+    
+    def _drop_listing_task(self, task_id: str):
+        with self._tasks_lock:
+            self._pending_listing_tasks.pop(task_id, None)
+    
+    @staticmethod
+    def _extract_task_id(response) -> Optional[str]:
+        """Estrae l'ID del task asincrono dalla risposta dell'upload catalogo"""
+        try:
+            data = response.json()
+        except ValueError:
+            return None
+        
+        if isinstance(data, dict):
+            task_id = data.get('bodymessage') or data.get('task_id') or data.get('id')
+        else:
+            task_id = data
+        
+        return str(task_id) if isinstance(task_id, (int, str)) and str(task_id).isdigit() else None
+    
+    def mark_as_shipped(
+        self,
+        order_id: str,
+        tracking_number: str,
+        tracking_url: str = '',
+        carrier: str = 'BRT',
+        order_data: Dict = None
+    ) -> bool:
+        """
+        Marca un ordine come spedito (tutte le orderlines, in parallelo)
         
         Args:
             order_id: ID ordine BackMarket
             tracking_number: Numero di tracking
             tracking_url: URL di tracking (opzionale)
             carrier: Corriere utilizzato (UPS, DHL, BRT, GLS, TNT, FEDEX, POSTE, SDA)
+            order_data: Ordine già recuperato (con 'orderlines'); se assente viene riletto
         """
         try:
-            order_url = f"{self.base_url}/ws/orders/{order_id}"
-            order_response = requests.get(order_url, headers=self.headers)
-            
-            if order_response.status_code != 200:
+            order_data = self._resolve_order(order_id, order_data)
+            if order_data is None:
                 return False
             
-            order_data = order_response.json()
             orderlines = order_data.get('orderlines', [])
             
             if not orderlines:
                 return False
             
-            sku = orderlines[0].get('listing') or orderlines[0].get('serial_number')
-            
-            update_url = f"{self.base_url}/ws/orders/{order_id}"
-            update_data = {
-                "order_id": int(order_id),
-                "new_state": 3,
-                "sku": sku,
-                "tracking_number": tracking_number,
-                "tracking_url": tracking_url,
-                "shipper": carrier.upper()  # Aggiungi corriere
-            }
-            
             logger.info(f"[BACKMARKET-SHIP] Ordine {order_id} - Tracking: {tracking_number}, Corriere: {carrier}")
             
-            response = requests.post(update_url, headers=self.headers, json=update_data)
+            success_count = self._update_orderlines(
+                order_id,
+                orderlines,
+                {
+                    "new_state": 3,
+                    "tracking_number": tracking_number,
+                    "tracking_url": tracking_url,
+                    "shipper": carrier.upper()  # Aggiungi corriere
+                },
+                'spedita'
+            )
             
-            if response.status_code == 200:
+            # Spedizione parziale = errore: le orderlines rimaste indietro vanno ritentate
+            if success_count == len(orderlines):
                 logger.info(f"✅ Ordine {order_id} marcato come spedito su BackMarket (corriere: {carrier})")
                 return True
             else:
-                logger.error(f"Errore BackMarket mark shipped: {response.status_code} - {response.text}")
+                logger.error(
+                    f"Errore BackMarket mark shipped per ordine {order_id}: "
+                    f"{success_count}/{len(orderlines)} orderlines aggiornate"
+                )
                 return False
                 
         except Exception as e:
             logger.error(f"Errore mark_as_shipped BackMarket: {e}")
-            return False
\ No newline at end of file
+            return False
@@ -3,10 +3,13 @@ Client per API InvoiceX - Versione con supporto metodo_pagamento
 """
 
 import requests
-from typing import Dict, List, Optional
+from functools import partial
+from typing import Dict, List, Optional, Tuple
 import logging
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
+
+from config import INVOICEX_BULK_MOVEMENT_PATH, INVOICEX_MOVEMENT_CONCURRENCY
+from utils.concurrency import run_parallel
+from .transport import get_transport
 
 
 class InvoiceXAPIClient:
@@ -15,28 +18,36 @@ class InvoiceXAPIClient:
     Gestisce creazione clienti, DDT e movimentazione prodotti
     """
     
-    def __init__(self, base_url: str, api_key: str, timeout: int = 30):
+    def __init__(self, base_url: str, api_key: str, timeout: int = 30, customer_cache=None):
         self.base_url = base_url.rstrip('/')
         self.api_key = api_key
         self.timeout = timeout
         self.logger = logging.getLogger(__name__)
         
-        # Configura sessione con retry automatici
-        self.session = requests.Session()
-        retry_strategy = Retry(
-            total=3,
-            backoff_factor=1,
-            status_forcelist=[429, 500, 502, 503, 504]
-        )
-        adapter = HTTPAdapter(max_retries=retry_strategy)
-        self.session.mount("http://", adapter)
-        self.session.mount("https://", adapter)
+        # Cache email -> codice cliente (evita le ricerche per clienti abituali)
+        if customer_cache is None:
+            from utils.customer_cache import CustomerCodeCache
+            customer_cache = CustomerCodeCache()
+        self.customer_cache = customer_cache
+        
+        # Sessione condivisa con pool keep-alive e retry automatici
+        self.session = get_transport('invoicex', max_retries=3, backoff_factor=1, timeout=timeout)
+        
+        # Creazione DDT e movimentazioni sono GET ma non idempotenti (creano il
+        # documento, scaricano il magazzino): sessione separata senza retry,
+        # una risposta persa non va rispedita
+        self.movement_session = get_transport('invoicex-movimenti', max_retries=0, timeout=timeout)
+        
+        # Endpoint bulk per la movimentazione (opzionale): disattivato fino al
+        # riavvio alla prima risposta non 2xx o illeggibile, poi si usa la
+        # raffica riga-per-riga
+        self.bulk_movement_path = INVOICEX_BULK_MOVEMENT_PATH.strip('/')
         
         # Headers comuni
-        self.session.headers.update({
+        self.headers = {
             'Apikey': api_key,
             'Content-Type': 'application/json'
-        })
+        }
     
     def cerca_cliente_per_email(self, email: str) -> bool:
         """
@@ -49,8 +60,9 @@ class InvoiceXAPIClient:
             True se cliente esiste, False altrimenti
         """
         try:
-            response = requests.get(
+            response = self.session.get(
                 f"{self.base_url}/cercapermail/{email}",
+                headers=self.headers,
                 timeout=self.timeout
             )
             response.raise_for_status()
@@ -72,21 +84,32 @@ class InvoiceXAPIClient:
         Returns:
             Codice cliente o None se non trovato
         """
+        codice, _ = self._cerca_codice_cliente(email)
+        return codice
+    
+    def _cerca_codice_cliente(self, email: str) -> Tuple[Optional[str], bool]:
+        """
+        Ricerca combinata: una sola chiamata dice se il cliente esiste e con che codice
+        
+        Returns:
+            (codice o None, True se la risposta è affidabile / False se errore di rete)
+        """
         try:
-            response = requests.get(
+            response = self.session.get(
                 f"{self.base_url}/recuperacodicedaemail/{email}",
+                headers=self.headers,
                 timeout=self.timeout
             )
             response.raise_for_status()
             
             codice = response.text.strip()
             if codice and codice != "0" and codice != "":
-                return codice
-            return None
+                return codice, True
+            return None, True
             
         except requests.exceptions.RequestException as e:
             self.logger.error(f"Errore recupero codice per {email}: {e}")
-            return None
+            return None, False
     
     def crea_cliente(self, dati_cliente: Dict) -> Optional[str]:
         """
@@ -123,6 +146,7 @@ class InvoiceXAPIClient:
             response = self.session.post(
                 f"{self.base_url}/inserisci-cliente-da-magento",
                 json=payload,
+                headers=self.headers,
                 timeout=self.timeout
             )
             response.raise_for_status()
@@ -165,10 +189,11 @@ class InvoiceXAPIClient:
         }
         
         try:
-            response = self.session.request(
+            response = self.movement_session.request(
                 'GET',
                 f"{self.base_url}/crea-ddt-vendita-codice/{codice_cliente}",
                 json=payload,
+                headers=self.headers,
                 timeout=self.timeout
             )
             response.raise_for_status()
@@ -217,10 +242,11 @@ class InvoiceXAPIClient:
         }
         
         try:
-            response = self.session.request(
+            response = self.movement_session.request(
                 'GET',
                 f"{self.base_url}/movimenta-ddt-vendita",
                 json=payload,
+                headers=self.headers,
                 timeout=self.timeout
             )
             response.raise_for_status()
@@ -245,6 +271,147 @@ class InvoiceXAPIClient:
             )
             return False
     
+    def movimenta_prodotti_ddt(self, id_ddt: str, righe: List[Dict]) -> List[Dict]:
+        """
+        Movimenta tutte le righe di un DDT
+        
+        Usa l'endpoint bulk (una sola richiesta) se disponibile, altrimenti
+        invia le righe con chiamate singole in parallelo
+        (INVOICEX_MOVEMENT_CONCURRENCY alla volta).
+        
+        Args:
+            id_ddt: ID DDT padre
+            righe: Lista di dict con 'matricola', 'prezzo', 'riga'
+            
+        Returns:
+            Lista (stesso ordine di righe) di dict con
+            'matricola', 'riga', 'success', 'error'
+        """
+        if not righe:
+            return []
+        
+        if self.bulk_movement_path:
+            risultati = self._movimenta_bulk(id_ddt, righe)
+            if risultati is not None:
+                return risultati
+        
+        return self._movimenta_raffica(id_ddt, righe)
+    
+    def _movimenta_bulk(self, id_ddt: str, righe: List[Dict]) -> Optional[List[Dict]]:
+        """
+        Tutte le righe in una richiesta (GET con body JSON, come l'endpoint singolo)
+        
+        Returns:
+            Risultati per riga, o None se la richiesta è stata rifiutata senza
+            effetti (4xx/501) e le righe vanno movimentate singolarmente
+        """
+        payload = {
+            'idPadreDDT': str(id_ddt),
+            'righe': [
+                {
+                    'matricola': str(r['matricola']),
+                    'riga': str(r['riga']),
+                    'prezzo': f"{float(r['prezzo']):.2f}"
+                }
+                for r in righe
+            ]
+        }
+        
+        try:
+            response = self.movement_session.request(
+                'GET',
+                f"{self.base_url}/{self.bulk_movement_path}",
+                json=payload,
+                headers=self.headers,
+                timeout=self.timeout
+            )
+            
+            if 400 <= response.status_code < 500 or response.status_code == 501:
+                # Richiesta rifiutata senza effetti (endpoint assente o formato
+                # diverso): questo DDT passa subito alla raffica
+                self._disattiva_bulk(f"HTTP {response.status_code}")
+                return None
+            
+            response.raise_for_status()
+            try:
+                esiti = self._esiti_per_riga(response.json())
+            except (ValueError, AttributeError, TypeError):
+                self._disattiva_bulk(f"risposta illeggibile: {response.text[:200]}")
+                raise ValueError(f"Risposta bulk illeggibile (HTTP {response.status_code})")
+            
+        except (requests.exceptions.RequestException, ValueError) as e:
+            if isinstance(e, requests.exceptions.HTTPError):
+                self._disattiva_bulk(str(e))
+            # Nessun nuovo tentativo (né automatico né riga per riga): la
+            # richiesta potrebbe essere stata applicata e si rischierebbe di
+            # movimentare due volte
+            self.logger.error(f"Errore movimentazione bulk DDT {id_ddt}: {e}")
+            return [
+                {'matricola': r['matricola'], 'riga': r['riga'], 'success': False, 'error': str(e)}
+                for r in righe
+            ]
+        
+        risultati = []
+        for r in righe:
+            esito = esiti.get(str(r['riga']))
+            if esito is None:
+                risultati.append({
+                    'matricola': r['matricola'], 'riga': r['riga'],
+                    'success': False, 'error': 'Riga assente nella risposta'
+                })
+            elif esito != "0":
+                risultati.append({'matricola': r['matricola'], 'riga': r['riga'], 'success': True, 'error': None})
+            else:
+                risultati.append({
+                    'matricola': r['matricola'], 'riga': r['riga'],
+                    'success': False, 'error': 'Prodotto non trovato in magazzino'
+                })
+        
+        ok = sum(1 for r in risultati if r['success'])
+        self.logger.info(f"Movimentazione bulk DDT {id_ddt}: {ok}/{len(righe)} righe OK")
+        return risultati
+    
+    def _disattiva_bulk(self, motivo: str):
+        """Da qui al riavvio le movimentazioni vanno riga per riga"""
+        if self.bulk_movement_path:
+            self.logger.warning(
+                f"Endpoint bulk '{self.bulk_movement_path}' disattivato ({motivo}): "
+                f"uso movimentazione riga per riga"
+            )
+            self.bulk_movement_path = ''
+    
+    @staticmethod
+    def _esiti_per_riga(data) -> Dict[str, str]:
+        """Normalizza la risposta bulk in riga -> esito ('0' = non movimentata)"""
+        if isinstance(data, dict):
+            data = data.get('righe', [])
+        
+        esiti = {}
+        for item in data or []:
+            if isinstance(item, dict) and 'riga' in item:
+                esiti[str(item['riga'])] = str(item.get('esito', '0')).strip()
+        return esiti
+    
+    def _movimenta_raffica(self, id_ddt: str, righe: List[Dict]) -> List[Dict]:
+        """Chiamate singole inviate in parallelo sulla sessione keep-alive"""
+        tasks = {
+            str(r['riga']): partial(self.movimenta_prodotto_ddt, id_ddt, r['matricola'], r['prezzo'], r['riga'])
+            for r in righe
+        }
+        fetched = run_parallel(
+            tasks,
+            default_timeout=self.timeout * 2,
+            max_workers=min(INVOICEX_MOVEMENT_CONCURRENCY, len(tasks))
+        )
+        
+        risultati = []
+        for r in righe:
+            esito = fetched[str(r['riga'])]
+            success = bool(esito['result'])
+            errore = esito['error'] or (None if success else 'Movimentazione fallita')
+            risultati.append({'matricola': r['matricola'], 'riga': r['riga'], 'success': success, 'error': errore})
+        return risultati
+    
     def assicura_cliente_esista(self, dati_cliente: Dict) -> Optional[str]:
         """
         Verifica che cliente esista, creandolo se necessario
@@ -260,16 +427,28 @@ class InvoiceXAPIClient:
             self.logger.error("Email mancante nei dati cliente")
             return None
         
-        # Verifica se esiste
-        if self.cerca_cliente_per_email(email):
-            codice = self.get_codice_cliente(email)
+        # Cache: per i clienti abituali nessuna chiamata di rete
+        cached, codice = self.customer_cache.get(email)
+        if codice:
+            self.logger.info(f"Cliente esistente trovato (cache): {codice}")
+            return codice
+        
+        # Verifica se esiste (saltata se la cache sa già che non esiste)
+        if not cached:
+            codice, affidabile = self._cerca_codice_cliente(email)
             if codice:
                 self.logger.info(f"Cliente esistente trovato: {codice}")
+                self.customer_cache.put(email, codice)
                 return codice
+            if affidabile:
+                self.customer_cache.put_negative(email)
         
         # Crea nuovo
         self.logger.info(f"Creazione nuovo cliente: {email}")
-        return self.crea_cliente(dati_cliente)
+        codice = self.crea_cliente(dati_cliente)
+        if codice:
+            self.customer_cache.put(email, codice)
+        return codice
     
     def health_check(self) -> bool:
         """
@@ -279,15 +458,16 @@ class InvoiceXAPIClient:
             True se API raggiungibile, False altrimenti
         """
         try:
-            response = requests.get(
+            response = self.session.get(
                 f"{self.base_url}/cercapermail/test@healthcheck.com",
+                headers=self.headers,
                 timeout=5
             )
             return response.status_code in [200, 404]
         except Exception as e:
             self.logger.error(f"Health check fallito: {e}")
             return False
-    def verifica_ddt_esiste(self, riferimento: str) -> bool:
+    def verifica_ddt_esiste(self, riferimento: str) -> Optional[bool]:
         """
         Verifica se esiste già un DDT con un determinato riferimento
         
@@ -295,33 +475,65 @@ class InvoiceXAPIClient:
             riferimento: Riferimento DDT (es. "MAGENTO-000001234")
             
         Returns:
-            True se esiste, False altrimenti
+            True se esiste, False se non esiste, None se la verifica non è
+            riuscita (da non trattare come "non esiste": si rischia il duplicato)
         """
         try:
             # Cerca DDT per riferimento
             response = self.session.get(
                 f"{self.base_url}/ddt-vendita",
                 params={'riferimento': riferimento},
+                headers=self.headers,
                 timeout=10
             )
             
-            if response.status_code == 200:
-                data = response.json()
-                
-                # Se ritorna array con almeno 1 elemento, il DDT esiste
-                if isinstance(data, list) and len(data) > 0:
-                    self.logger.info(f"✅ DDT con riferimento '{riferimento}' già esistente")
-                    return True
-                
-                # Se ritorna oggetto singolo, il DDT esiste
-                if isinstance(data, dict) and data.get('id'):
-                    self.logger.info(f"✅ DDT con riferimento '{riferimento}' già esistente")
-                    return True
+            if response.status_code == 404:
+                self.logger.info(f"ℹ️ DDT con riferimento '{riferimento}' non trovato")
+                return False
+            
+            response.raise_for_status()
+            data = response.json()
+            
+            # Se ritorna array con almeno 1 elemento, il DDT esiste
+            if isinstance(data, list) and len(data) > 0:
+                self.logger.info(f"✅ DDT con riferimento '{riferimento}' già esistente")
+                return True
+            
+            # Se ritorna oggetto singolo, il DDT esiste
+            if isinstance(data, dict) and data.get('id'):
+                self.logger.info(f"✅ DDT con riferimento '{riferimento}' già esistente")
+                return True
             
             self.logger.info(f"ℹ️ DDT con riferimento '{riferimento}' non trovato")
             return False
             
         except Exception as e:
-            self.logger.warning(f"⚠️ Errore verifica DDT esistente: {e}")
-            # In caso di errore, assumiamo non esista (meglio duplicare che perdere ordine)
-            return False
\ No newline at end of file
+            self.logger.warning(f"⚠️ Errore verifica DDT esistente '{riferimento}': {e}")
+            return None
+    
+    def elenca_ddt_vendita(self) -> Optional[List[Dict]]:
+        """
+        Elenca i DDT vendita (/ddt-vendita senza filtro) per allineare l'indice locale
+        
+        L'endpoint è documentato solo con il filtro per riferimento: il
+        chiamante deve verificare che l'elenco sia davvero completo.
+        
+        Returns:
+            Lista di dict con almeno 'id' e 'riferimento', None in caso di errore
+        """
+        try:
+            response = self.session.get(
+                f"{self.base_url}/ddt-vendita",
+                headers=self.headers,
+                timeout=self.timeout
+            )
+            response.raise_for_status()
+            data = response.json()
+            
+            if isinstance(data, dict):
+                data = [data] if data.get('id') else []
+            return [d for d in data if isinstance(d, dict)]
+            
+        except (requests.exceptions.RequestException, ValueError) as e:
+            self.logger.error(f"Errore elenco DDT vendita: {e}")
+            return None
@@ -1,7 +1,11 @@
 import requests
+from functools import partial
 from typing import Dict, List, Optional
 import logging
 
+from utils.concurrency import run_parallel
+from .transport import get_transport
+
 logger = logging.getLogger(__name__)
 
 class MagentoAPIClient:
@@ -25,13 +29,14 @@ class MagentoAPIClient:
             'Authorization': f'Bearer {self.token}',
             'Content-Type': 'application/json'
         }
+        self.http = get_transport('magento')
     
     def _make_request(self, method: str, endpoint: str, **kwargs) -> Optional[Dict]:
         """Esegue una richiesta HTTP all'API Magento"""
         url = f"{self.base_url}{endpoint}"
         
         try:
-            response = requests.request(
+            response = self.http.request(
                 method=method,
                 url=url,
                 headers=self.headers,
@@ -53,8 +58,14 @@ class MagentoAPIClient:
                 logger.error(f"Response: {e.response.text}")
             return None
     
-    def get_processing_orders(self) -> List[Dict]:
-        """Recupera tutti gli ordini in stato 'processing'"""
+    def get_processing_orders(self, updated_since: str = None, raise_errors: bool = False) -> List[Dict]:
+        """
+        Recupera tutti gli ordini in stato 'processing'
+        
+        Args:
+            updated_since: Solo ordini aggiornati dopo questa data ('YYYY-MM-DD HH:MM:SS', sync incrementale)
+            raise_errors: Rilancia un errore se la chiamata fallisce invece di ritornare []
+        """
         endpoint = "/rest/V1/orders"
         
         params = {
@@ -63,8 +74,18 @@ class MagentoAPIClient:
             'searchCriteria[filter_groups][0][filters][0][condition_type]': 'eq'
         }
         
+        if updated_since:
+            params.update({
+                'searchCriteria[filter_groups][1][filters][0][field]': 'updated_at',
+                'searchCriteria[filter_groups][1][filters][0][value]': updated_since,
+                'searchCriteria[filter_groups][1][filters][0][condition_type]': 'gt'
+            })
+        
         result = self._make_request('GET', endpoint, params=params)
         
+        if result is None and raise_errors:
+            raise RuntimeError("Elenco ordini Magento non disponibile")
+        
         if result and 'items' in result:
             logger.info(f"Recuperati {len(result['items'])} ordini Magento in processing")
             return result['items']
@@ -91,6 +112,25 @@ class MagentoAPIClient:
         logger.warning("Nessun ordine Magento pending trovato")
         return []
 
+    def get_order_by_increment_id(self, increment_id: str) -> Optional[Dict]:
+        """Recupera un singolo ordine per numero ordine (increment_id)"""
+        endpoint = "/rest/V1/orders"
+        
+        params = {
+            'searchCriteria[filter_groups][0][filters][0][field]': 'increment_id',
+            'searchCriteria[filter_groups][0][filters][0][value]': increment_id,
+            'searchCriteria[filter_groups][0][filters][0][condition_type]': 'eq',
+            'searchCriteria[pageSize]': 1
+        }
+        
+        result = self._make_request('GET', endpoint, params=params)
+        
+        if result and result.get('items'):
+            return result['items'][0]
+        
+        logger.warning(f"Ordine Magento #{increment_id} non trovato")
+        return None
+
     def update_order_to_processing(self, entity_id: int) -> bool:
         """
         Aggiorna un ordine da 'pending' a 'processing' creando una invoice.
@@ -157,9 +197,15 @@ class MagentoAPIClient:
         logger.error(f"Impossibile recuperare dettagli ordine #{entity_id}")
         return None
     
-    def get_all_orders_with_details(self) -> List[Dict]:
-        """Recupera tutti gli ordini in processing con dettagli completi"""
-        orders = self.get_processing_orders()
+    def get_all_orders_with_details(self, raise_errors: bool = False) -> List[Dict]:
+        """
+        Recupera tutti gli ordini in processing con dettagli completi
+        
+        Args:
+            raise_errors: Rilancia un errore se l'elenco o un dettaglio non è
+                disponibile (un ordine mancante non va scambiato per evaso)
+        """
+        orders = self.get_processing_orders(raise_errors=raise_errors)
         detailed_orders = []
         
         for order in orders:
@@ -168,6 +214,8 @@ class MagentoAPIClient:
                 details = self.get_order_details(entity_id)
                 if details:
                     detailed_orders.append(details)
+                elif raise_errors:
+                    raise RuntimeError(f"Dettaglio ordine Magento #{entity_id} non disponibile")
         
         return detailed_orders
     
@@ -208,13 +256,6 @@ class MagentoAPIClient:
                 }
             }
             
-            result_default = self._make_request('PUT', endpoint_default, json=payload_disable)
-            if result_default:
-                logger.info(f"✅ Prodotto {sku} disabilitato su vista GENERALE (scope: all)")
-            else:
-                logger.warning(f"⚠️ Errore disabilitazione vista generale per {sku}")
-                return False
-            
             # Imposta quantità a 0
             endpoint_stock = f"/rest/V1/products/{sku_encoded}/stockItems/1"
             payload_stock = {
@@ -224,7 +265,20 @@ class MagentoAPIClient:
                 }
             }
             
-            result_stock = self._make_request('PUT', endpoint_stock, json=payload_stock)
+            # Le due PUT sono indipendenti: inviate in parallelo
+            fetched = run_parallel({
+                'status': partial(self._make_request, 'PUT', endpoint_default, json=payload_disable),
+                'stock': partial(self._make_request, 'PUT', endpoint_stock, json=payload_stock)
+            })
+            result_default = fetched['status']['result']
+            result_stock = fetched['stock']['result']
+            
+            if result_default:
+                logger.info(f"✅ Prodotto {sku} disabilitato su vista GENERALE (scope: all)")
+            else:
+                logger.warning(f"⚠️ Errore disabilitazione vista generale per {sku}")
+                return False
+            
             if result_stock:
                 logger.info(f"✅ Prodotto {sku} quantità impostata a 0")
             else:
@@ -2,71 +2,199 @@
 """
 Client Octopia (CDiscount) API
 """
-import requests
+import threading
+import time
 import logging
-from typing import List, Dict
+from typing import List, Dict, Optional
+
+from config import OCTOPIA_TOKEN_REFRESH_MARGIN
+from .transport import get_transport
 
 logger = logging.getLogger(__name__)
 
 
-class OctopiaClient:
-    def __init__(self, client_id: str, client_secret: str, seller_id: str):
+class OctopiaTokenManager:
+    """
+    Ciclo di vita del JWT Octopia (client_credentials, validità ~1h)
+
+    - il token viene messo in cache con la sua scadenza
+    - un timer lo rinnova in background OCTOPIA_TOKEN_REFRESH_MARGIN secondi prima
+      (al massimo a metà validità, per token di breve durata)
+    - chiamanti concorrenti con token scaduto condividono un unico rinnovo
+    - invalidate() forza il rinnovo dopo un 401
+    """
+
+    RETRY_DELAY = 30
+
+    def __init__(self, http, auth_url: str, client_id: str, client_secret: str):
+        self.http = http
+        self.auth_url = auth_url
         self.client_id = client_id
         self.client_secret = client_secret
-        self.seller_id = seller_id
-        self.auth_url = "https://auth.octopia-io.net/auth/realms/maas/protocol/openid-connect/token"
-        self.base_url = "https://api.octopia-io.net/seller/v2"
-        self.access_token = None
-        self.authenticate()
-    
-    def authenticate(self):
+
+        self._token: Optional[str] = None
+        self._refresh_at = 0.0
+        self._lock = threading.Lock()
+        self._timer: Optional[threading.Timer] = None
+
+    @property
+    def token(self) -> Optional[str]:
+        """Token attuale (anche se in scadenza), senza rinnovarlo"""
+        return self._token
+
+    def start(self):
+        """Primo rinnovo in background: non blocca l'avvio dell'app"""
+        self._schedule(0)
+
+    def get_token(self) -> Optional[str]:
+        """Ritorna un token valido, rinnovandolo solo se scaduto o in scadenza"""
+        if self._is_valid():
+            return self._token
+
+        with self._lock:
+            # Un altro thread potrebbe averlo appena rinnovato
+            if self._is_valid():
+                return self._token
+            self._refresh_locked()
+            return self._token
+
+    def invalidate(self, token: Optional[str]):
+        """Scarta il token rifiutato dal server (se nel frattempo non è già cambiato)"""
+        with self._lock:
+            if token == self._token:
+                self._refresh_at = 0.0
+
+    def refresh(self) -> bool:
+        """Forza il rinnovo del token"""
+        with self._lock:
+            return self._refresh_locked()
+
+    def _is_valid(self) -> bool:
+        return self._token is not None and time.time() < self._refresh_at
+
+    def _refresh_locked(self) -> bool:
         try:
             auth_data = {
                 'grant_type': 'client_credentials',
                 'client_id': self.client_id,
                 'client_secret': self.client_secret
             }
-            response = requests.post(
+            response = self.http.post(
                 self.auth_url,
                 data=auth_data,
                 headers={'Content-Type': 'application/x-www-form-urlencoded'}
             )
             response.raise_for_status()
             token_data = response.json()
-            self.access_token = token_data.get('access_token')
-            logger.info("Autenticazione Octopia riuscita")
+
+            expires_in = int(token_data.get('expires_in', 3600))
+            self._token = token_data.get('access_token')
+            # Margine mai oltre metà validità: altrimenti il token non sarebbe
+            # mai valido e ogni richiesta rifarebbe l'OAuth
+            margin = min(OCTOPIA_TOKEN_REFRESH_MARGIN, expires_in // 2)
+            self._refresh_at = time.time() + expires_in - margin
+
+            logger.info(f"Autenticazione Octopia riuscita (token valido {expires_in}s)")
+            self._schedule(max(expires_in - margin, self.RETRY_DELAY))
+            return True
         except Exception as e:
             logger.error(f"Errore autenticazione Octopia: {e}")
+            self._schedule(self.RETRY_DELAY)
+            return False
+
+    def _schedule(self, delay: float):
+        if self._timer:
+            self._timer.cancel()
+        self._timer = threading.Timer(delay, self._background_refresh)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _background_refresh(self):
+        with self._lock:
+            # Già rinnovato da una richiesta nel frattempo
+            if self._is_valid():
+                return
+            self._refresh_locked()
+
+
+class OctopiaClient:
+    def __init__(self, client_id: str, client_secret: str, seller_id: str):
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.seller_id = seller_id
+        self.auth_url = "https://auth.octopia-io.net/auth/realms/maas/protocol/openid-connect/token"
+        self.base_url = "https://api.octopia-io.net/seller/v2"
+        self.http = get_transport('octopia')
+        self.tokens = OctopiaTokenManager(self.http, self.auth_url, client_id, client_secret)
+        self.tokens.start()
     
-    def get_orders(self, limit: int = 100, offset: int = 0) -> List[Dict]:
-        try:
+    @property
+    def access_token(self) -> Optional[str]:
+        return self.tokens.token
+    
+    def authenticate(self) -> bool:
+        """Rinnova subito il token di accesso"""
+        return self.tokens.refresh()
+    
+    def _request(self, method: str, path: str, **kwargs):
+        """Richiesta autenticata: su 401 rinnova il token e riprova una volta"""
+        for attempt in range(2):
+            token = self.tokens.get_token()
             headers = {
-                'Authorization': f'Bearer {self.access_token}',
+                'Authorization': f'Bearer {token}',
                 'sellerId': self.seller_id,
                 'Content-Type': 'application/json'
             }
+            response = self.http.request(method, f"{self.base_url}{path}", headers=headers, **kwargs)
+            
+            if response.status_code != 401 or attempt:
+                return response
+            
+            logger.warning(f"Octopia 401 su {path}: rinnovo token e nuovo tentativo")
+            self.tokens.invalidate(token)
+        
+        return response
+    
+    def get_orders(self, limit: int = 100, offset: int = 0, raise_errors: bool = False) -> List[Dict]:
+        """
+        Recupera ordini CDiscount
+        
+        Args:
+            raise_errors: Rilancia gli errori invece di ritornare []
+        """
+        try:
             params = {'limit': limit, 'offset': offset}
-            response = requests.get(f"{self.base_url}/orders", headers=headers, params=params)
+            response = self._request('GET', "/orders", params=params)
             response.raise_for_status()
             data = response.json()
             return data.get('items', [])
         except Exception as e:
             logger.error(f"Errore Octopia get_orders: {e}")
+            if raise_errors:
+                raise
             return []
     
+    def get_order(self, order_id: str) -> Optional[Dict]:
+        """Recupera un singolo ordine CDiscount per ID (None se non trovato)"""
+        try:
+            response = self._request('GET', f"/orders/{order_id}")
+            
+            if response.status_code == 404:
+                logger.warning(f"Ordine Octopia {order_id} non trovato")
+                return None
+            
+            response.raise_for_status()
+            return response.json()
+        except Exception as e:
+            logger.error(f"Errore Octopia get_order {order_id}: {e}")
+            return None
+    
     def disable_offer(self, seller_product_id: str) -> bool:
         """Disabilita un'offerta (imposta stock a 0)"""
         try:
-            headers = {
-                'Authorization': f'Bearer {self.access_token}',
-                'sellerId': self.seller_id,
-                'Content-Type': 'application/json'
-            }
-            
-            url = f"{self.base_url}/offers/{seller_product_id}"
             data = {'stock': 0}
             
-            response = requests.put(url, headers=headers, json=data)
+            response = self._request('PUT', f"/offers/{seller_product_id}", json=data)
             response.raise_for_status()
             logger.info(f"Offerta CDiscount {seller_product_id} disabilitata")
             return True
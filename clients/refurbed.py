@@ -4,12 +4,25 @@ Client Refurbed API - Versione completa con accettazione e spedizione
 """
 import requests
 import logging
+import threading
+import time
+from functools import partial
 from typing import List, Dict, Tuple, Optional
 
+from config import (
+    REFURBED_OFFER_BATCH_SIZE, REFURBED_OFFER_BATCH_RETRIES,
+    REFURBED_VERIFY_ATTEMPTS, REFURBED_VERIFY_BASE_DELAY
+)
+from utils.concurrency import run_parallel
+from .transport import get_transport
+
 logger = logging.getLogger(__name__)
 
 
 class RefurbishedClient:
+    # Stati item che confermano l'accettazione
+    ACCEPTED_STATES = ['ACCEPTED', 'SHIPPED']
+    
     def __init__(self, token: str, base_url: str):
         self.token = token
         self.base_url = base_url
@@ -18,9 +31,26 @@ class RefurbishedClient:
             'Content-Type': 'application/json',
             'Accept': 'application/json'
         }
+        self.http = get_transport('refurbed')
+        
+        # Ordini accettati in attesa di verifica stato: order_id -> item_id
+        self._pending_verifications: Dict[str, List[str]] = {}
+        self._verification_lock = threading.Lock()
     
-    def get_orders(self, state: str = None, limit: int = 100, sort_desc: bool = True) -> List[Dict]:
-        """Recupera ordini da Refurbed - gRPC style API (POST method)"""
+    def get_orders(
+        self,
+        state: str = None,
+        limit: int = 100,
+        sort_desc: bool = True,
+        starting_after: str = None,
+        raise_errors: bool = False
+    ) -> List[Dict]:
+        """
+        Recupera ordini da Refurbed - gRPC style API (POST method)
+        
+        Args:
+            raise_errors: Rilancia gli errori invece di ritornare []
+        """
         try:
             url = f"{self.base_url}/refb.merchant.v1.OrderService/ListOrders"
             
@@ -32,11 +62,14 @@ class RefurbishedClient:
                 }
             }
             
+            if starting_after:
+                body["pagination"]["starting_after"] = starting_after
+            
             if state:
                 body["state_filters"] = [state]
             
             logger.info(f"🔍 Refurbed: richiesta ordini (stato={state or 'ALL'})")
-            response = requests.post(url, headers=self.headers, json=body, timeout=30)
+            response = self.http.post(url, headers=self.headers, json=body, timeout=30)
             response.raise_for_status()
             
             data = response.json()
@@ -47,14 +80,41 @@ class RefurbishedClient:
             
         except requests.exceptions.Timeout:
             logger.error(f"⏱️ Timeout recupero ordini Refurbed")
+            if raise_errors:
+                raise
             return []
         except requests.exceptions.RequestException as e:
             logger.error(f"❌ Errore HTTP Refurbed get_orders: {e}")
+            if raise_errors:
+                raise
             return []
         except Exception as e:
             logger.error(f"❌ Errore generico Refurbed get_orders: {e}")
+            if raise_errors:
+                raise
             return []
     
+    def get_orders_since(self, cursor: str, limit: int = 100, max_pages: int = 10) -> List[Dict]:
+        """
+        Recupera solo gli ordini creati dopo il cursore (sync incrementale)
+        
+        Args:
+            cursor: ID dell'ultimo ordine già visto
+            limit: Ordini per pagina
+            max_pages: Numero massimo di pagine da scorrere
+            
+        Returns:
+            Ordini in ordine di creazione crescente
+        """
+        orders = []
+        for _ in range(max_pages):
+            page = self.get_orders(state=None, limit=limit, sort_desc=False, starting_after=cursor)
+            orders.extend(page)
+            if len(page) < limit:
+                break
+            cursor = str(page[-1].get('id', ''))
+        return orders
+    
     def accept_order(self, order_id: str) -> Tuple[bool, str]:
         """
         Accetta un ordine su Refurbed seguendo le regole di transizione:
@@ -135,33 +195,21 @@ class RefurbishedClient:
             if len(updates) == 1:
                 # Singolo item: usa UpdateOrderItemState con "id"
                 logger.info(f"📝 Usando UpdateOrderItemState (singolo item)...")
-                success = self._update_single_item_state(updates[0])
+                success, confirmed = self._update_single_item_state(updates[0])
             else:
                 # Multipli items: usa BatchUpdateOrderItemsState con "order_item_id"
                 logger.info(f"📝 Usando BatchUpdateOrderItemsState ({len(updates)} items)...")
-                success = self._batch_update_items_state(updates)
+                success, confirmed = self._batch_update_items_state(updates)
             
             if not success:
                 return False, "Errore durante l'update su Refurbed API"
             
-            # Step 4.5: VERIFICA che l'update sia andato a buon fine
-            logger.info(f"🔍 Verifica stato items dopo batch update...")
-            import time
-            time.sleep(2)  # Aspetta 2 secondi per propagazione
-            
-            items_after, error_after = self._get_order_items(order_id)
-            if items_after:
-                logger.info(f"📊 STATO ITEMS DOPO L'UPDATE:")
-                for item in items_after:
-                    item_id = item.get('id')
-                    new_state = item.get('state', 'UNKNOWN')
-                    sku = item.get('sku', 'N/A')
-                    logger.info(f"  📦 Item {item_id}: SKU={sku}, NUOVO STATO={new_state}")
-                    
-                    # Controlla se qualche item è rimasto in NEW
-                    if item_id in [u['order_item_id'] for u in updates] and new_state == 'NEW':
-                        logger.error(f"  ❌ Item {item_id} ancora in stato NEW dopo l'update!")
-                        return False, f"L'update API è stato accettato ma l'item {sku} è rimasto in stato NEW. Possibile problema con Refurbed API."
+            # Step 4.5: VERIFICA - se la risposta riporta già gli stati è autorevole,
+            # altrimenti la verifica è differita (verify_pending_acceptances)
+            unconfirmed = [
+                u['order_item_id'] for u in updates
+                if confirmed.get(u['order_item_id']) not in self.ACCEPTED_STATES
+            ]
             
             # Step 5: Costruisci messaggio di successo
             success_parts = []
@@ -172,10 +220,12 @@ class RefurbishedClient:
             
             success_msg = "✅ " + ", ".join(success_parts)
             
-            # Verifica stato finale
-            final_state = self._verify_order_state(order_id)
-            if final_state:
-                success_msg += f" (Stato ordine: {final_state})"
+            if unconfirmed:
+                with self._verification_lock:
+                    self._pending_verifications[order_id] = unconfirmed
+                success_msg += f" (verifica stato in corso per {len(unconfirmed)} items)"
+            else:
+                success_msg += " (stato confermato da Refurbed)"
             
             logger.info(f"\n{'='*60}")
             logger.info(f"✅ {success_msg}")
@@ -223,7 +273,7 @@ class RefurbishedClient:
             
             logger.info(f"📤 Request: {body}")
             
-            response = requests.post(url, headers=self.headers, json=body, timeout=30)
+            response = self.http.post(url, headers=self.headers, json=body, timeout=30)
             
             logger.info(f"📥 Response status: {response.status_code}")
             logger.info(f"📥 Response: {response.text[:500]}")
@@ -250,7 +300,7 @@ class RefurbishedClient:
             body = {"order_id": order_id}
             
             logger.info(f"🔍 Recupero items per ordine {order_id}...")
-            response = requests.post(url, headers=self.headers, json=body, timeout=30)
+            response = self.http.post(url, headers=self.headers, json=body, timeout=30)
             
             if response.status_code != 200:
                 error = f"HTTP {response.status_code}: {response.text[:300]}"
@@ -266,10 +316,13 @@ class RefurbishedClient:
         except Exception as e:
             return None, f"Errore recupero items: {str(e)}"
     
-    def _update_single_item_state(self, update: Dict) -> bool:
+    def _update_single_item_state(self, update: Dict) -> Tuple[bool, Dict[str, str]]:
         """
         Esegue update singolo di un item
         IMPORTANTE: Refurbed richiede "id" NON "order_item_id"!
+        
+        Returns:
+            (success, stati confermati nella risposta: item_id -> stato)
         """
         try:
             url = f"{self.base_url}/refb.merchant.v1.OrderItemService/UpdateOrderItemState"
@@ -283,27 +336,34 @@ class RefurbishedClient:
             logger.info(f"📤 Request URL: {url}")
             logger.info(f"📤 Request body (formato corretto): {body}")
             
-            response = requests.post(url, headers=self.headers, json=body, timeout=30)
+            response = self.http.post(url, headers=self.headers, json=body, timeout=30)
             
             logger.info(f"📥 Response status: {response.status_code}")
             logger.info(f"📥 Response body: {response.text[:1000]}")
             
             if response.status_code == 200:
                 logger.info(f"✅ Update singolo completato con successo")
-                return True
+                try:
+                    data = response.json()
+                except ValueError:
+                    data = {}
+                return True, self._states_from_items([data.get('order_item') or {}])
             else:
                 logger.error(f"❌ Update fallito: HTTP {response.status_code}")
                 logger.error(f"Response: {response.text[:500]}")
-                return False
+                return False, {}
                 
         except Exception as e:
             logger.error(f"❌ Errore update singolo: {e}")
-            return False
+            return False, {}
     
-    def _batch_update_items_state(self, updates: List[Dict]) -> bool:
+    def _batch_update_items_state(self, updates: List[Dict]) -> Tuple[bool, Dict[str, str]]:
         """
         Esegue batch update degli stati items
         IMPORTANTE: Batch usa "order_item_id", singolo usa "id"!
+        
+        Returns:
+            (success, stati confermati nella risposta: item_id -> stato)
         """
         try:
             url = f"{self.base_url}/refb.merchant.v1.OrderItemService/BatchUpdateOrderItemsState"
@@ -314,7 +374,7 @@ class RefurbishedClient:
             logger.info(f"📤 Request URL: {url}")
             logger.info(f"📤 Request body: {body}")
             
-            response = requests.post(url, headers=self.headers, json=body, timeout=30)
+            response = self.http.post(url, headers=self.headers, json=body, timeout=30)
             
             logger.info(f"📥 Response status: {response.status_code}")
             logger.info(f"📥 Response body: {response.text[:1000]}")
@@ -338,45 +398,82 @@ class RefurbishedClient:
                     
                     if errors:
                         logger.error(f"❌ Batch update ha restituito errori: {'; '.join(errors)}")
-                        return False
+                        return False, {}
                     
                     logger.info(f"✅ Batch update completato con successo")
-                    return True
+                    return True, self._states_from_items([r.get('order_item') or {} for r in results])
                 except:
                     # Se non riusciamo a parsare JSON, assumiamo successo
                     logger.info(f"✅ Batch update completato (response non JSON)")
-                    return True
+                    return True, {}
             else:
                 logger.error(f"❌ Batch update fallito: HTTP {response.status_code}")
                 logger.error(f"Response: {response.text[:500]}")
-                return False
+                return False, {}
                 
         except Exception as e:
             logger.error(f"❌ Errore batch update: {e}")
-            return False
+            return False, {}
+    
+    @staticmethod
+    def _states_from_items(items: List[Dict]) -> Dict[str, str]:
+        """Stati degli items riportati nella risposta (item_id -> stato)"""
+        return {str(item['id']): item['state'] for item in items if item.get('id') and item.get('state')}
     
-    def _verify_order_state(self, order_id: str) -> str:
+    def verify_pending_acceptances(self, order_ids: List[str] = None) -> Dict[str, Dict]:
         """
-        Verifica lo stato finale dell'ordine
+        Verifica differita degli ordini accettati senza conferma nella risposta
         
+        Tutti gli ordini pendenti vengono controllati insieme; chi non è ancora
+        in stato accettato viene ricontrollato con backoff esponenziale breve
+        (REFURBED_VERIFY_BASE_DELAY, raddoppiato ad ogni giro, max
+        REFURBED_VERIFY_ATTEMPTS giri).
+        
+        Args:
+            order_ids: Ordini da verificare (default: tutti i pendenti)
+            
         Returns:
-            str: Stato dell'ordine o stringa vuota se errore
+            Dict order_id -> {'verified': bool, 'stuck_items': [item_id ancora NEW/PENDING]}
         """
-        try:
-            url = f"{self.base_url}/refb.merchant.v1.OrderService/GetOrder"
-            body = {"order_id": order_id}
+        with self._verification_lock:
+            if order_ids is None:
+                order_ids = list(self._pending_verifications)
+            pending = {
+                order_id: list(self._pending_verifications.pop(order_id))
+                for order_id in order_ids if order_id in self._pending_verifications
+            }
+        
+        results = {}
+        delay = REFURBED_VERIFY_BASE_DELAY
+        
+        for attempt in range(REFURBED_VERIFY_ATTEMPTS):
+            if not pending:
+                break
             
-            response = requests.post(url, headers=self.headers, json=body, timeout=10)
-            if response.status_code == 200:
-                data = response.json()
-                order = data.get('order', {})
-                state = order.get('state', 'UNKNOWN')
-                logger.info(f"📊 Stato ordine verificato: {state}")
-                return state
-            return ""
-        except Exception as e:
-            logger.warning(f"⚠️ Impossibile verificare stato: {e}")
-            return ""
+            time.sleep(delay)
+            delay *= 2
+            
+            fetched = run_parallel({order_id: partial(self._get_order_items, order_id) for order_id in pending})
+            
+            for order_id, outcome in fetched.items():
+                items, error = outcome['result'] or (None, outcome['error'])
+                if error or not items:
+                    continue
+                
+                states = self._states_from_items(items)
+                stuck = [item_id for item_id in pending[order_id] if states.get(item_id) not in self.ACCEPTED_STATES]
+                if stuck:
+                    pending[order_id] = stuck
+                else:
+                    results[order_id] = {'verified': True, 'stuck_items': []}
+                    del pending[order_id]
+                    logger.info(f"✅ Refurbed: accettazione ordine {order_id} confermata (giro {attempt + 1})")
+        
+        for order_id, stuck in pending.items():
+            logger.error(f"❌ Refurbed: ordine {order_id}, items ancora non accettati: {stuck}")
+            results[order_id] = {'verified': False, 'stuck_items': stuck}
+        
+        return results
     
     def disable_offer(self, sku: str) -> bool:
         """Disabilita offerta (stock = 0)"""
@@ -385,7 +482,7 @@ class RefurbishedClient:
             url = f"{self.base_url}/refb.merchant.v1.OfferService/UpdateOffer"
             body = {"identifier": {"sku": sku}, "stock": 0}
             
-            response = requests.post(url, headers=self.headers, json=body, timeout=30)
+            response = self.http.post(url, headers=self.headers, json=body, timeout=30)
             
             if response.status_code == 200:
                 logger.info(f"✅ Offerta SKU {sku} disabilitata")
@@ -398,21 +495,122 @@ class RefurbishedClient:
             logger.error(f"❌ Errore disable_offer: {e}")
             return False
     
-    def get_order_details(self, order_id: str) -> Dict:
-        """Recupera dettagli completi di un ordine (per debug)"""
+    def disable_offers(self, skus: List[str]) -> Dict[str, Dict]:
+        """
+        Disabilita più offerte (stock = 0) con BatchUpdateOffers
+        
+        Gli SKU vengono inviati a blocchi di REFURBED_OFFER_BATCH_SIZE; solo
+        quelli falliti vengono ritentati (fino a REFURBED_OFFER_BATCH_RETRIES volte).
+        Se il batch non è disponibile si torna a UpdateOffer per singolo SKU.
+        
+        Returns:
+            Dict sku -> {'success': bool, 'message': str}
+        """
+        skus = list(dict.fromkeys(s for s in skus if s))
+        results = {sku: {'success': False, 'message': 'Non inviato'} for sku in skus}
+        
+        pending = skus
+        for attempt in range(1 + max(0, REFURBED_OFFER_BATCH_RETRIES)):
+            if not pending:
+                break
+            if attempt:
+                logger.warning(f"🔁 Refurbed: nuovo tentativo per {len(pending)} offerte fallite")
+            
+            for start in range(0, len(pending), REFURBED_OFFER_BATCH_SIZE):
+                chunk = pending[start:start + REFURBED_OFFER_BATCH_SIZE]
+                chunk_results = self._batch_update_offers(chunk)
+                
+                if chunk_results is None:
+                    # Batch non supportato: una chiamata per SKU
+                    chunk_results = {
+                        sku: {'success': self.disable_offer(sku), 'message': 'UpdateOffer singolo'}
+                        for sku in chunk
+                    }
+                
+                results.update(chunk_results)
+            
+            pending = [sku for sku in pending if not results[sku]['success']]
+        
+        ok = sum(1 for r in results.values() if r['success'])
+        logger.info(f"📊 Refurbed: {ok}/{len(skus)} offerte disabilitate")
+        return results
+    
+    def _batch_update_offers(self, skus: List[str]) -> Optional[Dict[str, Dict]]:
+        """
+        Una chiamata BatchUpdateOffers per un blocco di SKU
+        
+        Returns:
+            Esito per SKU, oppure None se l'endpoint batch non è disponibile
+        """
+        try:
+            url = f"{self.base_url}/refb.merchant.v1.OfferService/BatchUpdateOffers"
+            body = {"updates": [{"identifier": {"sku": sku}, "stock": 0} for sku in skus]}
+            
+            logger.info(f"🔧 Refurbed: disabilitazione batch {len(skus)} offerte")
+            response = self.http.post(url, headers=self.headers, json=body, timeout=30)
+            
+            if response.status_code in [404, 501]:
+                logger.warning(f"⚠️ BatchUpdateOffers non disponibile (HTTP {response.status_code})")
+                return None
+            
+            if response.status_code != 200:
+                message = f"HTTP {response.status_code}: {response.text[:200]}"
+                logger.error(f"❌ Batch offerte fallito: {message}")
+                return {sku: {'success': False, 'message': message} for sku in skus}
+            
+            try:
+                data = response.json()
+                batch_results = data.get('results') if isinstance(data, dict) else None
+            except ValueError:
+                batch_results = None
+            if not isinstance(batch_results, list):
+                batch_results = []
+                logger.error(f"❌ Batch offerte: risposta senza 'results' ({response.text[:200]})")
+            
+            results = {}
+            for idx, sku in enumerate(skus):
+                # Risultati nello stesso ordine delle richieste (code 0 = success in gRPC).
+                # Senza esito per lo SKU non si può sapere se è stato disabilitato:
+                # conta come fallito e viene ritentato
+                item = batch_results[idx] if idx < len(batch_results) else None
+                if not isinstance(item, dict):
+                    logger.warning(f"⚠️ SKU {sku}: nessun esito nella risposta batch")
+                    results[sku] = {'success': False, 'message': 'Nessun esito nella risposta batch'}
+                    continue
+                
+                status = item.get('status') or {}
+                code = status.get('code', 0)
+                if code == 0:
+                    results[sku] = {'success': True, 'message': '✅ Disabilitato'}
+                else:
+                    message = f"{status.get('message', '')} (code {code})"
+                    logger.warning(f"⚠️ SKU {sku}: {message}")
+                    results[sku] = {'success': False, 'message': message}
+            return results
+            
+        except Exception as e:
+            logger.error(f"❌ Errore batch offerte: {e}")
+            return {sku: {'success': False, 'message': str(e)} for sku in skus}
+    
+    def get_order(self, order_id: str) -> Optional[Dict]:
+        """Recupera un singolo ordine Refurbed per ID (None se non trovato)"""
         try:
             url = f"{self.base_url}/refb.merchant.v1.OrderService/GetOrder"
             body = {"order_id": order_id}
             
-            response = requests.post(url, headers=self.headers, json=body, timeout=30)
+            response = self.http.post(url, headers=self.headers, json=body, timeout=30)
             
             if response.status_code == 200:
                 data = response.json()
-                return data.get('order', {})
+                return data.get('order') or None
             else:
                 logger.error(f"❌ Errore dettagli ordine {order_id}: HTTP {response.status_code}")
-                return {}
+                return None
                 
         except Exception as e:
-            logger.error(f"❌ Errore get_order_details: {e}")
-            return {}
\ No newline at end of file
+            logger.error(f"❌ Errore get_order: {e}")
+            return None
+    
+    def get_order_details(self, order_id: str) -> Dict:
+        """Recupera dettagli completi di un ordine (per debug)"""
+        return self.get_order(order_id) or {}
\ No newline at end of file
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Client Telegram Bot API (solo sendMessage)
+"""
+import logging
+from typing import Dict, Optional
+
+import requests
+from urllib3.exceptions import NewConnectionError
+
+from config import TELEGRAM_API_URL
+from .transport import get_transport
+
+logger = logging.getLogger(__name__)
+
+
+class TelegramClient:
+    """Invio messaggi a una chat; i retry sono gestiti dal chiamante"""
+
+    def __init__(self, token: str, chat_id: str, api_url: str = TELEGRAM_API_URL):
+        self.token = token
+        self.chat_id = chat_id
+        self.api_url = api_url.rstrip('/')
+        # Niente retry automatici: una POST ripetuta duplicherebbe il messaggio
+        self.http = get_transport('telegram', max_retries=0, timeout=10)
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.token and self.chat_id)
+
+    def send_message(self, text: str, parse_mode: Optional[str] = 'Markdown') -> Dict:
+        """
+        Invia un messaggio
+
+        Returns:
+            Dict con 'ok', 'status_code', 'retry_after' (secondi, su 429), 'error'
+            e 'not_sent' (errore di rete con messaggio sicuramente non arrivato)
+        """
+        payload = {'chat_id': self.chat_id, 'text': text}
+        if parse_mode:
+            payload['parse_mode'] = parse_mode
+
+        try:
+            response = self.http.post(f"{self.api_url}/bot{self.token}/sendMessage", json=payload)
+        except requests.exceptions.RequestException as e:
+            return {
+                'ok': False, 'status_code': None, 'retry_after': None,
+                'error': str(e), 'not_sent': self._not_sent(e)
+            }
+
+        if response.status_code == 200:
+            return {'ok': True, 'status_code': 200, 'retry_after': None, 'error': None, 'not_sent': False}
+
+        try:
+            body = response.json()
+        except ValueError:
+            body = {}
+
+        return {
+            'ok': False,
+            'status_code': response.status_code,
+            'retry_after': (body.get('parameters') or {}).get('retry_after'),
+            'error': body.get('description') or response.text[:200],
+            'not_sent': False
+        }
+
+    @staticmethod
+    def _not_sent(error: requests.exceptions.RequestException) -> bool:
+        """
+        True solo se la connessione non è mai stata aperta (timeout di
+        connessione, host irraggiungibile): la richiesta non è partita.
+        Read timeout e connessioni chiuse a metà sono ambigui, Telegram
+        potrebbe aver già consegnato il messaggio.
+        """
+        if isinstance(error, requests.exceptions.ConnectTimeout):
+            return True
+        if isinstance(error, requests.exceptions.ConnectionError):
+            reason = getattr(error.args[0], 'reason', None) if error.args else None
+            return isinstance(reason, NewConnectionError)
+        return False
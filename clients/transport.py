@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Trasporto HTTP condiviso per i client marketplace
+Una requests.Session per client con pool keep-alive, retry con backoff e metriche
+"""
+import threading
+import time
+import logging
+from typing import Dict
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from config import HTTP_POOL_SIZE, HTTP_MAX_RETRIES, HTTP_BACKOFF_FACTOR, HTTP_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUS_CODES = [429, 500, 502, 503, 504]
+
+_transports: Dict[str, 'HTTPTransport'] = {}
+_transports_lock = threading.Lock()
+
+
+class HTTPTransport:
+    """
+    Sessione HTTP riutilizzabile: le connessioni TCP/TLS verso lo stesso host
+    restano aperte (keep-alive) e vengono riusate tra una chiamata e l'altra.
+
+    I retry automatici si applicano solo ai metodi idempotenti (GET, PUT, ...):
+    le POST non vengono mai ripetute per non duplicare operazioni sui marketplace.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        pool_size: int = HTTP_POOL_SIZE,
+        max_retries: int = HTTP_MAX_RETRIES,
+        backoff_factor: float = HTTP_BACKOFF_FACTOR,
+        timeout: float = HTTP_TIMEOUT
+    ):
+        self.name = name
+        self.timeout = timeout
+
+        retry_strategy = Retry(
+            total=max_retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=RETRY_STATUS_CODES,
+            raise_on_status=False
+        )
+        self.adapter = HTTPAdapter(
+            pool_connections=pool_size,
+            pool_maxsize=pool_size,
+            max_retries=retry_strategy
+        )
+
+        self.session = requests.Session()
+        self.session.mount("http://", self.adapter)
+        self.session.mount("https://", self.adapter)
+
+        self._lock = threading.Lock()
+        self._metrics = {
+            'requests': 0,
+            'errors': 0,
+            'timeouts': 0,
+            'status_codes': {},
+            'total_ms': 0
+        }
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """Esegue una richiesta sulla sessione condivisa registrando le metriche"""
+        kwargs.setdefault('timeout', self.timeout)
+        start = time.monotonic()
+
+        try:
+            response = self.session.request(method, url, **kwargs)
+        except requests.exceptions.Timeout:
+            self._record(start, error=True, timeout=True)
+            raise
+        except requests.exceptions.RequestException:
+            self._record(start, error=True)
+            raise
+
+        self._record(start, status_code=response.status_code)
+        return response
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request('POST', url, **kwargs)
+
+    def put(self, url: str, **kwargs) -> requests.Response:
+        return self.request('PUT', url, **kwargs)
+
+    def _record(self, start: float, status_code: int = None, error: bool = False, timeout: bool = False):
+        elapsed_ms = int((time.monotonic() - start) * 1000)
+        with self._lock:
+            self._metrics['requests'] += 1
+            self._metrics['total_ms'] += elapsed_ms
+            if error:
+                self._metrics['errors'] += 1
+            if timeout:
+                self._metrics['timeouts'] += 1
+            if status_code is not None:
+                codes = self._metrics['status_codes']
+                codes[str(status_code)] = codes.get(str(status_code), 0) + 1
+
+    def get_metrics(self) -> Dict:
+        """
+        Statistiche di utilizzo del client
+
+        Returns:
+            Dict con richieste, errori, latenza media e connessioni aperte/riusate
+        """
+        connections_opened = 0
+        pools = getattr(self.adapter.poolmanager, 'pools', None)
+        if pools is not None:
+            for key in list(pools.keys()):
+                pool = pools.get(key)
+                if pool is not None:
+                    connections_opened += getattr(pool, 'num_connections', 0)
+
+        with self._lock:
+            metrics = dict(self._metrics)
+            metrics['status_codes'] = dict(self._metrics['status_codes'])
+
+        requests_count = metrics['requests']
+        metrics['avg_ms'] = int(metrics['total_ms'] / requests_count) if requests_count else 0
+        metrics['connections_opened'] = connections_opened
+        metrics['connections_reused'] = max(0, requests_count - connections_opened)
+        return metrics
+
+
+def get_transport(name: str, **options) -> HTTPTransport:
+    """
+    Ritorna il trasporto condiviso per un client, creandolo al primo utilizzo
+
+    Args:
+        name: Nome del client (es. 'backmarket', 'refurbed')
+        **options: pool_size, max_retries, backoff_factor, timeout (solo alla creazione)
+    """
+    with _transports_lock:
+        transport = _transports.get(name)
+        if transport is None:
+            transport = HTTPTransport(name, **options)
+            _transports[name] = transport
+            logger.info(f"🔌 Trasporto HTTP '{name}' inizializzato (pool: {options.get('pool_size', HTTP_POOL_SIZE)})")
+        return transport
+
+
+def get_all_metrics() -> Dict[str, Dict]:
+    """Metriche di tutti i trasporti HTTP attivi"""
+    with _transports_lock:
+        transports = list(_transports.values())
+    return {t.name: t.get_metrics() for t in transports}
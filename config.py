@@ -16,6 +16,8 @@ REFURBED_BASE_URL = "https://api.refurbed.com"
 OCTOPIA_CLIENT_ID = os.getenv('OCTOPIA_CLIENT_ID', 'reflexmania')
 OCTOPIA_CLIENT_SECRET = os.getenv('OCTOPIA_CLIENT_SECRET', 'qTpoc2gd40Huhzi64FIKY6f9NoKac0C6')
 OCTOPIA_SELLER_ID = os.getenv('OCTOPIA_SELLER_ID', '405765')
+# Secondi prima della scadenza del JWT in cui il token viene rinnovato in background
+OCTOPIA_TOKEN_REFRESH_MARGIN = int(os.getenv('OCTOPIA_TOKEN_REFRESH_MARGIN', 300))
 
 # Magento
 MAGENTO_URL = os.getenv('MAGENTO_URL', 'https://reflexmania.it')
@@ -33,6 +35,22 @@ INVOICEX_CONFIG = {
 INVOICEX_API_URL = os.getenv('INVOICEX_API_URL', 'https://api.reflexmania.it/')
 INVOICEX_API_KEY = os.getenv('INVOICEX_API_KEY', '52bf3c1f206dae8e45bf647cda396172')
 
+# Movimentazione righe DDT: endpoint bulk opzionale (tutte le righe in una
+# richiesta, vuoto = non disponibile, es. 'movimenta-ddt-vendita-multipla') e
+# chiamate riga-per-riga contemporanee altrimenti
+INVOICEX_BULK_MOVEMENT_PATH = os.getenv('INVOICEX_BULK_MOVEMENT_PATH', '')
+INVOICEX_MOVEMENT_CONCURRENCY = int(os.getenv('INVOICEX_MOVEMENT_CONCURRENCY', 4))
+
+# Indice locale DDT per riferimento: l'elenco InvoiceX letto all'avvio è
+# considerato completo solo se contiene i DDT creati negli ultimi N giorni
+DDT_INDEX_WARMUP_DAYS = int(os.getenv('DDT_INDEX_WARMUP_DAYS', 90))
+
+# Cache codici cliente InvoiceX per email (memoria + database locale)
+INVOICEX_CUSTOMER_CACHE_SIZE = int(os.getenv('INVOICEX_CUSTOMER_CACHE_SIZE', 2000))
+INVOICEX_CUSTOMER_CACHE_TTL = int(os.getenv('INVOICEX_CUSTOMER_CACHE_TTL', 30 * 24 * 3600))
+# Cliente non trovato: ricontrolla dopo pochi minuti
+INVOICEX_CUSTOMER_NEGATIVE_TTL = int(os.getenv('INVOICEX_CUSTOMER_NEGATIVE_TTL', 600))
+
 # ============================================================================
 # ANASTASIA DATABASE (MySQL A2Hosting)
 # ============================================================================
@@ -46,9 +64,122 @@ ANASTASIA_DB_CONFIG = {
     'autocommit': True
 }
 
+# Pool connessioni Anastasia: connessioni aperte e attesa massima (secondi)
+# per una connessione libera quando sono tutte in uso
+ANASTASIA_POOL_SIZE = int(os.getenv('ANASTASIA_POOL_SIZE', 3))
+ANASTASIA_POOL_TIMEOUT = float(os.getenv('ANASTASIA_POOL_TIMEOUT', 10))
+
+# Colonna numerica (indicizzata) con il timestamp di last_update, se creata
+# sul database (vedi README); vuoto = CAST(last_update AS UNSIGNED)
+ANASTASIA_TICKET_TS_COLUMN = os.getenv('ANASTASIA_TICKET_TS_COLUMN', '')
+
+# Snapshot ticket per la dashboard: ricalcolato ogni N secondi e condiviso
+# da tutte le schede aperte
+TICKET_SNAPSHOT_INTERVAL = int(os.getenv('TICKET_SNAPSHOT_INTERVAL', 30))
+TICKET_SNAPSHOT_OPEN_LIMIT = int(os.getenv('TICKET_SNAPSHOT_OPEN_LIMIT', 10))
+TICKET_SNAPSHOT_CLOSED_LIMIT = int(os.getenv('TICKET_SNAPSHOT_CLOSED_LIMIT', 5))
+
 # URL sistema Anastasia
 ANASTASIA_URL = os.getenv('ANASTASIA_URL', 'https://anastasia.reflexmania.com')
 
+# Trasporto HTTP condiviso dai client (pool keep-alive, retry con backoff)
+HTTP_POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', 10))
+HTTP_MAX_RETRIES = int(os.getenv('HTTP_MAX_RETRIES', 3))
+HTTP_BACKOFF_FACTOR = float(os.getenv('HTTP_BACKOFF_FACTOR', 0.5))
+HTTP_TIMEOUT = int(os.getenv('HTTP_TIMEOUT', 30))
+
+# Fan-out ordini: timeout (secondi) per canale oltre il quale il canale
+# viene segnalato come degradato e la dashboard mostra risultati parziali
+ORDERS_FETCH_TIMEOUT = int(os.getenv('ORDERS_FETCH_TIMEOUT', 25))
+CHANNEL_FETCH_TIMEOUTS = {
+    'backmarket': int(os.getenv('BACKMARKET_FETCH_TIMEOUT', ORDERS_FETCH_TIMEOUT)),
+    'refurbed': int(os.getenv('REFURBED_FETCH_TIMEOUT', ORDERS_FETCH_TIMEOUT)),
+    'cdiscount': int(os.getenv('OCTOPIA_FETCH_TIMEOUT', ORDERS_FETCH_TIMEOUT)),
+    'magento': int(os.getenv('MAGENTO_FETCH_TIMEOUT', ORDERS_FETCH_TIMEOUT)),
+}
+
+# Disabilitazione SKU: timeout (secondi) per canale nel fan-out parallelo
+DISABLE_PRODUCT_TIMEOUT = int(os.getenv('DISABLE_PRODUCT_TIMEOUT', 35))
+# Chiamate di disabilitazione contemporanee quando si disabilitano più SKU
+DISABLE_PRODUCT_MAX_WORKERS = int(os.getenv('DISABLE_PRODUCT_MAX_WORKERS', 8))
+
+# BackMarket: aggiornamenti di orderline (accettazione/spedizione) inviati in parallelo
+BACKMARKET_ORDERLINE_CONCURRENCY = int(os.getenv('BACKMARKET_ORDERLINE_CONCURRENCY', 4))
+# BackMarket: task di upload catalogo senza esito dopo N controlli o N secondi
+# vengono abbandonati e i loro SKU ritentati
+BACKMARKET_TASK_MAX_CHECKS = int(os.getenv('BACKMARKET_TASK_MAX_CHECKS', 10))
+BACKMARKET_TASK_MAX_AGE = int(os.getenv('BACKMARKET_TASK_MAX_AGE', 3600))
+
+# Refurbed: SKU per chiamata BatchUpdateOffers e tentativi sui soli SKU falliti
+REFURBED_OFFER_BATCH_SIZE = int(os.getenv('REFURBED_OFFER_BATCH_SIZE', 50))
+REFURBED_OFFER_BATCH_RETRIES = int(os.getenv('REFURBED_OFFER_BATCH_RETRIES', 1))
+# Refurbed: verifica differita delle accettazioni (giri di polling e attesa
+# iniziale in secondi, raddoppiata ad ogni giro)
+REFURBED_VERIFY_ATTEMPTS = int(os.getenv('REFURBED_VERIFY_ATTEMPTS', 4))
+REFURBED_VERIFY_BASE_DELAY = float(os.getenv('REFURBED_VERIFY_BASE_DELAY', 0.25))
+
+# Automazione: ordini processati in parallelo (accettazione e, subito dopo il
+# DDT, disabilitazione prodotti), con un limite di accettazioni contemporanee
+# per marketplace.
+# La creazione DDT su InvoiceX resta in sequenza per non alterare la numerazione.
+AUTOMATION_MAX_WORKERS = int(os.getenv('AUTOMATION_MAX_WORKERS', 4))
+AUTOMATION_MARKETPLACE_CONCURRENCY = {
+    'backmarket': int(os.getenv('AUTOMATION_BACKMARKET_CONCURRENCY', 2)),
+    'refurbed': int(os.getenv('AUTOMATION_REFURBED_CONCURRENCY', 2)),
+    'magento': int(os.getenv('AUTOMATION_MAGENTO_CONCURRENCY', 2)),
+}
+
+# Cache ordini normalizzati (dashboard, CSV Packlink, DDT)
+# Entro ORDER_CACHE_TTL secondi lo snapshot è fresco; fino a ORDER_CACHE_STALE_TTL
+# viene servito mentre si ricarica in background
+ORDER_CACHE_TTL = int(os.getenv('ORDER_CACHE_TTL', 60))
+ORDER_CACHE_STALE_TTL = int(os.getenv('ORDER_CACHE_STALE_TTL', 600))
+# Versioni di cui tenere le modifiche per le risposte delta (?since=)
+ORDER_CACHE_HISTORY = int(os.getenv('ORDER_CACHE_HISTORY', 50))
+
+# Database locale SQLite (tracker ordini, cache, indici)
+# Su Railway puntare a un volume persistente (es. /data) per non perdere
+# lo stato ad ogni riavvio del container
+LOCAL_DB_PATH = os.getenv(
+    'LOCAL_DB_PATH',
+    '/data/reflexmania.db' if os.path.isdir('/data') else '/tmp/reflexmania.db'
+)
+
+# Backend tracker ordini processati: 'sqlite' (default) o 'json'
+ORDER_TRACKER_BACKEND = os.getenv('ORDER_TRACKER_BACKEND', 'sqlite')
+
+# Sync ordini per l'automazione: 'incremental' (solo ordini nuovi/modificati
+# dall'ultimo cursore) o 'full' (lista completa ad ogni giro)
+ORDER_SYNC_MODE = os.getenv('ORDER_SYNC_MODE', 'incremental')
+# Ogni quanti minuti fare comunque una riconciliazione completa
+SYNC_FULL_RECONCILE_MINUTES = int(os.getenv('SYNC_FULL_RECONCILE_MINUTES', 60))
+# Margine (minuti) sottratto ai cursori temporali per tollerare ritardi/orologi
+SYNC_OVERLAP_MINUTES = int(os.getenv('SYNC_OVERLAP_MINUTES', 10))
+
+# Telegram: notifiche accodate e inviate da un worker in background
+TELEGRAM_BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
+TELEGRAM_CHAT_ID = os.getenv('TELEGRAM_CHAT_ID')
+# Base URL Bot API (in test puntare a stub_server.py, es. http://localhost:5055/telegram)
+TELEGRAM_API_URL = os.getenv('TELEGRAM_API_URL', 'https://api.telegram.org')
+# Secondi in cui gli eventi ravvicinati vengono raccolti in un unico messaggio
+TELEGRAM_DIGEST_WINDOW = float(os.getenv('TELEGRAM_DIGEST_WINDOW', 5))
+# Intervallo minimo tra due messaggi nella stessa chat (limite Telegram ~20/min nei gruppi)
+TELEGRAM_MIN_INTERVAL = float(os.getenv('TELEGRAM_MIN_INTERVAL', 3))
+TELEGRAM_MAX_RETRIES = int(os.getenv('TELEGRAM_MAX_RETRIES', 5))
+TELEGRAM_QUEUE_SIZE = int(os.getenv('TELEGRAM_QUEUE_SIZE', 500))
+
+# Dashboard live (Server-Sent Events su /api/stream)
+# Ogni quanti secondi ricaricare gli ordini finché c'è almeno una dashboard collegata
+DASHBOARD_FEED_INTERVAL = int(os.getenv('DASHBOARD_FEED_INTERVAL', 60))
+# Commento di keep-alive per non far chiudere la connessione dai proxy
+EVENT_STREAM_HEARTBEAT = int(os.getenv('EVENT_STREAM_HEARTBEAT', 15))
+# Connessioni SSE contemporanee (ognuna occupa un thread gunicorn: restare sotto --threads)
+EVENT_STREAM_MAX_CLIENTS = int(os.getenv('EVENT_STREAM_MAX_CLIENTS', 8))
+# Dopo quanti secondi chiudere lo stream (il browser si ricollega da solo)
+EVENT_STREAM_MAX_AGE = int(os.getenv('EVENT_STREAM_MAX_AGE', 900))
+# Eventi tenuti in memoria per chi si ricollega con Last-Event-ID
+EVENT_STREAM_REPLAY = int(os.getenv('EVENT_STREAM_REPLAY', 200))
+
 # Flask
 SECRET_KEY = os.getenv('SECRET_KEY', 'dev-secret-key-change-in-production')
 DEBUG = os.getenv('FLASK_DEBUG', 'False').lower() == 'true'
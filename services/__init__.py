@@ -4,6 +4,8 @@ Services package
 """
 from .order_service import (
     get_pending_orders, 
+    fetch_pending_orders,
     normalize_order, 
-    disable_product_on_channels
+    disable_product_on_channels,
+    disable_products_on_channels
 )
\ No newline at end of file
@@ -4,10 +4,13 @@ Servizio di automazione ordini
 Accetta ordini e crea DDT automaticamente
 """
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime
 from typing import List, Dict
-import requests
-import os
+
+from config import AUTOMATION_MAX_WORKERS, AUTOMATION_MARKETPLACE_CONCURRENCY
 
 logger = logging.getLogger(__name__)
 
@@ -19,15 +22,19 @@ class AutomationService:
         refurbed_client,
         magento_service,
         ddt_service,
-        order_service
+        order_service,
+        notifier=None
     ):
         self.backmarket = backmarket_client
         self.refurbed = refurbed_client
         self.magento = magento_service
         self.ddt_service = ddt_service
         self.order_service = order_service
-        self.telegram_token = os.getenv("TELEGRAM_BOT_TOKEN")
-        self.telegram_chat_id = os.getenv("TELEGRAM_CHAT_ID")
+        # Notifiche Telegram accodate: l'invio non rallenta l'automazione
+        self.notifier = notifier
+        
+        self._marketplace_slots = {}
+        self._slots_lock = threading.Lock()
         
         logger.info("🤖 AutomationService inizializzato")
     
@@ -54,92 +61,37 @@ class AutomationService:
         }
         
         try:
+            # 0. ESITO UPLOAD CATALOGO BACKMARKET DEL GIRO PRECEDENTE
+            self._check_listing_tasks()
+            
             # 1. RECUPERA ORDINI PENDENTI
             pending_orders = self._get_all_pending_orders()
             
             if not pending_orders:
+                self.order_service.commit_sync_cursors()
                 logger.info("✅ [AUTOMATION] Nessun ordine da processare")
                 return results
             
             logger.info(f"📦 [AUTOMATION] Trovati {len(pending_orders)} ordini da processare")
             
-            # 2. ACCETTA ORDINI E CREA DDT
-            for order in pending_orders:
-                try:
-                    channel = order.get('channel', 'unknown')
-                    order_id = order.get('order_id', 'unknown')
-                    
-                    logger.info(f"🔄 [AUTOMATION] Processo ordine {order_id} ({channel})")
-                    
-                    # Accetta ordine
-                    accepted = self._accept_order(order)
-                    
-                    if accepted:
-                        results['orders_accepted'].append({
-                            'order_id': order_id,
-                            'marketplace': channel
-                        })
-                        logger.info(f"✅ [AUTOMATION] Ordine {order_id} accettato")
-                        
-                        # Crea DDT
-                        try:
-                            ddt_id = self._create_ddt(order)
-                            
-                            # ✅ Non aggiungere a results se è stato skippato
-                            if ddt_id != "SKIP":
-                                results['ddts_created'].append({
-                                    'order_id': order_id,
-                                    'ddt_id': ddt_id,
-                                    'marketplace': channel,
-                                    'customer_name': order.get('customer_name', 'N/A'),  # ✅ Aggiungi nome cliente
-                                    'items': order.get('items', []),                      # ✅ Aggiungi prodotti
-                                    'total': order.get('total', 0)                        # ✅ Aggiungi totale
-                                })
-                                logger.info(f"📄 [AUTOMATION] DDT {ddt_id} creato per ordine {order_id}")
-                                
-                                # ✅ Segna come processato
-                                self.order_service.order_tracker.mark_processed(channel, order_id, ddt_id)
-
-                                # ✅ DISABILITA PRODOTTI SU TUTTI I MARKETPLACE
-                                logger.info(f"🚫 [AUTOMATION] Disabilitazione prodotti per ordine {order_id}")
-                                for item in order.get('items', []):
-                                    sku = item.get('sku', '')
-                                    listing_id = item.get('listing_id', '')
-                                    
-                                    try:
-                                        from services.order_service import disable_product_on_channels
-                                        disable_product_on_channels(
-                                            sku, 
-                                            listing_id,
-                                            self.order_service.bm_client,
-                                            self.order_service.rf_client,
-                                            self.order_service.oct_client,
-                                            self.order_service.magento_client
-                                        )
-                                        logger.info(f"✅ [AUTOMATION] Prodotto {sku} disabilitato su tutti i canali")
-                                    except Exception as e:
-                                        logger.error(f"❌ [AUTOMATION] Errore disabilitazione prodotto {sku}: {e}")
-
-                                else:
-                                    logger.info(f"ℹ️ [AUTOMATION] DDT già esistente per ordine {order_id}, skippato")
-                                    
-                                    # ✅ Segna come processato anche se skippato
-                                    self.order_service.order_tracker.mark_processed(channel, order_id, "SKIP")
-                                
-                        except Exception as e:
-                            error_msg = f"DDT fallito per {order_id}: {str(e)}"
-                            logger.error(f"❌ [AUTOMATION] {error_msg}")
-                            results['errors'].append(error_msg)
-                    else:
-                        error_msg = f"Accettazione fallita per {order_id}"
-                        logger.error(f"❌ [AUTOMATION] {error_msg}")
-                        results['errors'].append(error_msg)
-                        
-                except Exception as e:
-                    error_msg = f"Errore ordine {order.get('order_id', 'unknown')}: {str(e)}"
-                    logger.error(f"❌ [AUTOMATION] {error_msg}")
-                    logger.exception(e)
-                    results['errors'].append(error_msg)
+            # 2. ACCETTA ORDINI E CREA DDT (in parallelo, DDT in sequenza)
+            outcomes = self._process_orders_concurrently(pending_orders)
+            
+            # Cursori sync avanzati solo ora, fermi prima degli ordini falliti
+            failed = {}
+            for order, outcome in zip(pending_orders, outcomes):
+                if outcome['errors']:
+                    failed.setdefault(order.get('channel'), set()).add(str(order.get('order_id')))
+            self.order_service.commit_sync_cursors(failed)
+            
+            # Risultati nell'ordine originale degli ordini
+            for outcome in outcomes:
+                results['orders_accepted'].extend(outcome['orders_accepted'])
+                results['ddts_created'].extend(outcome['ddts_created'])
+                results['errors'].extend(outcome['errors'])
+            
+            # Verifica differita (in un solo passaggio) delle accettazioni Refurbed
+            self._verify_refurbed_acceptances(results)
             
             results['orders_processed'] = len(results['orders_accepted'])
             
@@ -158,6 +110,155 @@ class AutomationService:
         
         return results
     
+    def _process_orders_concurrently(self, orders: List[Dict]) -> List[Dict]:
+        """
+        Processa gli ordini con un pool limitato di worker
+        
+        Le accettazioni avvengono in parallelo (con un limite per
+        marketplace); la creazione DDT segue l'ordine della lista
+        così la numerazione InvoiceX resta quella dell'elaborazione sequenziale.
+        
+        Returns:
+            Esiti per ordine, nello stesso ordine della lista in input
+        """
+        turnstile = _OrderedTurnstile()
+        
+        with ThreadPoolExecutor(
+            max_workers=max(1, AUTOMATION_MAX_WORKERS),
+            thread_name_prefix='automation'
+        ) as executor:
+            futures = [
+                executor.submit(self._process_single_order, order, position, turnstile)
+                for position, order in enumerate(orders)
+            ]
+            return [future.result() for future in futures]
+    
+    def _process_single_order(self, order: Dict, position: int, turnstile: '_OrderedTurnstile') -> Dict:
+        """Accetta, crea DDT e segna processato un ordine"""
+        outcome = {'orders_accepted': [], 'ddts_created': [], 'errors': []}
+        ddt_turn_done = False
+        
+        try:
+            channel = order.get('channel', 'unknown')
+            order_id = order.get('order_id', 'unknown')
+            
+            logger.info(f"🔄 [AUTOMATION] Processo ordine {order_id} ({channel})")
+            
+            # Accetta ordine (limite chiamate contemporanee per marketplace)
+            with self._marketplace_slot(channel):
+                accepted = self._accept_order(order)
+            
+            if not accepted:
+                error_msg = f"Accettazione fallita per {order_id}"
+                logger.error(f"❌ [AUTOMATION] {error_msg}")
+                outcome['errors'].append(error_msg)
+                return outcome
+            
+            outcome['orders_accepted'].append({
+                'order_id': order_id,
+                'marketplace': channel
+            })
+            logger.info(f"✅ [AUTOMATION] Ordine {order_id} accettato")
+            
+            # Crea DDT (uno alla volta, nell'ordine della lista)
+            try:
+                ddt_turn_done = True
+                with turnstile.turn(position):
+                    ddt_id = self._create_ddt(order)
+            except Exception as e:
+                error_msg = f"DDT fallito per {order_id}: {str(e)}"
+                logger.error(f"❌ [AUTOMATION] {error_msg}")
+                outcome['errors'].append(error_msg)
+                return outcome
+            
+            # ✅ Segna come processato (anche se skippato: DDT già esistente)
+            self.order_service.order_tracker.mark_processed(channel, order_id, ddt_id)
+            
+            if ddt_id == "SKIP":
+                logger.info(f"ℹ️ [AUTOMATION] DDT già esistente per ordine {order_id}, skippato")
+                return outcome
+            
+            outcome['ddts_created'].append({
+                'order_id': order_id,
+                'ddt_id': ddt_id,
+                'marketplace': channel,
+                'customer_name': order.get('customer_name', 'N/A'),  # ✅ Aggiungi nome cliente
+                'items': order.get('items', []),                      # ✅ Aggiungi prodotti
+                'total': order.get('total', 0)                        # ✅ Aggiungi totale
+            })
+            logger.info(f"📄 [AUTOMATION] DDT {ddt_id} creato per ordine {order_id}")
+            
+            # ✅ DISABILITA PRODOTTI SU TUTTI I MARKETPLACE subito dopo il DDT
+            # (fuori dal turno: non rallenta i DDT degli ordini successivi)
+            self._disable_sold_products(outcome['ddts_created'])
+        
+        except Exception as e:
+            error_msg = f"Errore ordine {order.get('order_id', 'unknown')}: {str(e)}"
+            logger.error(f"❌ [AUTOMATION] {error_msg}")
+            logger.exception(e)
+            outcome['errors'].append(error_msg)
+        
+        finally:
+            # Gli ordini successivi non devono restare in attesa del turno DDT
+            if not ddt_turn_done:
+                turnstile.skip(position)
+        
+        return outcome
+    
+    def _disable_sold_products(self, ddts_created: List[Dict]):
+        """Disabilita su tutti i canali gli SKU degli ordini appena passati a DDT"""
+        items = [item for ddt in ddts_created for item in ddt.get('items', [])]
+        if not items:
+            return
+        
+        logger.info(f"🚫 [AUTOMATION] Disabilitazione {len(items)} prodotti su tutti i canali")
+        try:
+            summary = self.order_service.disable_products_all_channels(items)
+            for sku, channels in summary['skus'].items():
+                failed = [name for name, r in channels.items() if r['attempted'] and not r['success']]
+                if failed:
+                    logger.warning(f"⚠️ [AUTOMATION] Prodotto {sku} non disabilitato su: {', '.join(failed)}")
+                else:
+                    logger.info(f"✅ [AUTOMATION] Prodotto {sku} disabilitato su tutti i canali")
+        except Exception as e:
+            logger.error(f"❌ [AUTOMATION] Errore disabilitazione prodotti: {e}")
+    
+    def _verify_refurbed_acceptances(self, results: Dict):
+        """Verifica gli ordini Refurbed accettati nel giro senza conferma immediata"""
+        try:
+            verification = self.refurbed.verify_pending_acceptances()
+            for order_id, outcome in verification.items():
+                if not outcome['verified']:
+                    error_msg = (
+                        f"Accettazione Refurbed non confermata per {order_id}: "
+                        f"items {', '.join(outcome['stuck_items'])} ancora in stato NEW"
+                    )
+                    logger.error(f"❌ [AUTOMATION] {error_msg}")
+                    results['errors'].append(error_msg)
+        except Exception as e:
+            logger.error(f"❌ [AUTOMATION] Errore verifica accettazioni Refurbed: {e}")
+    
+    def _check_listing_tasks(self):
+        """Controlla gli upload catalogo BackMarket pendenti e ritenta gli SKU falliti"""
+        try:
+            summary = self.backmarket.check_listing_tasks()
+            if summary['failed']:
+                logger.warning(f"🔁 [AUTOMATION] Nuovo tentativo disabilitazione BackMarket: {summary['failed']}")
+                self.backmarket.disable_listings(summary['failed'])
+        except Exception as e:
+            logger.error(f"❌ [AUTOMATION] Errore controllo task BackMarket: {e}")
+    
+    def _marketplace_slot(self, channel: str) -> threading.BoundedSemaphore:
+        """Semaforo che limita le chiamate contemporanee verso un marketplace"""
+        with self._slots_lock:
+            slot = self._marketplace_slots.get(channel)
+            if slot is None:
+                slot = threading.BoundedSemaphore(
+                    max(1, AUTOMATION_MARKETPLACE_CONCURRENCY.get(channel, 1))
+                )
+                self._marketplace_slots[channel] = slot
+            return slot
+    
     def _get_all_pending_orders(self) -> List[Dict]:
         """Recupera tutti gli ordini pendenti da tutti i marketplace"""
         all_orders = []
@@ -195,9 +296,19 @@ class AutomationService:
         
         try:
             if marketplace == 'backmarket':
-                return self.backmarket.accept_order(order_id)
+                # Riusa il payload già scaricato (niente nuova GET dell'ordine)
+                accepted = self.backmarket.accept_order(
+                    order_id,
+                    order_data=self.order_service.get_raw_order('backmarket', order_id)
+                )
+                if accepted:
+                    self.order_service.forget_raw_order('backmarket', order_id)
+                return accepted
             elif marketplace == 'refurbed':
-                return self.refurbed.accept_order(order_id)
+                success, message = self.refurbed.accept_order(order_id)
+                if not success:
+                    logger.error(f"❌ [AUTOMATION] Refurbed {order_id}: {message}")
+                return success
             elif marketplace == 'magento':
                 # Magento non ha accettazione esplicita
                 return True
@@ -244,7 +355,7 @@ class AutomationService:
             logger.info("ℹ️ [AUTOMATION] Nessun ordine processato, skip notifica Telegram")
             return
         
-        if not self.telegram_token or not self.telegram_chat_id:
+        if not self.notifier or not self.notifier.configured:
             logger.info("ℹ️ [AUTOMATION] Telegram non configurato, skip notifica")
             return
         
@@ -296,18 +407,42 @@ class AutomationService:
             
             message += f"\n🕐 {datetime.now().strftime('%H:%M:%S')}"
             
-            # Invia a Telegram
-            url = f"https://api.telegram.org/bot{self.telegram_token}/sendMessage"
-            response = requests.post(url, json={
-                "chat_id": self.telegram_chat_id,
-                "text": message,
-                "parse_mode": "Markdown"
-            }, timeout=10)
-            
-            if response.status_code == 200:
-                logger.info("📱 [AUTOMATION] Notifica Telegram inviata")
-            else:
-                logger.warning(f"⚠️ [AUTOMATION] Notifica Telegram fallita: {response.status_code}")
+            # Accoda per il worker Telegram (ritorna subito)
+            if self.notifier.notify(message):
+                logger.info("📱 [AUTOMATION] Notifica Telegram accodata")
                 
         except Exception as e:
-            logger.error(f"❌ [AUTOMATION] Errore invio Telegram: {e}")
\ No newline at end of file
+            logger.error(f"❌ [AUTOMATION] Errore preparazione notifica Telegram: {e}")
+
+
+class _OrderedTurnstile:
+    """
+    Fa entrare i worker in una sezione critica nell'ordine delle posizioni
+    (0, 1, 2, ...): la posizione N attende che tutte le precedenti abbiano
+    completato o rinunciato al proprio turno.
+    """
+    
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._next = 0
+        self._released = set()
+    
+    @contextmanager
+    def turn(self, position: int):
+        with self._condition:
+            self._condition.wait_for(lambda: self._next == position)
+        try:
+            yield
+        finally:
+            self.skip(position)
+    
+    def skip(self, position: int):
+        """Segna il turno come concluso (anche senza averlo usato)"""
+        with self._condition:
+            if position < self._next:
+                return
+            self._released.add(position)
+            while self._next in self._released:
+                self._released.discard(self._next)
+                self._next += 1
+            self._condition.notify_all()
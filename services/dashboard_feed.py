@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Aggiornamenti live della dashboard: differenze ordini e ticket verso lo stream SSE
+"""
+import threading
+import logging
+from typing import Dict, Optional
+
+from config import DASHBOARD_FEED_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+
+class DashboardFeed:
+    """
+    Collega OrderCache e TicketSnapshotService all'EventBroker
+
+    - 'orders': ordini nuovi/modificati/rimossi rispetto al caricamento precedente
+    - 'tickets': snapshot ticket, solo quando cambia
+    - finché c'è almeno una dashboard collegata la cache ordini viene
+      ricaricata ogni DASHBOARD_FEED_INTERVAL secondi, una volta per tutte
+      le schede; poke() anticipa il giro (dopo automazione o azioni manuali)
+    """
+
+    def __init__(self, broker, order_cache, ticket_snapshot, interval: int = DASHBOARD_FEED_INTERVAL):
+        self.broker = broker
+        self.order_cache = order_cache
+        self.ticket_snapshot = ticket_snapshot
+        self.interval = max(5, interval)
+
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+
+        order_cache.add_listener(self._on_orders)
+        ticket_snapshot.add_listener(self._on_tickets)
+
+    def start(self):
+        """Avvia il giro di aggiornamento (idempotente)"""
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name='dashboard-feed', daemon=True)
+                self._thread.start()
+
+    def poke(self):
+        """Ricarica subito gli ordini se qualcuno sta guardando la dashboard"""
+        self._wake.set()
+
+    def _loop(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+            if not self.broker.subscribers:
+                continue
+            try:
+                # Forzato: il giro deve vedere gli ordini nuovi anche se la
+                # cache è ancora "fresca"; le differenze arrivano da _on_orders
+                self.order_cache.get(force_refresh=True)
+            except Exception as e:
+                logger.warning(f"⚠️ Aggiornamento live ordini non riuscito: {e}")
+            # Conta come lettura: lo snapshot ticket non va in pausa
+            self.ticket_snapshot.get()
+
+    def _on_orders(self, diff: Dict):
+        if not self.broker.subscribers:
+            return
+        self.broker.publish('orders', diff)
+        logger.info(
+            f"📡 Dashboard: +{len(diff['added'])} ~{len(diff['changed'])} "
+            f"-{len(diff['removed'])} ordini"
+        )
+
+    def _on_tickets(self, snapshot: Dict):
+        if not self.broker.subscribers:
+            return
+        self.broker.publish('tickets', snapshot['data'])
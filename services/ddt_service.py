@@ -3,9 +3,12 @@ Service per creazione DDT usando API InvoiceX
 """
 
 from clients.invoicex_api import InvoiceXAPIClient
-from typing import Dict, List, Optional
+from config import DDT_INDEX_WARMUP_DAYS
+from typing import Dict, List, Optional, Tuple
 import logging
 import json
+import threading
+import time
 
 
 # Mappatura metodi pagamento Magento -> InvoiceX
@@ -28,9 +31,72 @@ MAGENTO_PAYMENT_MAP = {
 class DDTService:
     """Service per gestione DDT vendita tramite API InvoiceX"""
     
-    def __init__(self, api_client: InvoiceXAPIClient):
+    def __init__(self, api_client: InvoiceXAPIClient, ddt_index=None):
         self.api = api_client
         self.logger = logging.getLogger(__name__)
+        
+        # Indice locale riferimento -> DDT (controllo duplicati senza round trip)
+        if ddt_index is None:
+            from utils.ddt_index import DDTReferenceIndex
+            ddt_index = DDTReferenceIndex()
+        self.ddt_index = ddt_index
+        
+        # Controllo duplicato + creazione DDT atomici tra automazione ed endpoint
+        self._creation_lock = threading.Lock()
+    
+    def warm_index(self) -> bool:
+        """
+        Allinea l'indice locale con i DDT già presenti su InvoiceX (una volta all'avvio)
+        
+        Se fallisce, o l'elenco non contiene i DDT recenti già noti, i
+        riferimenti non indicizzati vengono verificati su InvoiceX
+        """
+        ddt_list = self.api.elenca_ddt_vendita()
+        if ddt_list is None:
+            self.logger.warning("⚠️ Warm-up indice DDT non riuscito: verifica remota per i riferimenti sconosciuti")
+            return False
+        
+        self.ddt_index.warm(ddt_list, since=time.time() - DDT_INDEX_WARMUP_DAYS * 86400)
+        return self.ddt_index.warmed
+    
+    def _controlla_duplicato(self, riferimento: str) -> Tuple[str, Optional[str]]:
+        """
+        Stato del riferimento prima di creare il DDT
+        
+        Returns:
+            ('nuovo' | 'esistente' | 'sconosciuto', ddt_id se noto)
+        """
+        entry = self.ddt_index.lookup(riferimento)
+        
+        if entry and entry['status'] == 'created':
+            return 'esistente', entry['ddt_id']
+        
+        if entry is None and self.ddt_index.warmed:
+            return 'nuovo', None
+        
+        # Intento rimasto aperto (crash/timeout dopo la richiesta) o indice
+        # non allineato: decide InvoiceX
+        esiste = self.api.verifica_ddt_esiste(riferimento)
+        if esiste:
+            self.ddt_index.commit(riferimento, None)
+            return 'esistente', None
+        if esiste is None:
+            return 'sconosciuto', None
+        return 'nuovo', None
+    
+    def _risultato_duplicato(self, riferimento: str, stato: str, ddt_id: Optional[str]) -> Dict:
+        if stato == 'esistente':
+            self.logger.info(f"ℹ️ DDT già esistente per {riferimento} (ID: {ddt_id or 'n/d'}), skip")
+            return {
+                'success': False,
+                'skip': True,
+                'ddt_id': ddt_id,
+                'error': f'DDT già esistente per {riferimento}'
+            }
+        return {
+            'success': False,
+            'error': f'Impossibile verificare su InvoiceX se esiste già un DDT per {riferimento}'
+        }
     
     def _get_invoicex_payment_method(self, ordine: Dict, marketplace: str) -> str:
         """
@@ -94,6 +160,11 @@ class DDTService:
             
             self.logger.info(f"Ordine ricevuto: email={ordine.get('customer_email')}, items={len(ordine.get('items', []))}")
             
+            # 0. Duplicato? (lettura locale dell'indice)
+            stato, ddt_esistente = self._controlla_duplicato(riferimento)
+            if stato != 'nuovo':
+                return self._risultato_duplicato(riferimento, stato, ddt_esistente)
+            
             # 1. Estrai dati cliente
             cliente = self._estrai_dati_cliente(ordine, marketplace)
             if not cliente or not cliente.get('email'):
@@ -112,17 +183,26 @@ class DDTService:
             payment_method = self._get_invoicex_payment_method(ordine, marketplace)
             
             # 4. Prepara dati ordine con metodo pagamento
-            order_id = ordine.get('order_id', '')
             order_data = {
-                'riferimento': f"{marketplace.upper()}-{order_id}",
+                'riferimento': riferimento,
                 'metodo_pagamento': payment_method
             }
             
-            # 5. Crea DDT con metodo pagamento
-            id_ddt = self.api.crea_ddt_vendita(codice_cliente, order_data)
-            
-            if not id_ddt:
-                return {'success': False, 'error': 'Errore creazione DDT'}
+            # 5. Crea DDT con metodo pagamento: intento registrato prima della
+            # chiamata e confermato dopo, così un crash a metà non porta a un
+            # secondo DDT per lo stesso ordine
+            with self._creation_lock:
+                stato, ddt_esistente = self._controlla_duplicato(riferimento)
+                if stato != 'nuovo':
+                    return self._risultato_duplicato(riferimento, stato, ddt_esistente)
+                
+                self.ddt_index.begin(riferimento)
+                id_ddt = self.api.crea_ddt_vendita(codice_cliente, order_data)
+                
+                if not id_ddt:
+                    return {'success': False, 'error': 'Errore creazione DDT'}
+                
+                self.ddt_index.commit(riferimento, id_ddt)
             
             self.logger.info(f"DDT creato: {id_ddt} con metodo pagamento: {payment_method}")
             
@@ -144,12 +224,10 @@ class DDTService:
             
             prodotti_ok = []
             prodotti_errore = []
+            righe = []
             
             riga = 2
             
-            # 🆕 CONTATORE CHIAMATE API
-            chiamate_api = 0
-            
             for idx, prodotto in enumerate(prodotti):
                 seriale = prodotto.get('sku', '')
                 prezzo = float(prodotto.get('price', 0))
@@ -157,12 +235,7 @@ class DDTService:
                 if prezzo == 0:
                     prezzo = float(prodotto.get('unit_price', 0))
                 
-                self.logger.info(f"\n{'='*60}")
-                self.logger.info(f"[DDT-LOOP] Iterazione #{idx+1} di {len(prodotti)}")
-                self.logger.info(f"[DDT-LOOP] SKU: {seriale}")
-                self.logger.info(f"[DDT-LOOP] Prezzo: {prezzo}")
-                self.logger.info(f"[DDT-LOOP] Riga DDT: {riga}")
-                self.logger.info(f"{'='*60}")
+                self.logger.info(f"[DDT-LOOP] Item #{idx+1} di {len(prodotti)}: SKU={seriale}, prezzo={prezzo}, riga={riga}")
                 
                 if not seriale:
                     prodotti_errore.append(f"Riga {riga} - seriale mancante")
@@ -172,27 +245,25 @@ class DDTService:
                 if prezzo == 0:
                     self.logger.warning(f"Prezzo 0 per prodotto {seriale}")
                 
-                # 🆕 LOG PRIMA DELLA CHIAMATA API
-                self.logger.info(f"[DDT-API] ⏳ STO PER CHIAMARE movimenta_prodotto_ddt()")
-                self.logger.info(f"[DDT-API]    DDT ID: {id_ddt}")
-                self.logger.info(f"[DDT-API]    Seriale: {seriale}")
-                self.logger.info(f"[DDT-API]    Prezzo: {prezzo}")
-                self.logger.info(f"[DDT-API]    Riga: {riga}")
-                
-                chiamate_api += 1
-                
-                if self.api.movimenta_prodotto_ddt(id_ddt, seriale, prezzo, riga):
-                    prodotti_ok.append(seriale)
-                    self.logger.info(f"[DDT-API] ✅ Chiamata #{chiamate_api} SUCCESSO")
-                else:
-                    prodotti_errore.append(seriale)
-                    self.logger.error(f"[DDT-API] ❌ Chiamata #{chiamate_api} FALLITA")
-                
+                righe.append({'matricola': seriale, 'prezzo': prezzo, 'riga': riga})
                 riga += 1
             
+            # Tutte le righe in un'unica movimentazione (bulk o raffica parallela)
+            self.logger.info(f"[DDT-API] ⏳ Movimentazione di {len(righe)} righe sul DDT {id_ddt}")
+            
+            for esito in self.api.movimenta_prodotti_ddt(id_ddt, righe):
+                if esito['success']:
+                    prodotti_ok.append(esito['matricola'])
+                    self.logger.info(f"[DDT-API] ✅ Riga {esito['riga']} ({esito['matricola']}) movimentata")
+                else:
+                    prodotti_errore.append(esito['matricola'])
+                    self.logger.error(
+                        f"[DDT-API] ❌ Riga {esito['riga']} ({esito['matricola']}) non movimentata: {esito['error']}"
+                    )
+            
             self.logger.info(f"\n{'='*80}")
             self.logger.info(f"[DDT-DEBUG] FINE MOVIMENTAZIONE PRODOTTI")
-            self.logger.info(f"[DDT-DEBUG] Totale chiamate API effettuate: {chiamate_api}")
+            self.logger.info(f"[DDT-DEBUG] Righe inviate: {len(righe)}")
             self.logger.info(f"[DDT-DEBUG] Prodotti OK: {len(prodotti_ok)}")
             self.logger.info(f"[DDT-DEBUG] Prodotti ERRORE: {len(prodotti_errore)}")
             self.logger.info(f"{'='*80}\n")
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Broker eventi in-process per lo stream SSE della dashboard
+"""
+import collections
+import json
+import queue
+import threading
+import time
+import logging
+from typing import Dict, Iterator, Optional
+
+from config import (
+    EVENT_STREAM_HEARTBEAT,
+    EVENT_STREAM_MAX_CLIENTS,
+    EVENT_STREAM_MAX_AGE,
+    EVENT_STREAM_REPLAY
+)
+
+logger = logging.getLogger(__name__)
+
+
+class TooManySubscribers(RuntimeError):
+    """Raggiunto EVENT_STREAM_MAX_CLIENTS"""
+
+
+class EventBroker:
+    """
+    publish() consegna un evento a tutte le connessioni aperte, stream()
+    produce il testo SSE per una connessione.
+
+    - ogni evento ha un id crescente; gli ultimi EVENT_STREAM_REPLAY restano
+      in memoria e vengono rispediti a chi si ricollega con Last-Event-ID
+    - se l'id richiesto non è più disponibile (o il client è troppo lento e
+      la sua coda si riempie) riceve 'resync' e ricarica tutto
+    - un commento di heartbeat tiene aperta la connessione attraverso i proxy
+    """
+
+    QUEUE_SIZE = 100
+
+    def __init__(
+        self,
+        heartbeat: int = EVENT_STREAM_HEARTBEAT,
+        max_clients: int = EVENT_STREAM_MAX_CLIENTS,
+        max_age: int = EVENT_STREAM_MAX_AGE,
+        replay: int = EVENT_STREAM_REPLAY
+    ):
+        self.heartbeat = heartbeat
+        self.max_clients = max_clients
+        self.max_age = max_age
+
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._history = collections.deque(maxlen=replay)
+        self._last_id = 0
+        self._stats = {'published': 0, 'delivered': 0, 'connections': 0, 'rejected': 0, 'overflows': 0}
+
+    @property
+    def subscribers(self) -> int:
+        return len(self._subscribers)
+
+    def publish(self, event: str, data: Dict) -> int:
+        """Invia un evento a tutte le connessioni; ritorna l'id assegnato"""
+        with self._lock:
+            self._last_id += 1
+            message = (self._last_id, event, json.dumps(data, default=str))
+            self._history.append(message)
+            self._stats['published'] += 1
+            subscribers = list(self._subscribers)
+
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(message)
+                self._count('delivered')
+            except queue.Full:
+                # Client che non legge: lo stream lo chiude con 'resync'
+                subscriber.overflow = True
+                self._count('overflows')
+        return message[0]
+
+    def stream(self, last_event_id: Optional[str] = None) -> Iterator[str]:
+        """
+        Generatore SSE per una connessione
+
+        Raises:
+            TooManySubscribers: se le connessioni aperte sono già max_clients
+        """
+        subscriber = _Subscriber(self.QUEUE_SIZE)
+        with self._lock:
+            if len(self._subscribers) >= self.max_clients:
+                self._stats['rejected'] += 1
+                raise TooManySubscribers(f"Già {len(self._subscribers)} dashboard collegate")
+            self._subscribers.add(subscriber)
+            self._stats['connections'] += 1
+            backlog = self._replay(last_event_id)
+
+        return self._generate(subscriber, backlog)
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['subscribers'] = len(self._subscribers)
+            stats['last_event_id'] = self._last_id
+        return stats
+
+    def _replay(self, last_event_id: Optional[str]):
+        # Chiamato con self._lock acquisito
+        if last_event_id is None:
+            return []
+        try:
+            last = int(last_event_id)
+        except ValueError:
+            return None
+        if last >= self._last_id:
+            return []
+        if not self._history or self._history[0][0] > last + 1:
+            return None  # buco nello storico: serve un resync
+        return [m for m in self._history if m[0] > last]
+
+    def _generate(self, subscriber: '_Subscriber', backlog) -> Iterator[str]:
+        opened_at = time.monotonic()
+        try:
+            # Il browser aspetta 5s prima di ricollegarsi dopo una chiusura
+            yield "retry: 5000\n\n"
+            if backlog is None:
+                yield self._format(self._last_id, 'resync', '{}')
+            else:
+                for message in backlog:
+                    yield self._format(*message)
+
+            while time.monotonic() - opened_at < self.max_age:
+                if subscriber.overflow:
+                    yield self._format(self._last_id, 'resync', '{}')
+                    return
+                try:
+                    message = subscriber.get(timeout=self.heartbeat)
+                except queue.Empty:
+                    yield ": heartbeat\n\n"
+                    continue
+                yield self._format(*message)
+        finally:
+            with self._lock:
+                self._subscribers.discard(subscriber)
+
+    @staticmethod
+    def _format(event_id: int, event: str, data: str) -> str:
+        return f"id: {event_id}\nevent: {event}\ndata: {data}\n\n"
+
+    def _count(self, key: str):
+        with self._lock:
+            self._stats[key] += 1
+
+
+class _Subscriber(queue.Queue):
+    """Coda di una connessione SSE"""
+
+    def __init__(self, maxsize: int):
+        super().__init__(maxsize=maxsize)
+        self.overflow = False
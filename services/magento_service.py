@@ -129,11 +129,14 @@ class MagentoService:
             logger.error(f"Errore normalizzazione ordine Magento: {str(e)}")
             return None
     
-    def get_all_pending_orders(self) -> List[Dict]:
+    def get_all_pending_orders(self, raise_errors: bool = False) -> List[Dict]:
         """
         Recupera e normalizza tutti gli ordini Magento in stato 'processing'
+        
+        Args:
+            raise_errors: Rilancia gli errori di Magento invece di ritornare []
         """
-        orders = self.client.get_all_orders_with_details()
+        orders = self.client.get_all_orders_with_details(raise_errors=raise_errors)
         normalized_orders = []
         
         for order in orders:
@@ -152,13 +155,10 @@ class MagentoService:
     
     def get_order_by_id(self, order_id: str) -> Optional[Dict]:
         """
-        Recupera un singolo ordine per ID (increment_id)
+        Recupera un singolo ordine per ID (increment_id) con una sola richiesta
         """
-        orders = self.get_all_pending_orders()
-        
-        for order in orders:
-            if order['order_id'] == order_id:
-                return order
+        order = self.client.get_order_by_increment_id(order_id)
+        if not order:
+            return None
         
-        logger.warning(f"Ordine Magento #{order_id} non trovato")
-        return None
\ No newline at end of file
+        return self.normalize_order(order)
\ No newline at end of file
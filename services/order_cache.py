@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+"""
+Cache in-process degli ordini normalizzati di tutti i canali
+"""
+import collections
+import threading
+import time
+import uuid
+import logging
+from typing import Callable, Dict, List, Optional
+
+from config import ORDER_CACHE_TTL, ORDER_CACHE_STALE_TTL, ORDER_CACHE_HISTORY
+
+logger = logging.getLogger(__name__)
+
+
+class OrderCache:
+    """
+    Snapshot condiviso del risultato di fetch_pending_orders
+
+    - entro ORDER_CACHE_TTL lo snapshot viene servito così com'è
+    - fino a ORDER_CACHE_STALE_TTL viene servito lo snapshot vecchio e
+      ricaricato in background (stale-while-revalidate)
+    - oltre, o dopo invalidate(), il primo lettore ricarica in modo sincrono
+      e gli altri attendono lo stesso caricamento (una sola fetch upstream)
+    - ogni caricamento che cambia qualcosa produce una nuova versione
+      ('<epoca>.<n>', l'epoca cambia ad ogni avvio); le modifiche delle ultime
+      ORDER_CACHE_HISTORY versioni restano disponibili per changes_since()
+    - dopo ogni caricamento i listener ricevono le differenze rispetto allo
+      snapshot precedente (ordini nuovi, modificati, rimossi)
+    """
+
+    def __init__(
+        self,
+        loader: Callable[[], Dict],
+        ttl: int = ORDER_CACHE_TTL,
+        stale_ttl: int = ORDER_CACHE_STALE_TTL
+    ):
+        """
+        Args:
+            loader: Funzione che ritorna {'orders': [...], 'channels': {...}}
+            ttl: Secondi in cui lo snapshot è considerato fresco
+            stale_ttl: Secondi oltre i quali lo snapshot non viene più servito
+        """
+        self.loader = loader
+        self.ttl = ttl
+        self.stale_ttl = max(stale_ttl, ttl)
+
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._snapshot: Optional[Dict] = None
+        self._index: Dict[tuple, Dict] = {}
+        self._loaded_at = 0.0
+        self._valid = False
+        self._degraded = False
+        self._generation = 0
+        self._loads_completed = 0
+        self._refreshing = False
+        self._listeners: List[Callable[[Dict], None]] = []
+
+        # Ordini come li conosce chi ha letto le versioni precedenti: include
+        # quelli dei canali degradati, che mancano dall'indice ma non sono rimossi
+        self._known: Dict[tuple, Dict] = {}
+        self._epoch = uuid.uuid4().hex[:8]
+        self._version = 0
+        self._history = collections.deque(maxlen=ORDER_CACHE_HISTORY)
+        self._degraded_channels = frozenset()
+
+        self._stats = {'hits': 0, 'stale_hits': 0, 'loads': 0, 'load_errors': 0, 'invalidations': 0}
+
+    def get(self, force_refresh: bool = False) -> Dict:
+        """
+        Ritorna lo snapshot ordini
+
+        Returns:
+            Dict con 'orders', 'channels', 'age_seconds', 'stale'
+        """
+        with self._lock:
+            snapshot = self._snapshot
+            age = time.monotonic() - self._loaded_at
+
+            if snapshot is not None and self._valid and not force_refresh:
+                if age < self.ttl and not self._degraded:
+                    self._stats['hits'] += 1
+                    return self._view(snapshot, age, stale=False)
+
+                # Scaduto o parziale (canale degradato): servi e ricarica in background
+                if age < self.stale_ttl:
+                    self._stats['stale_hits'] += 1
+                    self._start_background_refresh()
+                    return self._view(snapshot, age, stale=True)
+
+            arrival = self._loads_completed
+
+        return self._load_sync(arrival)
+
+    def find(self, source: str, order_id: str) -> Optional[Dict]:
+        """
+        Cerca un ordine nello snapshot corrente tramite indice (source, order_id)
+
+        Non scatena fetch: ritorna None se lo snapshot non c'è, è stato
+        invalidato o non contiene l'ordine.
+        """
+        with self._lock:
+            if not self._valid:
+                return None
+            return self._index.get((source.lower(), str(order_id)))
+
+    def invalidate(self, reason: str = ''):
+        """Segna lo snapshot come da ricaricare (il prossimo lettore fa una fetch fresca)"""
+        with self._lock:
+            self._valid = False
+            self._generation += 1
+            self._stats['invalidations'] += 1
+        logger.info(f"🧹 Cache ordini invalidata{f' ({reason})' if reason else ''}")
+
+    def changes_since(self, version: str) -> Optional[Dict]:
+        """
+        Differenze tra la versione indicata e quella corrente
+
+        Returns:
+            Dict con 'version', 'added', 'updated' (ordini completi) e 'removed'
+            ({'source', 'order_id'}); None se la versione è di un altro avvio
+            o troppo vecchia (serve la lista completa)
+        """
+        epoch, _, number = str(version).partition('.')
+        if epoch != self._epoch or not number.isdigit():
+            return None
+        since = int(number)
+
+        with self._lock:
+            if since > self._version:
+                return None
+            if since < self._version and (not self._history or self._history[0][0] > since + 1):
+                return None
+
+            # Per ogni ordine toccato: esisteva alla versione 'since'? esiste ora?
+            existed = {}
+            for entry_version, changes in self._history:
+                if entry_version <= since:
+                    continue
+                for key in changes['added']:
+                    existed.setdefault(key, False)
+                for key in changes['changed'] | changes['removed']:
+                    existed.setdefault(key, True)
+
+            added, updated, removed = [], [], []
+            for key, was_there in existed.items():
+                order = self._known.get(key)
+                if order is None:
+                    if was_there:
+                        removed.append(self._order_ref(key))
+                elif was_there:
+                    updated.append(order)
+                else:
+                    added.append(order)
+
+            return {
+                'version': self._version_tag(),
+                'added': added,
+                'updated': updated,
+                'removed': removed
+            }
+
+    def add_listener(self, callback: Callable[[Dict], None]):
+        """
+        Registra una funzione chiamata dopo ogni caricamento che cambia gli ordini
+
+        Il callback riceve {'added': [...], 'changed': [...], 'removed': [...],
+        'total': n, 'version', 'previous_version'}; 'removed' contiene
+        {'source', 'order_id'}.
+        """
+        self._listeners.append(callback)
+
+    def get_stats(self) -> Dict:
+        """Contatori di utilizzo ed età dello snapshot"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['cached_orders'] = len(self._snapshot['orders']) if self._snapshot else 0
+            stats['age_seconds'] = int(time.monotonic() - self._loaded_at) if self._snapshot else None
+            stats['valid'] = self._valid
+            stats['degraded'] = self._degraded
+        return stats
+
+    def _load_sync(self, arrival: int) -> Dict:
+        with self._load_lock:
+            # Un caricamento si è concluso mentre aspettavamo: riusa il suo
+            # risultato invece di rifare la fetch
+            with self._lock:
+                if self._loads_completed > arrival and self._snapshot is not None and self._valid:
+                    self._stats['hits'] += 1
+                    return self._view(
+                        self._snapshot, time.monotonic() - self._loaded_at, stale=self._degraded
+                    )
+
+            snapshot = self._load()
+
+        if snapshot is None:
+            # Upstream in errore: meglio lo snapshot vecchio che niente
+            with self._lock:
+                if self._snapshot is not None:
+                    return self._view(self._snapshot, time.monotonic() - self._loaded_at, stale=True)
+            raise RuntimeError("Impossibile recuperare gli ordini dai marketplace")
+
+        return self._view(snapshot, 0, stale=False)
+
+    def _start_background_refresh(self):
+        # Chiamato con self._lock acquisito
+        if self._refreshing:
+            return
+        self._refreshing = True
+        threading.Thread(target=self._background_refresh, name='order-cache-refresh', daemon=True).start()
+
+    def _background_refresh(self):
+        try:
+            with self._load_lock:
+                self._load()
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def _load(self) -> Optional[Dict]:
+        # Chiamato con self._load_lock acquisito
+        with self._lock:
+            generation = self._generation
+
+        start = time.monotonic()
+        try:
+            snapshot = self.loader()
+        except Exception as e:
+            logger.error(f"❌ Errore caricamento cache ordini: {e}")
+            with self._lock:
+                self._stats['load_errors'] += 1
+                self._loads_completed += 1
+            return None
+
+        degraded = any(c.get('degraded') for c in snapshot.get('channels', {}).values())
+        index = {self._key(order): order for order in snapshot.get('orders', [])}
+
+        channels = snapshot.get('channels', {})
+        degraded_channels = frozenset(name for name, status in channels.items() if status.get('degraded'))
+
+        with self._lock:
+            diff, known = self._diff(self._known, index, degraded_channels)
+            previous_version = self._version_tag()
+            if diff['added'] or diff['changed'] or diff['removed'] or degraded_channels != self._degraded_channels:
+                self._version += 1
+                self._history.append((self._version, {
+                    'added': {self._key(o) for o in diff['added']},
+                    'changed': {self._key(o) for o in diff['changed']},
+                    'removed': {self._key(o) for o in diff['removed']}
+                }))
+            diff['version'] = self._version_tag()
+            diff['previous_version'] = previous_version
+
+            snapshot = dict(snapshot, version=diff['version'])
+            self._known = known
+            self._degraded_channels = degraded_channels
+            self._snapshot = snapshot
+            self._index = index
+            self._loaded_at = time.monotonic()
+            # Invalidato durante il caricamento: il risultato potrebbe non
+            # includere la modifica, il prossimo lettore ricarica
+            self._valid = generation == self._generation
+            self._degraded = degraded
+            self._loads_completed += 1
+            self._stats['loads'] += 1
+
+        logger.info(
+            f"📦 Cache ordini aggiornata: {len(snapshot.get('orders', []))} ordini "
+            f"in {int((time.monotonic() - start) * 1000)}ms"
+            f"{' (parziale)' if degraded else ''}"
+        )
+
+        if diff['added'] or diff['changed'] or diff['removed']:
+            for callback in self._listeners:
+                try:
+                    callback(diff)
+                except Exception as e:
+                    logger.error(f"❌ Errore listener cache ordini: {e}")
+        return snapshot
+
+    @staticmethod
+    def _diff(known: Dict[tuple, Dict], current: Dict[tuple, Dict], degraded: frozenset):
+        """Differenze rispetto agli ordini noti: (diff, nuovi ordini noti)"""
+        # Un canale degradato non ha restituito i suoi ordini: non sono "rimossi"
+        kept = {key: order for key, order in known.items() if key not in current and key[0] in degraded}
+        removed = [
+            order for key, order in known.items()
+            if key not in current and key not in kept
+        ]
+        added = [order for key, order in current.items() if key not in known]
+        changed = [
+            order for key, order in current.items()
+            if key in known and known[key] != order
+        ]
+        diff = {
+            'added': added,
+            'changed': changed,
+            'removed': [OrderCache._order_ref(OrderCache._key(o)) for o in removed],
+            'total': len(current)
+        }
+        return diff, {**kept, **current}
+
+    @staticmethod
+    def _key(order: Dict) -> tuple:
+        return (str(order.get('source', '')).lower(), str(order.get('order_id', '')))
+
+    @staticmethod
+    def _order_ref(key: tuple) -> Dict:
+        return {'source': key[0], 'order_id': key[1]}
+
+    def _version_tag(self) -> str:
+        return f"{self._epoch}.{self._version}"
+
+    @staticmethod
+    def _view(snapshot: Dict, age: float, stale: bool) -> Dict:
+        return {
+            'orders': snapshot.get('orders', []),
+            'channels': snapshot.get('channels', {}),
+            'version': snapshot.get('version'),
+            'age_seconds': int(age),
+            'stale': stale
+        }
@@ -3,8 +3,14 @@
 Servizio per gestione ordini multi-marketplace
 """
 import logging
-from typing import List, Dict
+import threading
+from collections import OrderedDict
+from functools import partial
+from typing import List, Dict, Optional
 from utils.order_tracker import OrderTracker  # ✅ AGGIUNGI QUESTA RIGA
+from utils.concurrency import run_parallel
+from config import CHANNEL_FETCH_TIMEOUTS, ORDER_SYNC_MODE, DISABLE_PRODUCT_TIMEOUT, DISABLE_PRODUCT_MAX_WORKERS
+from utils.sync_state import earliest_timestamp, latest_timestamp, with_overlap
 from datetime import datetime, timezone
 
 def calculate_waiting_time(created_at: str) -> dict:
@@ -268,15 +274,75 @@ def normalize_order(order: Dict, source: str) -> Dict:
     return {}
 
 
-def get_pending_orders(bm_client, rf_client, oct_client) -> List[Dict]:
-    """Recupera tutti gli ordini pendenti da tutti i canali"""
+def convert_magento_order(order: Dict) -> Dict:
+    """Converte un ordine normalizzato da MagentoService nel formato della tabella ordini"""
+    return {
+        'order_id': order['order_id'],
+        'entity_id': order.get('entity_id', 0),
+        'source': 'Magento',
+        'customer_name': f"{order['customer']['name']} {order['customer']['surname']}",
+        'customer_email': order['customer']['email'],
+        'customer_phone': order['customer']['phone'],
+        'address': order['customer']['address'],
+        'postal_code': order['customer']['zip'],
+        'city': order['customer']['city'],
+        'country': order['customer']['country'],
+        'total': order['total'],
+        'date': order['order_date'],
+        'status': order['status'],
+        'items': order['items']
+    }
+
+
+def fetch_pending_orders(bm_client, rf_client, oct_client, magento_service=None, raw_order_sink=None) -> Dict:
+    """
+    Recupera in parallelo gli ordini pendenti da tutti i canali
+    
+    Ogni canale (e ogni stato BackMarket) viene interrogato contemporaneamente
+    con un proprio timeout: se un marketplace è lento o in errore i suoi ordini
+    mancano dal risultato e il canale viene segnalato come degradato.
+    I client sono chiamati con raise_errors=True: un errore HTTP non deve
+    sembrare un canale sano senza ordini.
+    
+    Args:
+        bm_client: Client BackMarket
+        rf_client: Client Refurbed
+        oct_client: Client Octopia/CDiscount
+        magento_service: MagentoService (opzionale, per includere Magento)
+        raw_order_sink: Funzione (source, ordini) che riceve i payload BackMarket
+            originali, per riusarli in accettazione/spedizione (opzionale)
+        
+    Returns:
+        Dict con 'orders' (lista ordini normalizzati) e 'channels'
+        (per canale: degraded, error, elapsed_ms)
+    """
+    bm_statuses = ['waiting_acceptance', 'accepted', 'to_ship']
+    
+    tasks = {}
+    timeouts = {}
+    for status in bm_statuses:
+        tasks[f'backmarket:{status}'] = partial(bm_client.get_orders, status=status, raise_errors=True)
+        timeouts[f'backmarket:{status}'] = CHANNEL_FETCH_TIMEOUTS['backmarket']
+    tasks['refurbed'] = partial(rf_client.get_orders, state=None, limit=100, sort_desc=True, raise_errors=True)
+    tasks['cdiscount'] = partial(oct_client.get_orders, raise_errors=True)
+    timeouts['refurbed'] = CHANNEL_FETCH_TIMEOUTS['refurbed']
+    timeouts['cdiscount'] = CHANNEL_FETCH_TIMEOUTS['cdiscount']
+    if magento_service:
+        tasks['magento'] = partial(magento_service.get_all_pending_orders, raise_errors=True)
+        timeouts['magento'] = CHANNEL_FETCH_TIMEOUTS['magento']
+    
+    fetched = run_parallel(tasks, timeouts=timeouts)
+    
     all_orders = []
     seen_order_ids = set()
     
     # BackMarket
     bm_count = 0
-    for status in ['waiting_acceptance', 'accepted', 'to_ship']:
-        orders = bm_client.get_orders(status=status)
+    for status in bm_statuses:
+        orders = fetched[f'backmarket:{status}']['result'] or []
+        if raw_order_sink and orders:
+            # Stati in ordine di avanzamento: il payload più recente sostituisce il precedente
+            raw_order_sink('backmarket', orders)
         for order in orders:
             order_state = order.get('state', 0)
             order_id = str(order.get('order_id'))
@@ -293,21 +359,20 @@ def get_pending_orders(bm_client, rf_client, oct_client) -> List[Dict]:
     logger.info(f"BackMarket totale NON spediti (deduplicati): {bm_count} ordini")
     
     # Refurbed
-    rf_orders_all = rf_client.get_orders(state=None, limit=100, sort_desc=True)
+    rf_orders_all = fetched['refurbed']['result'] or []
     logger.info(f"Refurbed: recuperati {len(rf_orders_all)} ordini TOTALI")
     
-    rf_pending = []
+    rf_count = 0
     for order in rf_orders_all:
         order_state = order.get('state', 'NEW')
         if order_state not in ['SHIPPED', 'DELIVERED', 'CANCELLED', 'RETURNED', 'REJECTED']:
-            rf_pending.append(order)
             all_orders.append(normalize_order(order, 'refurbed'))
+            rf_count += 1
     
-    rf_count = len(rf_pending)
     logger.info(f"Refurbed: {rf_count} ordini pendenti")
     
     # CDiscount
-    oct_orders = oct_client.get_orders()
+    oct_orders = fetched['cdiscount']['result'] or []
     cd_count = 0
     
     for order in oct_orders:
@@ -317,7 +382,37 @@ def get_pending_orders(bm_client, rf_client, oct_client) -> List[Dict]:
     
     logger.info(f"CDiscount: {cd_count} ordini da processare")
     
-    return all_orders
+    # Magento
+    if magento_service:
+        for order in fetched['magento']['result'] or []:
+            all_orders.append(convert_magento_order(order))
+    
+    # Stato per canale (BackMarket aggrega i tre stati)
+    channels = {}
+    bm_tasks = [fetched[f'backmarket:{status}'] for status in bm_statuses]
+    channels['backmarket'] = {
+        'degraded': any(t['degraded'] for t in bm_tasks),
+        'error': next((t['error'] for t in bm_tasks if t['error']), None),
+        'elapsed_ms': max(t['elapsed_ms'] for t in bm_tasks)
+    }
+    for channel in ['refurbed', 'cdiscount', 'magento']:
+        if channel in fetched:
+            channels[channel] = {
+                'degraded': fetched[channel]['degraded'],
+                'error': fetched[channel]['error'],
+                'elapsed_ms': fetched[channel]['elapsed_ms']
+            }
+    
+    degraded = [name for name, status in channels.items() if status['degraded']]
+    if degraded:
+        logger.warning(f"⚠️ Canali degradati (risultato parziale): {', '.join(degraded)}")
+    
+    return {'orders': all_orders, 'channels': channels}
+
+
+def get_pending_orders(bm_client, rf_client, oct_client) -> List[Dict]:
+    """Recupera tutti gli ordini pendenti da tutti i canali"""
+    return fetch_pending_orders(bm_client, rf_client, oct_client)['orders']
 
 
 def disable_product_on_channels(
@@ -340,68 +435,137 @@ def disable_product_on_channels(
         magento_client: Client Magento (opzionale)
         
     Returns:
-        Dict con risultati per ogni canale
+        Dict con risultati per ogni canale (attempted, success, message, latency_ms)
     """
-    results = {
-        'backmarket': {'attempted': False, 'success': False, 'message': ''},
-        'refurbed': {'attempted': False, 'success': False, 'message': ''},
-        'cdiscount': {'attempted': False, 'success': False, 'message': ''},
-        'magento': {'attempted': False, 'success': False, 'message': ''}
+    results = disable_products_on_channels(
+        [{'sku': sku, 'listing_id': listing_id}],
+        bm_client, rf_client, oct_client, magento_client
+    )
+    return results['skus'].get(sku) or _empty_disable_results(magento_client)
+
+
+def disable_products_on_channels(
+    items: List[Dict],
+    bm_client,
+    rf_client,
+    oct_client,
+    magento_client=None
+) -> Dict:
+    """
+    Disabilita più prodotti su tutti i canali impostando stock a 0
+    
+    Tutte le chiamate partono in parallelo; su BackMarket gli SKU vengono
+    inviati con un unico upload di catalogo (una riga per SKU), su Refurbed
+    con BatchUpdateOffers.
+    
+    Args:
+        items: Lista di dict con 'sku' e 'listing_id' (opzionale, per BackMarket)
+        bm_client: Client BackMarket
+        rf_client: Client Refurbed
+        oct_client: Client Octopia/CDiscount
+        magento_client: Client Magento (opzionale)
+        
+    Returns:
+        Dict con 'skus' (sku -> risultati per canale, come disable_product_on_channels)
+        e 'backmarket_task' (ID del task asincrono BackMarket, se presente)
+    """
+    # SKU unici, con l'identificativo da usare su BackMarket
+    bm_ids = {}
+    for item in items:
+        sku = (item.get('sku') or '').strip()
+        if sku and sku not in bm_ids:
+            bm_ids[sku] = item.get('listing_id') or sku
+    
+    summary = {'skus': {sku: _empty_disable_results(magento_client) for sku in bm_ids}, 'backmarket_task': None}
+    if not bm_ids:
+        return summary
+    
+    logger.info(f"🔄 Disabilitazione {len(bm_ids)} SKU su tutti i canali (in parallelo): {list(bm_ids)}")
+    
+    # Tutti i canali contemporaneamente: l'unità resta acquistabile
+    # solo per il tempo del canale più lento
+    tasks = {
+        'backmarket': partial(bm_client.disable_listings, list(bm_ids.values())),
+        'refurbed': partial(rf_client.disable_offers, list(bm_ids))
     }
+    for sku in bm_ids:
+        tasks[f'cdiscount:{sku}'] = partial(oct_client.disable_offer, sku)
+        if magento_client:
+            tasks[f'magento:{sku}'] = partial(magento_client.disable_product, sku)
     
-    logger.info(f"🔄 Disabilitazione prodotto SKU {sku} su tutti i canali")
+    fetched = run_parallel(tasks, default_timeout=DISABLE_PRODUCT_TIMEOUT, max_workers=DISABLE_PRODUCT_MAX_WORKERS)
     
-    # BackMarket
-    try:
-        results['backmarket']['attempted'] = True
-        id_to_disable = listing_id if listing_id else sku
-        success = bm_client.disable_listing(id_to_disable)
-        results['backmarket']['success'] = success
-        results['backmarket']['message'] = '✅ Disabilitato' if success else '❌ Errore disabilitazione'
-    except Exception as e:
-        results['backmarket']['message'] = f'❌ Errore: {str(e)}'
-        logger.error(f"Errore disabilitazione BackMarket: {e}")
+    # BackMarket: un solo esito per tutto il batch
+    bm_outcome = fetched.pop('backmarket')
+    bm_batch = bm_outcome['result'] or {}
+    if bm_batch.get('task_id'):
+        summary['backmarket_task'] = bm_batch['task_id']
+    for sku in bm_ids:
+        _apply_disable_outcome(
+            summary['skus'][sku]['backmarket'],
+            dict(bm_outcome, result=bm_batch.get('success', False)),
+            '❌ Errore disabilitazione'
+        )
     
-    # Refurbed
-    try:
-        results['refurbed']['attempted'] = True
-        success = rf_client.disable_offer(sku)
-        results['refurbed']['success'] = success
-        results['refurbed']['message'] = '✅ Disabilitato' if success else '❌ Errore disabilitazione'
-    except Exception as e:
-        results['refurbed']['message'] = f'❌ Errore: {str(e)}'
-        logger.error(f"Errore disabilitazione Refurbed: {e}")
+    # Refurbed: esito per SKU dal batch
+    rf_outcome = fetched.pop('refurbed')
+    rf_batch = rf_outcome['result'] or {}
+    for sku in bm_ids:
+        sku_result = rf_batch.get(sku, {})
+        _apply_disable_outcome(
+            summary['skus'][sku]['refurbed'],
+            dict(rf_outcome, result=sku_result.get('success', False)),
+            f"❌ {sku_result.get('message') or 'Errore disabilitazione'}"
+        )
     
-    # CDiscount
-    try:
-        results['cdiscount']['attempted'] = True
-        success = oct_client.disable_offer(sku)
-        results['cdiscount']['success'] = success
-        results['cdiscount']['message'] = '✅ Disabilitato' if success else '⚠️ Package XML richiesto'
-    except Exception as e:
-        results['cdiscount']['message'] = f'❌ Errore: {str(e)}'
-        logger.error(f"Errore disabilitazione CDiscount: {e}")
+    failure_messages = {'cdiscount': '⚠️ Package XML richiesto'}
+    for name, outcome in fetched.items():
+        channel, sku = name.split(':', 1)
+        _apply_disable_outcome(
+            summary['skus'][sku][channel],
+            outcome,
+            failure_messages.get(channel, '❌ Errore disabilitazione')
+        )
     
-    # Magento
-    if magento_client:
-        try:
-            results['magento']['attempted'] = True
-            success = magento_client.disable_product(sku)
-            results['magento']['success'] = success
-            results['magento']['message'] = '✅ Disabilitato' if success else '❌ Errore disabilitazione'
-        except Exception as e:
-            results['magento']['message'] = f'❌ Errore: {str(e)}'
-            logger.error(f"Errore disabilitazione Magento: {e}")
-    else:
+    for sku, results in summary['skus'].items():
+        logger.info(f"📊 Risultati disabilitazione SKU {sku}:")
+        logger.info(f"  - BackMarket: {results['backmarket']}")
+        logger.info(f"  - Refurbed: {results['refurbed']}")
+        logger.info(f"  - CDiscount: {results['cdiscount']}")
+        logger.info(f"  - Magento: {results['magento']}")
+    
+    return summary
+
+
+def _empty_disable_results(magento_client=None) -> Dict:
+    results = {
+        'backmarket': {'attempted': False, 'success': False, 'message': '', 'latency_ms': 0},
+        'refurbed': {'attempted': False, 'success': False, 'message': '', 'latency_ms': 0},
+        'cdiscount': {'attempted': False, 'success': False, 'message': '', 'latency_ms': 0},
+        'magento': {'attempted': False, 'success': False, 'message': '', 'latency_ms': 0}
+    }
+    if not magento_client:
         results['magento']['message'] = '⚠️ Client non disponibile'
+    return results
+
+
+def _apply_disable_outcome(channel_result: Dict, outcome: Dict, failure_message: str):
+    """Riporta l'esito di un task run_parallel nella struttura risultati del canale"""
+    channel_result['attempted'] = True
+    channel_result['latency_ms'] = outcome['elapsed_ms']
     
-    logger.info(f"📊 Risultati disabilitazione SKU {sku}:")
-    logger.info(f"  - BackMarket: {results['backmarket']}")
-    logger.info(f"  - Refurbed: {results['refurbed']}")
-    logger.info(f"  - CDiscount: {results['cdiscount']}")
-    logger.info(f"  - Magento: {results['magento']}")
+    if outcome['error']:
+        if outcome['error'].startswith('Timeout'):
+            channel_result['message'] = f"⏱️ {outcome['error']} (richiesta ancora in corso)"
+        else:
+            channel_result['message'] = f"❌ Errore: {outcome['error']}"
+        logger.error(f"Errore disabilitazione: {outcome['error']}")
+        return
     
-    return results
+    success = bool(outcome['result'])
+    channel_result['success'] = success
+    channel_result['message'] = '✅ Disabilitato' if success else failure_message
+
 # ============================================================================
 # CLASSE ORDER SERVICE (wrapper per automazione)
 # ============================================================================
@@ -412,6 +576,9 @@ class OrderService:
     Wrapper per le funzioni esistenti
     """
     
+    # Payload originali degli ordini recuperati, riusati da accettazione/spedizione
+    RAW_ORDER_INDEX_SIZE = 500
+    
     def __init__(
         self, 
         backmarket_client, 
@@ -419,13 +586,29 @@ class OrderService:
         magento_client,
         octopia_client,
         anastasia_client,
-        order_tracker=None  # ✅ AGGIUNGI PARAMETRO
+        order_tracker=None,  # ✅ AGGIUNGI PARAMETRO
+        sync_state=None,
+        order_cache=None,
+        magento_service=None
     ):
         self.bm_client = backmarket_client
         self.rf_client = refurbed_client
         self.magento_client = magento_client
         self.oct_client = octopia_client
         self.anastasia_client = anastasia_client
+        self.order_cache = order_cache
+        
+        # Servizio Magento condiviso (get_order non ne crea uno a ogni chiamata)
+        if magento_service is None:
+            from services.magento_service import MagentoService
+            magento_service = MagentoService(magento_client)
+        self.magento_service = magento_service
+        
+        self._raw_orders = OrderedDict()
+        self._raw_orders_lock = threading.Lock()
+        # Cursori del giro in corso: salvati solo dopo l'elaborazione degli ordini
+        self._staged_cursors: Dict[str, Dict] = {}
+        self._staged_cursors_lock = threading.Lock()
         
         # ✅ USA TRACKER PASSATO O CREANE UNO NUOVO
         if order_tracker:
@@ -434,7 +617,76 @@ class OrderService:
             from utils.order_tracker import OrderTracker
             self.order_tracker = OrderTracker()
         
-        logger.info("OrderService inizializzato")
+        # ✅ CURSORI SYNC INCREMENTALE
+        if sync_state:
+            self.sync_state = sync_state
+        else:
+            from utils.sync_state import SyncState
+            self.sync_state = SyncState()
+        
+        logger.info(f"OrderService inizializzato (sync: {ORDER_SYNC_MODE})")
+    
+    def _is_full_sync(self, channel: str) -> bool:
+        """True se per il canale va scaricata la lista completa invece del delta"""
+        if ORDER_SYNC_MODE != 'incremental':
+            return True
+        return self.sync_state.needs_full_sync(channel)
+    
+    def _stage_cursor(self, channel: str, kind: str, positions: List[tuple], full_sync: bool):
+        """
+        Prepara il cursore del canale per commit_sync_cursors()
+        
+        Args:
+            kind: 'timestamp' (data di modifica) o 'id' (paginazione per ID ordine)
+            positions: [(order_id, valore cursore)] dal più vecchio al più recente
+            full_sync: True se il recupero era una riconciliazione completa
+        """
+        with self._staged_cursors_lock:
+            self._staged_cursors[channel] = {'kind': kind, 'positions': positions, 'full_sync': full_sync}
+    
+    def commit_sync_cursors(self, failed: Dict[str, set] = None):
+        """
+        Salva i cursori preparati dall'ultimo recupero ordini
+        
+        Va chiamato dopo che l'automazione ha accettato gli ordini e creato i
+        DDT: il cursore non supera mai l'ordine fallito più vecchio del canale,
+        così al giro successivo il delta lo include di nuovo.
+        
+        Args:
+            failed: canale -> ID degli ordini la cui elaborazione è fallita
+        """
+        failed = failed or {}
+        with self._staged_cursors_lock:
+            staged, self._staged_cursors = self._staged_cursors, {}
+        
+        if ORDER_SYNC_MODE != 'incremental':
+            return
+        
+        for channel, stage in staged.items():
+            failed_ids = {str(order_id) for order_id in failed.get(channel, ())}
+            cursor = self._cursor_before_failures(stage['kind'], stage['positions'], failed_ids)
+            if failed_ids:
+                logger.info(f"🔖 Cursore {channel} fermo prima di {len(failed_ids)} ordini falliti")
+            # Riconciliazione completa registrata anche senza cursore (nessun ordine)
+            if cursor is not None or stage['full_sync']:
+                self.sync_state.set_cursor(
+                    channel, str(cursor) if cursor is not None else None, full_sync=stage['full_sync']
+                )
+    
+    @staticmethod
+    def _cursor_before_failures(kind: str, positions: List[tuple], failed_ids: set):
+        """Cursore più avanzato che non salta ordini falliti (None = lascia quello attuale)"""
+        failed_positions = [i for i, (order_id, _) in enumerate(positions) if str(order_id) in failed_ids]
+        
+        if kind == 'timestamp':
+            if failed_positions:
+                # Il delta successivo parte da qui meno SYNC_OVERLAP_MINUTES: l'ordine è incluso
+                return earliest_timestamp(positions[i][1] for i in failed_positions)
+            return latest_timestamp(value for _, value in positions)
+        
+        # Cursore per ID: "dopo questo ordine", quindi l'ordine che precede il primo fallito
+        end = failed_positions[0] if failed_positions else len(positions)
+        return positions[end - 1][1] if end > 0 else None
     
     def get_all_pending_orders(self) -> List[Dict]:
         """Recupera tutti gli ordini pendenti da tutti i marketplace"""
@@ -444,54 +696,179 @@ class OrderService:
             oct_client=self.oct_client
         )
     
+    def get_raw_order(self, source: str, order_id: str) -> Optional[Dict]:
+        """Payload originale del marketplace per un ordine già recuperato (None se non in memoria)"""
+        with self._raw_orders_lock:
+            return self._raw_orders.get((source.lower(), str(order_id)))
+    
+    def remember_raw_orders(self, source: str, orders: List[Dict], id_field: str = 'order_id'):
+        """Memorizza i payload appena scaricati (sostituiscono quelli precedenti dello stesso ordine)"""
+        with self._raw_orders_lock:
+            for order in orders:
+                key = (source, str(order.get(id_field)))
+                self._raw_orders[key] = order
+                self._raw_orders.move_to_end(key)
+            while len(self._raw_orders) > self.RAW_ORDER_INDEX_SIZE:
+                self._raw_orders.popitem(last=False)
+    
+    def forget_raw_order(self, source: str, order_id: str):
+        """Scarta il payload dopo un cambio di stato (accettazione, spedizione): non è più attuale"""
+        with self._raw_orders_lock:
+            self._raw_orders.pop((source.lower(), str(order_id)), None)
+    
+    def get_order(self, source: str, order_id: str) -> Optional[Dict]:
+        """
+        Recupera un singolo ordine normalizzato
+        
+        Prima cerca nell'indice della cache ordini, altrimenti fa una sola
+        richiesta puntuale al marketplace (niente scansione di tutti i canali).
+        
+        Args:
+            source: 'BackMarket', 'Refurbed', 'CDiscount', 'Magento' (case insensitive)
+            order_id: ID ordine sul marketplace (increment_id per Magento)
+        """
+        channel = source.lower()
+        if channel == 'octopia':
+            channel = 'cdiscount'
+        order_id = str(order_id)
+        
+        if self.order_cache:
+            cached = self.order_cache.find(channel, order_id)
+            if cached:
+                return cached
+        
+        if channel == 'backmarket':
+            raw = self.bm_client.get_order(order_id)
+            if raw:
+                self.remember_raw_orders('backmarket', [raw], 'order_id')
+            return normalize_order(raw, 'backmarket') if raw else None
+        
+        if channel == 'refurbed':
+            raw = self.rf_client.get_order(order_id)
+            return normalize_order(raw, 'refurbed') if raw else None
+        
+        if channel == 'cdiscount':
+            raw = self.oct_client.get_order(order_id)
+            return normalize_order(raw, 'octopia') if raw else None
+        
+        if channel == 'magento':
+            order = self.magento_service.get_order_by_id(order_id)
+            return convert_magento_order(order) if order else None
+        
+        logger.warning(f"Marketplace {source} non supportato per get_order")
+        return None
+    
     def get_backmarket_pending_orders(self) -> List[Dict]:
         """Recupera solo ordini BackMarket NON ancora accettati"""
         orders = []
         seen_order_ids = set()
         
+        full_sync = self._is_full_sync('backmarket')
+        modified_since = None if full_sync else with_overlap(self.sync_state.get_cursor('backmarket'))
+        
         # ✅ SOLO waiting_acceptance (non ancora accettati)
         for status in ['waiting_acceptance']:
-            bm_orders = self.bm_client.get_orders(status=status)
+            bm_orders = self.bm_client.get_orders(status=status, modified_since=modified_since)
+            self.remember_raw_orders('backmarket', bm_orders, 'order_id')
+            self._stage_cursor(
+                'backmarket',
+                'timestamp',
+                [(str(order.get('order_id')), order.get('date_modification')) for order in bm_orders],
+                full_sync
+            )
+            
+            # ✅ FILTRO: Skip se già processato (una sola ricerca per tutta la pagina)
+            _, processed = self.order_tracker.partition(
+                'backmarket', [str(order.get('order_id')) for order in bm_orders]
+            )
+            processed = set(processed)
+            
             for order in bm_orders:
                 order_state = order.get('state', 0)
                 order_id = str(order.get('order_id'))
                 
-                # ✅ FILTRO: Skip se già processato
-                if self.order_tracker.is_processed('backmarket', order_id):
+                if order_id in processed:
                     continue
                 
                 if order_id not in seen_order_ids and order_state != 9:
                     orders.append(normalize_order(order, 'backmarket'))
                     seen_order_ids.add(order_id)
         
-        logger.info(f"BackMarket: {len(orders)} ordini in attesa di accettazione")
+        logger.info(
+            f"BackMarket: {len(orders)} ordini in attesa di accettazione "
+            f"({'completa' if full_sync else 'incrementale'})"
+        )
         return orders
     
     def get_refurbed_pending_orders(self) -> List[Dict]:
         """Recupera solo ordini Refurbed NON ancora processati"""
-        rf_orders_all = self.rf_client.get_orders(state=None, limit=100, sort_desc=True)
+        cursor = self.sync_state.get_cursor('refurbed')
+        # Senza cursore "dopo l'ordine X" non c'è un delta possibile
+        full_sync = self._is_full_sync('refurbed') or not cursor
+        
+        if full_sync:
+            # Lista completa dal più recente
+            rf_orders_all = self.rf_client.get_orders(state=None, limit=100, sort_desc=True)
+            ascending = list(reversed(rf_orders_all))
+        else:
+            # Solo ordini creati dopo il cursore (ordine crescente)
+            rf_orders_all = self.rf_client.get_orders_since(cursor, limit=100)
+            ascending = rf_orders_all
+        
+        self._stage_cursor(
+            'refurbed',
+            'id',
+            [(str(order.get('id', '')), order.get('id')) for order in ascending],
+            full_sync
+        )
         orders = []
         
+        # ✅ FILTRO: Skip se già processato (una sola ricerca per tutta la pagina)
+        _, processed = self.order_tracker.partition(
+            'refurbed', [str(order.get('id', '')) for order in rf_orders_all]
+        )
+        processed = set(processed)
+        
         for order in rf_orders_all:
             order_state = order.get('state', 'NEW')
             order_id = str(order.get('id', ''))
             
-            # ✅ FILTRO: Skip se già processato
-            if self.order_tracker.is_processed('refurbed', order_id):
+            if order_id in processed:
                 continue
             
             if order_state == 'NEW':
                 orders.append(normalize_order(order, 'refurbed'))
         
-        logger.info(f"Refurbed: {len(orders)} ordini NEW in attesa")
+        logger.info(
+            f"Refurbed: {len(orders)} ordini NEW in attesa "
+            f"({'completa' if full_sync else 'incrementale'})"
+        )
         return orders
     
     def get_magento_pending_orders(self) -> List[Dict]:
         orders = []
         
         try:
-            mg_orders = self.magento_client.get_processing_orders()
-            logger.info(f"Magento: trovati {len(mg_orders)} ordini in processing")
+            full_sync = self._is_full_sync('magento')
+            updated_since = None if full_sync else with_overlap(self.sync_state.get_cursor('magento'))
+            
+            mg_orders = self.magento_client.get_processing_orders(updated_since=updated_since)
+            logger.info(
+                f"Magento: trovati {len(mg_orders)} ordini in processing "
+                f"({'completa' if full_sync else 'incrementale'})"
+            )
+            self._stage_cursor(
+                'magento',
+                'timestamp',
+                [(order.get('increment_id', ''), order.get('updated_at')) for order in mg_orders],
+                full_sync
+            )
+            
+            # ✅ FILTRO TRACKER (una sola ricerca per tutta la pagina)
+            _, processed = self.order_tracker.partition(
+                'magento', [order.get('increment_id', '') for order in mg_orders if order.get('increment_id')]
+            )
+            processed = set(processed)
             
             for order in mg_orders:
                 order_id = order.get('increment_id', '')
@@ -499,8 +876,7 @@ class OrderService:
                 if not order_id:
                     continue
                 
-                # ✅ FILTRO TRACKER
-                if self.order_tracker.is_processed('magento', order_id):
+                if order_id in processed:
                     continue
                 
                 orders.append(normalize_order(order, 'magento'))
@@ -523,6 +899,16 @@ class OrderService:
             magento_client=self.magento_client
         )
     
+    def disable_products_all_channels(self, items: List[Dict]) -> Dict:
+        """Disabilita più prodotti su tutti i canali (BackMarket in un solo batch)"""
+        return disable_products_on_channels(
+            items=items,
+            bm_client=self.bm_client,
+            rf_client=self.rf_client,
+            oct_client=self.oct_client,
+            magento_client=self.magento_client
+        )
+    
     def get_magento_waiting_payment_orders(self) -> List[Dict]:
         """Recupera ordini Magento in stato 'pending' (in attesa pagamento)"""
         orders = []
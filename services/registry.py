@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Registro dei client esterni con inizializzazione pigra e warm-up in background
+"""
+import threading
+import time
+import logging
+from typing import Callable, Dict, Iterable
+
+logger = logging.getLogger(__name__)
+
+
+class ServiceUnavailable(RuntimeError):
+    """Il client non è stato costruito (upstream non raggiungibile all'inizializzazione)"""
+
+
+class ServiceRegistry:
+    """
+    I client vengono costruiti al primo utilizzo (o dal warm-up), non
+    all'import di app.py: un upstream lento non ritarda l'avvio di gunicorn.
+
+    - get(name): costruisce una sola volta, anche con chiamanti concorrenti
+    - un'inizializzazione fallita viene ritentata dopo RETRY_AFTER secondi
+    - lazy(name): oggetto da passare ai service al posto del client
+    - warm_up(): costruisce tutto in un thread in background
+    - ready: tutti i client obbligatori sono pronti (readiness)
+    """
+
+    RETRY_AFTER = 30
+
+    def __init__(self):
+        self._factories: Dict[str, Callable] = {}
+        self._required: Dict[str, bool] = {}
+        self._instances: Dict[str, object] = {}
+        self._status: Dict[str, Dict] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self._warm_up_done = threading.Event()
+
+    def register(self, name: str, factory: Callable, required: bool = True):
+        """
+        Args:
+            name: Nome del client
+            factory: Funzione senza argomenti che costruisce il client
+            required: Se False il servizio è opzionale (non blocca la readiness)
+        """
+        with self._lock:
+            self._factories[name] = factory
+            self._required[name] = required
+            self._locks[name] = threading.Lock()
+            self._status[name] = {'state': 'pending', 'build_ms': None, 'error': None, 'failed_at': None}
+
+    def get(self, name: str):
+        """Ritorna il client, costruendolo se necessario (None se l'inizializzazione fallisce)"""
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+
+        with self._locks[name]:
+            instance = self._instances.get(name)
+            if instance is not None:
+                return instance
+
+            status = self._status[name]
+            if status['failed_at'] and time.monotonic() - status['failed_at'] < self.RETRY_AFTER:
+                return None
+
+            status['state'] = 'building'
+            start = time.monotonic()
+            try:
+                instance = self._factories[name]()
+            except Exception as e:
+                logger.error(f"❌ Inizializzazione {name} fallita: {e}")
+                status.update(state='failed', error=str(e), failed_at=time.monotonic(),
+                              build_ms=int((time.monotonic() - start) * 1000))
+                return None
+
+            self._instances[name] = instance
+            status.update(state='ready', error=None, failed_at=None,
+                          build_ms=int((time.monotonic() - start) * 1000))
+            logger.info(f"✅ {name} inizializzato in {status['build_ms']}ms")
+            return instance
+
+    def get_if_built(self, name: str):
+        """Ritorna il client solo se già costruito (non avvia connessioni)"""
+        return self._instances.get(name)
+
+    def lazy(self, name: str) -> '_LazyService':
+        return _LazyService(self, name)
+
+    def warm_up(self, names: Iterable[str] = None, extra: Iterable[Callable] = ()):
+        """
+        Costruisce i client in background
+
+        Args:
+            names: Client da costruire (default: tutti)
+            extra: Altre operazioni di riscaldamento eseguite dopo (es. indici, cache)
+        """
+        names = list(names or self._factories)
+
+        def _run():
+            start = time.monotonic()
+            for name in names:
+                self.get(name)
+            self._warm_up_done.set()
+            for task in extra:
+                try:
+                    task()
+                except Exception as e:
+                    logger.error(f"❌ Warm-up {getattr(task, '__name__', task)} fallito: {e}")
+            logger.info(f"🔥 Warm-up completato in {int((time.monotonic() - start) * 1000)}ms")
+
+        threading.Thread(target=_run, name='service-warmup', daemon=True).start()
+
+    @property
+    def warmed_up(self) -> bool:
+        """True quando il warm-up ha provato a costruire tutti i client"""
+        return self._warm_up_done.is_set()
+
+    @property
+    def ready(self) -> bool:
+        """True se tutti i client obbligatori sono costruiti"""
+        return all(
+            name in self._instances
+            for name, required in self._required.items()
+            if required
+        )
+
+    def status(self) -> Dict:
+        with self._lock:
+            return {
+                name: {
+                    'state': s['state'],
+                    'required': self._required[name],
+                    'build_ms': s['build_ms'],
+                    'error': s['error']
+                }
+                for name, s in self._status.items()
+            }
+
+
+class _LazyService:
+    """Rimanda ogni accesso agli attributi al client costruito dal registro"""
+
+    __slots__ = ('_registry', '_name')
+
+    def __init__(self, registry: ServiceRegistry, name: str):
+        object.__setattr__(self, '_registry', registry)
+        object.__setattr__(self, '_name', name)
+
+    def _resolve(self):
+        instance = self._registry.get(self._name)
+        if instance is None:
+            raise ServiceUnavailable(f"Servizio {self._name} non disponibile")
+        return instance
+
+    def __getattr__(self, attr: str):
+        return getattr(self._resolve(), attr)
+
+    def __bool__(self) -> bool:
+        # "if client:" equivale a "il client è disponibile"
+        return self._registry.get(self._name) is not None
+
+    def __repr__(self) -> str:
+        return f"<lazy {self._name}>"
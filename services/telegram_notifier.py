@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Notifiche Telegram asincrone: coda, digest, rate limit e retry
+"""
+import queue
+import threading
+import time
+import logging
+from typing import Dict, List, Optional
+
+from config import (
+    TELEGRAM_DIGEST_WINDOW,
+    TELEGRAM_MIN_INTERVAL,
+    TELEGRAM_MAX_RETRIES,
+    TELEGRAM_QUEUE_SIZE
+)
+
+logger = logging.getLogger(__name__)
+
+# Limite Telegram 4096 caratteri per messaggio, con margine
+MAX_MESSAGE_LENGTH = 4000
+DIGEST_SEPARATOR = "\n\n➖➖➖➖➖\n\n"
+
+
+class TelegramNotifier:
+    """
+    notify() accoda e ritorna subito: l'invio avviene in un thread dedicato,
+    così automazione e richieste HTTP non aspettano mai Telegram.
+
+    - gli eventi arrivati entro TELEGRAM_DIGEST_WINDOW secondi dal primo
+      vengono uniti in un unico messaggio (digest)
+    - tra due messaggi passano almeno TELEGRAM_MIN_INTERVAL secondi; su 429
+      si attende il retry_after indicato da Telegram
+    - 5xx ed errori di connessione prima dell'invio vengono ritentati con
+      backoff esponenziale; read timeout e connessioni interrotte no (il
+      messaggio potrebbe essere già arrivato e verrebbe duplicato)
+    - Markdown non valido (400) viene reinviato come testo semplice
+    """
+
+    def __init__(
+        self,
+        client,
+        digest_window: float = TELEGRAM_DIGEST_WINDOW,
+        min_interval: float = TELEGRAM_MIN_INTERVAL,
+        max_retries: int = TELEGRAM_MAX_RETRIES,
+        queue_size: int = TELEGRAM_QUEUE_SIZE
+    ):
+        self.client = client
+        self.digest_window = digest_window
+        self.min_interval = min_interval
+        self.max_retries = max_retries
+
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._next_send_at = 0.0
+        self._stats_lock = threading.Lock()
+        self._stats = {'queued': 0, 'dropped': 0, 'messages_sent': 0, 'events_sent': 0, 'retries': 0, 'failed': 0}
+
+    @property
+    def configured(self) -> bool:
+        return self.client.configured
+
+    def start(self):
+        """Avvia il worker (idempotente)"""
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._worker, name='telegram-notifier', daemon=True)
+                self._thread.start()
+
+    def notify(self, text: str) -> bool:
+        """
+        Accoda un messaggio senza bloccare
+
+        Returns:
+            False se Telegram non è configurato o la coda è piena
+        """
+        if not self.configured:
+            return False
+
+        self.start()
+        try:
+            self._queue.put_nowait(text)
+        except queue.Full:
+            logger.warning("⚠️ Coda notifiche Telegram piena, messaggio scartato")
+            self._count('dropped')
+            return False
+
+        self._count('queued')
+        return True
+
+    def flush(self, timeout: float = 30) -> bool:
+        """Attende lo svuotamento della coda (test e spegnimento)"""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.05)
+        return True
+
+    def get_stats(self) -> Dict:
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats['pending'] = self._queue.unfinished_tasks
+        stats['configured'] = self.configured
+        return stats
+
+    def _worker(self):
+        while True:
+            events = [self._queue.get()]
+
+            # Raccogli gli eventi che arrivano nella finestra del digest
+            deadline = time.monotonic() + self.digest_window
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    events.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            try:
+                for message, count in self._build_messages(events):
+                    if self._send_with_retry(message):
+                        with self._stats_lock:
+                            self._stats['messages_sent'] += 1
+                            self._stats['events_sent'] += count
+                    else:
+                        self._count('failed')
+            except Exception as e:
+                logger.error(f"❌ Errore worker notifiche Telegram: {e}")
+            finally:
+                for _ in events:
+                    self._queue.task_done()
+
+    @staticmethod
+    def _build_messages(events: List[str]) -> List[tuple]:
+        """Unisce gli eventi in messaggi entro il limite di lunghezza: [(testo, n_eventi)]"""
+        messages = []
+        current: List[str] = []
+        length = 0
+
+        for text in events:
+            if len(text) > MAX_MESSAGE_LENGTH:
+                logger.warning(
+                    f"✂️ Notifica Telegram troncata: {len(text)} caratteri, "
+                    f"limite {MAX_MESSAGE_LENGTH}"
+                )
+                text = text[:MAX_MESSAGE_LENGTH]
+            if current and length + len(DIGEST_SEPARATOR) + len(text) > MAX_MESSAGE_LENGTH:
+                messages.append((DIGEST_SEPARATOR.join(current), len(current)))
+                current, length = [], 0
+            current.append(text)
+            length += len(text) + (len(DIGEST_SEPARATOR) if len(current) > 1 else 0)
+
+        if current:
+            messages.append((DIGEST_SEPARATOR.join(current), len(current)))
+        return messages
+
+    def _send_with_retry(self, text: str) -> bool:
+        parse_mode = 'Markdown'
+
+        for attempt in range(self.max_retries + 1):
+            wait = self._next_send_at - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+
+            result = self.client.send_message(text, parse_mode=parse_mode)
+            self._next_send_at = time.monotonic() + self.min_interval
+
+            if result['ok']:
+                logger.info("📱 Notifica Telegram inviata")
+                return True
+
+            status = result['status_code']
+            markdown_error = status == 400 and parse_mode
+            # Errori definitivi: nessun nuovo tentativo (e niente conteggio retry)
+            if status is not None and 400 <= status < 500 and status != 429 and not markdown_error:
+                logger.error(f"❌ Notifica Telegram rifiutata ({status}): {result['error']}")
+                return False
+            if status is None and not result.get('not_sent'):
+                logger.error(f"❌ Esito notifica Telegram incerto, non ritento ({result['error']})")
+                return False
+
+            if attempt < self.max_retries:
+                self._count('retries')
+
+            if status == 429:
+                delay = float(result['retry_after'] or self.min_interval)
+                logger.warning(f"⏳ Telegram rate limit: nuovo tentativo tra {delay}s")
+                self._next_send_at = time.monotonic() + delay
+            elif markdown_error:
+                logger.warning(f"⚠️ Markdown rifiutato da Telegram ({result['error']}), invio come testo")
+                parse_mode = None
+            else:
+                delay = min(2 ** attempt, 60)
+                logger.warning(f"⚠️ Invio Telegram fallito ({result['error']}), nuovo tentativo tra {delay}s")
+                self._next_send_at = time.monotonic() + delay
+
+        logger.error("❌ Notifica Telegram non inviata dopo tutti i tentativi")
+        return False
+
+    def _count(self, key: str):
+        with self._stats_lock:
+            self._stats[key] += 1
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Snapshot condiviso dei ticket Anastasia per la dashboard
+"""
+import hashlib
+import json
+import threading
+import time
+import logging
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from config import (
+    TICKET_SNAPSHOT_INTERVAL,
+    TICKET_SNAPSHOT_OPEN_LIMIT,
+    TICKET_SNAPSHOT_CLOSED_LIMIT
+)
+
+logger = logging.getLogger(__name__)
+
+
+class TicketSnapshotService:
+    """
+    Statistiche + ticket aperti + chiusi oggi, ricalcolati ogni
+    TICKET_SNAPSHOT_INTERVAL secondi con un solo accesso al database
+
+    Tutte le schede della dashboard leggono lo stesso snapshot: il carico sul
+    database non dipende da quante sono aperte. Se nessuno legge lo snapshot
+    per un po' il ricalcolo periodico si ferma e riparte alla lettura successiva.
+    """
+
+    # Giri senza letture dopo cui il ricalcolo periodico si mette in pausa
+    IDLE_ROUNDS = 10
+
+    # Date già formattate ("5 min fa"): cambiano a ogni ricalcolo anche con
+    # ticket invariati, quindi restano fuori dall'ETag (si usa last_update_raw)
+    FORMATTED_FIELDS = ('creation_date', 'last_update')
+
+    def __init__(
+        self,
+        anastasia_client,
+        interval: int = TICKET_SNAPSHOT_INTERVAL,
+        open_limit: int = TICKET_SNAPSHOT_OPEN_LIMIT,
+        closed_limit: int = TICKET_SNAPSHOT_CLOSED_LIMIT
+    ):
+        self.client = anastasia_client
+        self.interval = max(5, interval)
+        self.open_limit = open_limit
+        self.closed_limit = closed_limit
+
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._snapshot: Optional[Dict] = None
+        self._last_read = 0.0
+        self._thread: Optional[threading.Thread] = None
+        self._listeners: List[Callable[[Dict], None]] = []
+        self._stats = {'reads': 0, 'refreshes': 0, 'refresh_errors': 0, 'skipped_idle': 0}
+
+    def start(self):
+        """Avvia il ricalcolo periodico in background"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name='ticket-snapshot', daemon=True)
+            self._thread.start()
+
+    def add_listener(self, callback: Callable[[Dict], None]):
+        """Registra una funzione chiamata con lo snapshot (come get()) quando cambia"""
+        self._listeners.append(callback)
+
+    def get(self) -> Optional[Dict]:
+        """
+        Snapshot corrente
+
+        Returns:
+            Dict con 'data' (stats, open_tickets, closed_today), 'etag',
+            'generated_at' e 'age_seconds'; None se il database non ha mai risposto
+        """
+        with self._lock:
+            self._stats['reads'] += 1
+            self._last_read = time.monotonic()
+            snapshot = self._snapshot
+
+        if snapshot is None or time.monotonic() - snapshot['loaded_at'] > self.interval * 2:
+            # Primo accesso o ricalcolo in pausa per inattività: aggiorna subito
+            snapshot = self.refresh() or snapshot
+
+        if snapshot is None:
+            return None
+        return self._view(snapshot)
+
+    def refresh(self) -> Optional[Dict]:
+        """Ricalcola lo snapshot (una richiesta alla volta)"""
+        with self._refresh_lock:
+            with self._lock:
+                current = self._snapshot
+            # Appena ricalcolato da un altro thread
+            if current is not None and time.monotonic() - current['loaded_at'] < 1:
+                return current
+
+            start = time.monotonic()
+            try:
+                data = self.client.get_ticket_snapshot(self.open_limit, self.closed_limit)
+            except Exception as e:
+                logger.error(f"❌ Errore aggiornamento snapshot ticket: {e}")
+                with self._lock:
+                    self._stats['refresh_errors'] += 1
+                return None
+
+            snapshot = {
+                'data': data,
+                'etag': self._etag(data),
+                'generated_at': datetime.now().isoformat(timespec='seconds'),
+                'loaded_at': time.monotonic(),
+                'elapsed_ms': int((time.monotonic() - start) * 1000)
+            }
+            with self._lock:
+                changed = current is None or current['etag'] != snapshot['etag']
+                self._snapshot = snapshot
+                self._stats['refreshes'] += 1
+
+            if changed:
+                for callback in self._listeners:
+                    try:
+                        callback(self._view(snapshot))
+                    except Exception as e:
+                        logger.error(f"❌ Errore listener snapshot ticket: {e}")
+            return snapshot
+
+    @classmethod
+    def _etag(cls, data: Dict) -> str:
+        """Hash dei soli campi grezzi (id, stato, timestamp Unix) dello snapshot"""
+        raw = {
+            key: [
+                {k: v for k, v in ticket.items() if k not in cls.FORMATTED_FIELDS}
+                for ticket in value
+            ] if isinstance(value, list) else value
+            for key, value in data.items()
+        }
+        payload = json.dumps(raw, sort_keys=True, default=str)
+        return hashlib.sha1(payload.encode('utf-8')).hexdigest()[:16]
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+            snapshot = self._snapshot
+        stats['age_seconds'] = int(time.monotonic() - snapshot['loaded_at']) if snapshot else None
+        stats['last_query_ms'] = snapshot['elapsed_ms'] if snapshot else None
+        return stats
+
+    def _loop(self):
+        while True:
+            with self._lock:
+                idle = (
+                    self._snapshot is not None
+                    and time.monotonic() - self._last_read > self.interval * self.IDLE_ROUNDS
+                )
+                if idle:
+                    self._stats['skipped_idle'] += 1
+            if not idle:
+                self.refresh()
+
+            time.sleep(self.interval)
+
+    @staticmethod
+    def _view(snapshot: Dict) -> Dict:
+        return {
+            'data': snapshot['data'],
+            'etag': snapshot['etag'],
+            'generated_at': snapshot['generated_at'],
+            'age_seconds': int(time.monotonic() - snapshot['loaded_at'])
+        }
@@ -0,0 +1,552 @@
+let orders = [];
+let ordersVersion = null;
+
+function refreshOrders() {
+    document.getElementById('loading').style.display = 'block';
+    // Con una versione nota arrivano solo le differenze (o 304 se nulla è cambiato)
+    const url = ordersVersion ? `/api/orders/all?since=${encodeURIComponent(ordersVersion)}` : '/api/orders/all';
+    fetch(url, { cache: 'no-cache' })
+        .then(r => r.status === 304 ? null : r.json())
+        .then(data => {
+            if (data) {
+                if (data.delta) {
+                    applyOrderDiff({added: data.added, changed: data.updated, removed: data.removed, version: data.version});
+                } else {
+                    orders = data.orders;
+                    ordersVersion = data.version;
+                    updateStats();
+                    renderOrders();
+                    refreshPendingOrders();
+                }
+            }
+            document.getElementById('loading').style.display = 'none';
+        })
+        .catch(err => {
+            console.error(err);
+            alert('Errore nel caricamento ordini');
+            document.getElementById('loading').style.display = 'none';
+        });
+}
+
+function updateStats() {
+    const bm = orders.filter(o => o.source === 'BackMarket').length;
+    const rf = orders.filter(o => o.source === 'Refurbed').length;
+    const cd = orders.filter(o => o.source === 'CDiscount').length;
+    const mg = orders.filter(o => o.source === 'Magento').length;
+
+    document.getElementById('pending-count').textContent = orders.length;
+    document.getElementById('bm-count').textContent = bm;
+    document.getElementById('rf-count').textContent = rf;
+    document.getElementById('cd-count').textContent = cd;
+    document.getElementById('mg-count').textContent = mg;
+}
+
+function renderOrders() {
+    const tbody = document.getElementById('orders-body');
+
+    if (orders.length === 0) {
+        tbody.innerHTML = '<tr><td colspan="9" class="empty-state"><div class="empty-state-icon">✅</div><div>Nessun ordine pendente</div></td></tr>';
+        return;
+    }
+
+    tbody.innerHTML = orders.map(order => {
+        const badgeClass = 'badge-' + order.source.toLowerCase();
+        const date = new Date(order.date).toLocaleDateString('it-IT');
+
+        let productInfo = 'N/A';
+        let skuInfo = 'N/A';
+
+        if (order.items && order.items.length > 0) {
+            const item = order.items[0];
+            productInfo = item.name || 'N/A';
+            skuInfo = item.sku || 'N/A';
+
+            if (order.items.length > 1) {
+                productInfo += ` (+${order.items.length - 1})`;
+            }
+        }
+
+        let actionButtons = '';
+        let statusBadge = '';
+
+        if (order.source === 'Magento') {
+            const entityId = order.entity_id || 0;
+            actionButtons = `
+                <button class="btn btn-success btn-small"
+                        onclick="createDDTOnly('${order.order_id}', '${order.source}')"
+                        style="margin-right: 5px;">
+                    Crea DDT
+                </button>
+                <button class="btn btn-primary btn-small"
+                        onclick="shipMagentoOrder('${order.order_id}', ${entityId})"
+                        style="background: #17a2b8;">
+                    📦 Spedito
+                </button>
+            `;
+            statusBadge = '<span class="badge badge-pending">Processing</span>';
+        } else if (order.source === 'BackMarket') {
+            const stateNum = order.status;
+
+            let packingSlipBtn = '';
+            if (order.delivery_note) {
+                packingSlipBtn = `<a href="${order.delivery_note}" target="_blank" class="btn btn-primary btn-small" style="margin-right: 5px; background: #6c757d;">Packing Slip</a>`;
+            }
+
+            if (stateNum === 1 || order.status === 'waiting_acceptance') {
+                actionButtons = `${packingSlipBtn}<button class="btn btn-primary btn-small" onclick="acceptOrderOnly('${order.order_id}', '${order.source}')" style="margin-right: 5px;">Accetta</button><button class="btn btn-success btn-small" onclick="createDDTOnly('${order.order_id}', '${order.source}')">Crea DDT</button>`;
+                statusBadge = '<span class="badge badge-pending">Da Accettare</span>';
+            } else if (stateNum === 2 || order.status === 'accepted') {
+                actionButtons = `${packingSlipBtn}<button class="btn btn-success btn-small" onclick="createDDTOnly('${order.order_id}', '${order.source}')" style="margin-right: 5px;">Crea DDT</button><button class="btn btn-primary btn-small" onclick="markAsShipped('${order.order_id}', '${order.source}')" style="background: #17a2b8;">Spedito</button>`;
+                statusBadge = '<span class="badge badge-accepted">Accettato</span>';
+            } else if (stateNum === 3 || order.status === 'to_ship') {
+                actionButtons = `${packingSlipBtn}<button class="btn btn-success btn-small" onclick="createDDTOnly('${order.order_id}', '${order.source}')" style="margin-right: 5px;">Crea DDT</button><button class="btn btn-primary btn-small" onclick="markAsShipped('${order.order_id}', '${order.source}')" style="background: #17a2b8;">Spedito</button>`;
+                statusBadge = '<span class="badge badge-accepted">Da Spedire</span>';
+            } else {
+                actionButtons = `${packingSlipBtn}<button class="btn btn-primary btn-small" onclick="acceptOrderOnly('${order.order_id}', '${order.source}')" style="margin-right: 5px;">Accetta</button><button class="btn btn-success btn-small" onclick="createDDTOnly('${order.order_id}', '${order.source}')">Crea DDT</button>`;
+                statusBadge = '<span class="badge badge-pending">Pendente</span>';
+            }
+        } else if (order.source === 'Refurbed') {
+            const orderState = order.status;
+
+            if (orderState === 'NEW') {
+                actionButtons = `<button class="btn btn-primary btn-small" onclick="acceptOrderOnly('${order.order_id}', '${order.source}')" style="margin-right: 5px;">Accetta</button><button class="btn btn-success btn-small" onclick="createDDTOnly('${order.order_id}', '${order.source}')">Crea DDT</button>`;
+                statusBadge = '<span class="badge badge-pending">Da Accettare</span>';
+            } else if (orderState === 'ACCEPTED') {
+                actionButtons = `<button class="btn btn-success btn-small" onclick="createDDTOnly('${order.order_id}', '${order.source}')" style="margin-right: 5px;">Crea DDT</button><button class="btn btn-primary btn-small" onclick="markAsShipped('${order.order_id}', '${order.source}')" style="background: #17a2b8;">Spedito</button>`;
+                statusBadge = '<span class="badge badge-accepted">Accettato</span>';
+            } else {
+                actionButtons = `<button class="btn btn-success btn-small" onclick="createDDTOnly('${order.order_id}', '${order.source}')">Crea DDT</button>`;
+                statusBadge = '<span class="badge badge-pending">Pendente</span>';
+            }
+        } else {
+            actionButtons = `<button class="btn btn-success btn-small" onclick="createDDTOnly('${order.order_id}', '${order.source}')">Crea DDT</button>`;
+            statusBadge = '<span class="badge badge-pending">Pendente</span>';
+        }
+
+        return `<tr>
+            <td><strong>${order.order_id}</strong></td>
+            <td><span class="badge ${badgeClass}">${order.source}</span></td>
+            <td>${order.customer_name}</td>
+            <td>${productInfo}</td>
+            <td><code>${skuInfo}</code></td>
+            <td>${date}</td>
+            <td><strong>€${order.total.toFixed(2)}</strong></td>
+            <td>${statusBadge}</td>
+            <td>${actionButtons}</td>
+        </tr>`;
+    }).join('');
+}
+
+function shipMagentoOrder(orderNumber, entityId) {
+    const trackingNumber = prompt(`Inserisci il numero di tracking per l'ordine Magento ${orderNumber}:`);
+
+    if (!trackingNumber || trackingNumber.trim() === '') {
+        alert('Numero di tracking obbligatorio');
+        return;
+    }
+
+    const carrier = prompt(`Inserisci il corriere (BRT, UPS, DHL, FEDEX, TNT, GLS):`, 'BRT');
+
+    if (!carrier || carrier.trim() === '') {
+        alert('Corriere obbligatorio');
+        return;
+    }
+
+    const validCarriers = ['BRT', 'UPS', 'DHL', 'FEDEX', 'TNT', 'GLS'];
+    const carrierUpper = carrier.trim().toUpperCase();
+
+    if (!validCarriers.includes(carrierUpper)) {
+        alert(`Corriere non valido. Usa uno tra: ${validCarriers.join(', ')}`);
+        return;
+    }
+
+    if (!confirm(`Confermi la spedizione dell'ordine Magento ${orderNumber}?\n\nTracking: ${trackingNumber}\nCorriere: ${carrierUpper}`)) {
+        return;
+    }
+
+    document.getElementById('loading').style.display = 'block';
+
+    fetch('/api/magento/ship_order', {
+        method: 'POST',
+        headers: {'Content-Type': 'application/json'},
+        body: JSON.stringify({
+            order_id: orderNumber,
+            entity_id: entityId,
+            tracking_number: trackingNumber,
+            carrier: carrierUpper
+        })
+    })
+    .then(response => {
+        if (!response.ok) {
+            throw new Error(`HTTP error! status: ${response.status}`);
+        }
+        return response.json();
+    })
+    .then(data => {
+        document.getElementById('loading').style.display = 'none';
+
+        if (data.success) {
+            alert(`✅ Ordine Magento ${orderNumber} spedito con successo!\n\n` +
+                  `Shipment ID: ${data.shipment_id}\n` +
+                  `Tracking: ${data.tracking_number}\n` +
+                  `Corriere: ${data.carrier}\n\n` +
+                  `I prodotti sono stati disabilitati su tutti i marketplace.`);
+            refreshOrders();
+        } else {
+            alert('❌ Errore: ' + (data.error || 'Errore sconosciuto'));
+        }
+    })
+    .catch(err => {
+        document.getElementById('loading').style.display = 'none';
+        alert('❌ Errore di connessione: ' + err.message);
+        console.error('Errore shipment:', err);
+    });
+}
+
+function markAsShipped(orderId, source) {
+    const trackingNumber = prompt(`Inserisci il numero di tracking per l'ordine ${orderId}:`);
+
+    if (!trackingNumber || trackingNumber.trim() === '') {
+        alert('Numero di tracking obbligatorio');
+        return;
+    }
+
+    let carrier = 'BRT';
+    let trackingUrl = '';
+
+    // Chiedi corriere sia per Refurbed che per BackMarket
+    if (source === 'Refurbed' || source === 'BackMarket') {
+        carrier = prompt(
+            `Seleziona il corriere per ${orderId}:\n\n` +
+            `Digita uno tra:\n` +
+            `- UPS\n` +
+            `- DHL\n` +
+            `- BRT (default)\n` +
+            `- GLS\n` +
+            `- TNT\n` +
+            `- FEDEX\n` +
+            `- POSTE\n` +
+            `- SDA`,
+            'BRT'
+        );
+
+        if (!carrier || carrier.trim() === '') {
+            carrier = 'BRT';
+        }
+
+        carrier = carrier.toUpperCase().trim();
+
+        const validCarriers = ['UPS', 'DHL', 'BRT', 'GLS', 'TNT', 'FEDEX', 'POSTE', 'SDA'];
+        if (!validCarriers.includes(carrier)) {
+            alert(`Corriere non valido. Usa uno tra: ${validCarriers.join(', ')}`);
+            return;
+        }
+    } else {
+        trackingUrl = prompt(`Inserisci l'URL di tracking (opzionale):`) || '';
+    }
+
+    // Messaggio conferma con corriere per Refurbed e BackMarket
+    const confirmMsg = (source === 'Refurbed' || source === 'BackMarket')
+        ? `Confermi la spedizione dell'ordine ${orderId}?\n\nTracking: ${trackingNumber}\nCorriere: ${carrier}`
+        : `Confermi la spedizione dell'ordine ${orderId}?\n\nTracking: ${trackingNumber}`;
+
+    if (!confirm(confirmMsg)) {
+        return;
+    }
+
+    document.getElementById('loading').style.display = 'block';
+
+    const requestBody = {
+        order_id: orderId,
+        source: source,
+        tracking_number: trackingNumber
+    };
+
+    // Aggiungi carrier per Refurbed e BackMarket
+    if (source === 'Refurbed' || source === 'BackMarket') {
+        requestBody.carrier = carrier;
+    } else if (trackingUrl) {
+        requestBody.tracking_url = trackingUrl;
+    }
+
+    fetch('/api/mark_shipped', {
+        method: 'POST',
+        headers: {'Content-Type': 'application/json'},
+        body: JSON.stringify(requestBody)
+    })
+    .then(response => {
+        return response.json().then(data => ({
+            ok: response.ok,
+            data: data
+        }));
+    })
+    .then(result => {
+        document.getElementById('loading').style.display = 'none';
+
+        if (result.ok) {
+            let message = `✅ Ordine ${orderId} marcato come spedito!\n\nTracking: ${trackingNumber}`;
+
+            if (result.data.tracking_url) {
+                message += `\n\nURL tracking: ${result.data.tracking_url}`;
+            }
+
+            if (result.data.carrier) {
+                message += `\nCorriere: ${result.data.carrier}`;
+            }
+
+            if (result.data.items_shipped) {
+                message += `\n\nItems spediti: ${result.data.items_shipped}`;
+            }
+
+            message += '\n\nTracking comunicato al marketplace.';
+
+            alert(message);
+            refreshOrders();
+        } else {
+            alert(`❌ Errore: ${result.data.error || 'Errore sconosciuto'}`);
+        }
+    })
+    .catch(err => {
+        document.getElementById('loading').style.display = 'none';
+        alert(`❌ Errore di connessione: ${err.message}`);
+        console.error(err);
+    });
+}
+
+function acceptOrderOnly(orderId, source) {
+    if (!confirm(`Confermi l'accettazione dell'ordine ${orderId} su ${source}?`)) {
+        return;
+    }
+
+    document.getElementById('loading').style.display = 'block';
+
+    fetch('/api/accept_order_only', {
+        method: 'POST',
+        headers: {'Content-Type': 'application/json'},
+        body: JSON.stringify({
+            order_id: orderId,
+            source: source
+        })
+    })
+    .then(response => {
+        return response.json().then(data => ({
+            ok: response.ok,
+            status: response.status,
+            data: data
+        }));
+    })
+    .then(result => {
+        document.getElementById('loading').style.display = 'none';
+
+        if (result.ok) {
+            const message = result.data.message || `Ordine ${orderId} accettato con successo`;
+            alert(`✅ ${message}\n\nLa tabella ordini verrà aggiornata tra 3 secondi...`);
+
+            setTimeout(() => {
+                console.log('🔄 Refresh automatico dopo accettazione...');
+                refreshOrders();
+            }, 3000);
+        } else {
+            const errorMsg = result.data.error || 'Errore sconosciuto';
+            const details = result.data.details || '';
+
+            let fullMessage = `❌ Errore durante l'accettazione:\n\n${errorMsg}`;
+            if (details) {
+                fullMessage += `\n\n${details}`;
+            }
+
+            alert(fullMessage);
+            console.error('Errore accettazione:', result.data);
+        }
+    })
+    .catch(err => {
+        document.getElementById('loading').style.display = 'none';
+        alert(`❌ Errore di connessione:\n\n${err.message}`);
+        console.error('Errore fetch:', err);
+    });
+}
+
+function createDDTOnly(orderId, source) {
+    if (!confirm(`Confermi la creazione del DDT per l'ordine ${orderId}?\n\nQuesto:\n- Disabiliterà i prodotti su tutti i canali\n- Creerà il DDT su InvoiceX`)) return;
+    document.getElementById('loading').style.display = 'block';
+    fetch('/api/create_ddt_only', { method: 'POST', headers: {'Content-Type': 'application/json'}, body: JSON.stringify({order_id: orderId, source: source}) })
+    .then(r => r.json()).then(data => { if (data.success) { alert(`DDT creato con successo!\n\nNumero DDT: ${data.ddt_number}\n\nL'ordine è ora pronto per la spedizione.`); refreshOrders(); } else { alert('Errore: ' + data.error); document.getElementById('loading').style.display = 'none'; } })
+    .catch(err => { alert('Errore di connessione'); console.error(err); document.getElementById('loading').style.display = 'none'; });
+}
+
+function downloadCSV() { window.location.href = '/api/packlink_csv'; }
+
+function refreshTickets() {
+    // Un solo snapshot condiviso: se non è cambiato il server risponde 304
+    fetch('/api/tickets/snapshot')
+        .then(r => r.json())
+        .then(data => {
+            if (data.error) {
+                document.getElementById('anastasia-error').style.display = 'block';
+                return;
+            }
+            renderTickets(data);
+        })
+        .catch(err => {
+            console.error('Errore snapshot Anastasia:', err);
+            document.getElementById('anastasia-error').style.display = 'block';
+        });
+}
+
+function renderTickets(data) {
+    document.getElementById('anastasia-error').style.display = 'none';
+    document.getElementById('tickets-open').textContent = data.stats.open || 0;
+    document.getElementById('tickets-closed-today').textContent = data.stats.today_closed || 0;
+    document.getElementById('tickets-open-header').textContent = data.stats.open || 0;
+
+    const list = document.getElementById('ticket-list');
+    const tickets = data.open_tickets.slice(0, 5);
+
+    if (tickets.length === 0) {
+        list.innerHTML = '<div class="empty-state"><div class="empty-state-icon">✅</div><div>Nessun ticket aperto</div></div>';
+        return;
+    }
+
+    list.innerHTML = tickets.map(ticket => `
+        <div class="ticket-item" onclick="window.open('https://anastasia.reflexmania.com', '_blank')">
+            <span class="ticket-title">${ticket.title}</span>
+            <div class="ticket-meta">
+                <span class="customer-name">👤 ${ticket.customer_name}</span>
+                <span class="ticket-time">${ticket.last_update}</span>
+            </div>
+        </div>
+    `).join('');
+}
+
+function orderKey(order) {
+    return `${String(order.source).toLowerCase()}:${order.order_id}`;
+}
+
+function applyOrderDiff(diff) {
+    // Differenze dal server: rimuovi, poi aggiorna/aggiungi mantenendo l'ordine
+    ordersVersion = diff.version;
+    const removed = new Set(diff.removed.map(orderKey));
+    const updates = new Map(diff.added.concat(diff.changed).map(o => [orderKey(o), o]));
+
+    orders = orders
+        .filter(o => !removed.has(orderKey(o)))
+        .map(o => {
+            const key = orderKey(o);
+            if (!updates.has(key)) return o;
+            const updated = updates.get(key);
+            updates.delete(key);
+            return updated;
+        })
+        .concat(Array.from(updates.values()));
+
+    updateStats();
+    renderOrders();
+    refreshPendingOrders();
+}
+
+let pollingTimers = null;
+
+function startPolling() {
+    if (pollingTimers) return;
+    pollingTimers = [setInterval(refreshOrders, 120000), setInterval(refreshTickets, 30000)];
+}
+
+function connectStream() {
+    if (!window.EventSource) {
+        startPolling();
+        return;
+    }
+
+    const stream = new EventSource('/api/stream');
+    stream.addEventListener('orders', e => {
+        const diff = JSON.parse(e.data);
+        // Differenza calcolata su una versione che non abbiamo: chiedi il delta mancante
+        if (diff.previous_version !== ordersVersion) refreshOrders();
+        else applyOrderDiff(diff);
+    });
+    stream.addEventListener('tickets', e => renderTickets(JSON.parse(e.data)));
+    // Eventi persi (riconnessione tardiva): ricarica tutto
+    stream.addEventListener('resync', () => { refreshOrders(); refreshTickets(); });
+    stream.onerror = () => {
+        // Chiuso definitivamente (es. 503 troppe connessioni): torna al polling
+        if (stream.readyState === EventSource.CLOSED) startPolling();
+    };
+}
+
+refreshOrders();
+refreshTickets();
+connectStream();
+
+let pendingOrders = [];
+
+function refreshPendingOrders() {
+    fetch('/api/orders/pending_magento')
+        .then(r => r.json())
+        .then(data => {
+            if (data.success) {
+                pendingOrders = data.orders;
+                renderPendingOrders();
+                document.getElementById('pending-section').style.display =
+                    pendingOrders.length > 0 ? 'block' : 'none';
+            }
+        })
+        .catch(err => console.error('Errore pending:', err));
+}
+
+function renderPendingOrders() {
+    const tbody = document.getElementById('pending-body');
+
+    if (pendingOrders.length === 0) {
+        tbody.innerHTML = '<tr><td colspan="7" class="empty-state">✅ Nessun ordine in attesa</td></tr>';
+        return;
+    }
+
+    tbody.innerHTML = pendingOrders.map(order => {
+        let productInfo = order.items?.[0]?.name || 'N/A';
+        if (order.items?.length > 1) productInfo += ` (+${order.items.length - 1})`;
+
+        const pm = order.payment_method || '';
+        let paymentBadge = pm.includes('banktransfer')
+            ? '<span class="badge badge-bonifico">🏦 Bonifico</span>'
+            : `<span class="badge badge-pending">${order.payment_label || pm}</span>`;
+
+        const waiting = order.waiting_time || {};
+        const waitingClass = waiting.days >= 3 ? 'warning' : '';
+
+        return `<tr>
+            <td><strong>${order.order_id}</strong></td>
+            <td>${order.customer_name}</td>
+            <td>${productInfo}</td>
+            <td><strong>€${order.total.toFixed(2)}</strong></td>
+            <td>${paymentBadge}</td>
+            <td><span class="waiting-time ${waitingClass}">${waiting.label || 'N/A'}</span></td>
+            <td><button class="btn btn-confirm btn-small" onclick="confirmPendingOrder(${order.entity_id}, '${order.order_id}')">✅ Conferma</button></td>
+        </tr>`;
+    }).join('');
+}
+
+function confirmPendingOrder(entityId, orderId) {
+    if (!confirm(`Confermi il pagamento per ordine ${orderId}?\n\nQuesto creerà il DDT e disabiliterà i prodotti.`)) return;
+
+    document.getElementById('loading').style.display = 'block';
+
+    fetch(`/api/pending_magento/confirm/${entityId}`, { method: 'POST' })
+        .then(r => r.json())
+        .then(data => {
+            document.getElementById('loading').style.display = 'none';
+            if (data.success) {
+                alert(`✅ Ordine ${orderId} confermato!\nDDT: ${data.ddt_number}`);
+                refreshPendingOrders();
+                refreshOrders();
+            } else {
+                alert('❌ Errore: ' + data.error);
+            }
+        })
+        .catch(err => {
+            document.getElementById('loading').style.display = 'none';
+            alert('❌ Errore: ' + err.message);
+        });
+}
+
+// Carica pending all'avvio
+refreshPendingOrders();
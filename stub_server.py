@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Server stub locale delle API esterne (InvoiceX, Telegram) per test senza toccare i dati reali
+
+Avvio:
+    python stub_server.py                 # porta 5055
+    INVOICEX_API_URL=http://localhost:5055/ \
+    TELEGRAM_API_URL=http://localhost:5055/telegram python app.py
+
+Nei test: avvia_in_background() lo fa partire in un thread su una porta libera
+e azzera() ripulisce lo stato simulato tra un test e l'altro.
+
+Variabili:
+    STUB_PORT               porta di ascolto (default 5055)
+    STUB_LATENCY_MS         latenza simulata per richiesta (default 80)
+    STUB_NO_BULK=1          endpoint bulk assente (404), per provare il fallback
+    STUB_MISSING            prefisso matricole "non in magazzino" (default MISSING)
+    STUB_TELEGRAM_INTERVAL  secondi minimi tra due messaggi, altrimenti 429 (default 0)
+"""
+import itertools
+import os
+import threading
+import time
+
+from flask import Flask, jsonify, request
+
+app = Flask(__name__)
+
+LATENCY = int(os.getenv('STUB_LATENCY_MS', 80)) / 1000
+NO_BULK = os.getenv('STUB_NO_BULK', '') == '1'
+MISSING_PREFIX = os.getenv('STUB_MISSING', 'MISSING')
+TELEGRAM_INTERVAL = float(os.getenv('STUB_TELEGRAM_INTERVAL', 0))
+
+_lock = threading.Lock()
+_ids = itertools.count(1000)
+clienti = {}        # email -> codice
+ddt = {}            # id -> {'riferimento', 'metodo_pagamento', 'righe': {riga: matricola}}
+contatori = {'richieste': 0}
+telegram = {'messaggi': [], 'ultimo_invio': 0.0, 'rifiutati_429': 0}
+
+
+@app.before_request
+def _simula_rete():
+    with _lock:
+        contatori['richieste'] += 1
+    time.sleep(LATENCY)
+
+
+def _movimenta(id_ddt: str, matricola: str, riga: str, prezzo: str) -> str:
+    """'1' se movimentata, '0' se matricola non in magazzino (come l'API reale)"""
+    if matricola.startswith(MISSING_PREFIX) or id_ddt not in ddt:
+        return "0"
+    with _lock:
+        ddt[id_ddt]['righe'][riga] = {'matricola': matricola, 'prezzo': prezzo}
+    return "1"
+
+
+@app.route('/recuperacodicedaemail/<email>')
+def recupera_codice(email):
+    return clienti.get(email, "0")
+
+
+@app.route('/cercapermail/<email>')
+def cerca_per_mail(email):
+    codice = clienti.get(email)
+    return jsonify([{'codice': codice, 'email': email}] if codice else [])
+
+
+@app.route('/inserisci-cliente-da-magento', methods=['POST'])
+def inserisci_cliente():
+    data = request.get_json(force=True)
+    with _lock:
+        codice = clienti.setdefault(data['email'], f"C{next(_ids)}")
+    return jsonify(codice)
+
+
+@app.route('/crea-ddt-vendita-codice/<codice>', methods=['GET'])
+def crea_ddt(codice):
+    data = request.get_json(force=True, silent=True) or {}
+    with _lock:
+        id_ddt = str(next(_ids))
+        ddt[id_ddt] = {
+            'codice_cliente': codice,
+            'riferimento': data.get('riferimento', ''),
+            'metodo_pagamento': data.get('metodo_pagamento', ''),
+            'righe': {}
+        }
+    return id_ddt
+
+
+@app.route('/movimenta-ddt-vendita', methods=['GET'])
+def movimenta():
+    data = request.get_json(force=True)
+    return _movimenta(data['idPadreDDT'], data['matricola'], data['riga'], data['prezzo'])
+
+
+@app.route('/movimenta-ddt-vendita-multipla', methods=['GET'])
+def movimenta_multipla():
+    if NO_BULK:
+        return "Not Found", 404
+    data = request.get_json(force=True)
+    return jsonify([
+        {'riga': r['riga'], 'esito': _movimenta(data['idPadreDDT'], r['matricola'], r['riga'], r['prezzo'])}
+        for r in data.get('righe', [])
+    ])
+
+
+@app.route('/ddt-vendita')
+def cerca_ddt():
+    # ?riferimento= cerca un DDT, senza filtro elenca tutti
+    riferimento = request.args.get('riferimento')
+    return jsonify([
+        {'id': id_ddt, **dati} for id_ddt, dati in ddt.items()
+        if riferimento is None or dati['riferimento'] == riferimento
+    ])
+
+
+@app.route('/telegram/bot<token>/sendMessage', methods=['POST'])
+def telegram_send_message(token):
+    data = request.get_json(force=True)
+    with _lock:
+        attesa = telegram['ultimo_invio'] + TELEGRAM_INTERVAL - time.time()
+        if attesa > 0:
+            telegram['rifiutati_429'] += 1
+            return jsonify({
+                'ok': False,
+                'error_code': 429,
+                'description': 'Too Many Requests: retry later',
+                'parameters': {'retry_after': max(1, int(attesa + 0.999))}
+            }), 429
+        telegram['ultimo_invio'] = time.time()
+        telegram['messaggi'].append(data)
+    return jsonify({'ok': True, 'result': {'message_id': len(telegram['messaggi'])}})
+
+
+@app.route('/_stub/telegram')
+def stato_telegram():
+    """Messaggi Telegram ricevuti"""
+    return jsonify(telegram)
+
+
+@app.route('/_stub/stato')
+def stato():
+    """Ispezione dello stato simulato (clienti, DDT, richieste ricevute)"""
+    return jsonify({'clienti': clienti, 'ddt': ddt, **contatori})
+
+
+def azzera():
+    """Svuota lo stato simulato (clienti, DDT, messaggi Telegram, contatori)"""
+    with _lock:
+        clienti.clear()
+        ddt.clear()
+        contatori['richieste'] = 0
+        telegram.update({'messaggi': [], 'ultimo_invio': 0.0, 'rifiutati_429': 0})
+
+
+def avvia_in_background(port: int = 0):
+    """
+    Avvia lo stub in un thread daemon (porta 0 = porta libera)
+
+    Returns:
+        (server, url base): server.shutdown() per fermarlo
+    """
+    from werkzeug.serving import make_server
+
+    server = make_server('127.0.0.1', port, app, threaded=True)
+    threading.Thread(target=server.serve_forever, name='stub-server', daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+if __name__ == '__main__':
+    app.run(host='127.0.0.1', port=int(os.getenv('STUB_PORT', 5055)), threaded=True)
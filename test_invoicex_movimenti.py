@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Test movimentazione righe DDT InvoiceX contro lo stub locale (bulk e fallback riga per riga)
+
+Uso:
+    python -m pytest test_invoicex_movimenti.py
+"""
+import pytest
+
+import stub_server
+from clients.invoicex_api import InvoiceXAPIClient
+
+BULK_PATH = 'movimenta-ddt-vendita-multipla'
+
+RIGHE = [
+    {'matricola': 'SN-001', 'prezzo': 349.0, 'riga': 1},
+    {'matricola': 'MISSING-002', 'prezzo': 120.5, 'riga': 2},
+    {'matricola': 'SN-003', 'prezzo': 89.9, 'riga': 3},
+]
+
+
+@pytest.fixture(scope='module')
+def stub_url():
+    server, url = stub_server.avvia_in_background()
+    yield url
+    server.shutdown()
+
+
+@pytest.fixture(autouse=True)
+def stub_pulito(monkeypatch):
+    stub_server.azzera()
+    monkeypatch.setattr(stub_server, 'LATENCY', 0)
+    monkeypatch.setattr(stub_server, 'NO_BULK', False)
+
+
+def _client(stub_url: str) -> InvoiceXAPIClient:
+    # Cache clienti mai usata da DDT e movimentazione: niente database locale nei test
+    client = InvoiceXAPIClient(base_url=stub_url, api_key='test', customer_cache=object())
+    client.bulk_movement_path = BULK_PATH
+    return client
+
+
+def _nuovo_ddt(client: InvoiceXAPIClient) -> str:
+    id_ddt = client.crea_ddt_vendita('C1', {'riferimento': 'TEST-1', 'metodo_pagamento': 'BACKMARKET'})
+    assert id_ddt
+    return id_ddt
+
+
+def _esiti(risultati):
+    return [(r['riga'], r['success']) for r in risultati]
+
+
+def test_bulk_movimenta_tutte_le_righe_in_una_richiesta(stub_url):
+    client = _client(stub_url)
+    id_ddt = _nuovo_ddt(client)
+    richieste_prima = stub_server.contatori['richieste']
+
+    risultati = client.movimenta_prodotti_ddt(id_ddt, RIGHE)
+
+    assert stub_server.contatori['richieste'] - richieste_prima == 1
+    assert _esiti(risultati) == [(1, True), (2, False), (3, True)]
+    assert risultati[1]['error'] == 'Prodotto non trovato in magazzino'
+    assert sorted(stub_server.ddt[id_ddt]['righe']) == ['1', '3']
+    assert client.bulk_movement_path == BULK_PATH
+
+
+def test_bulk_assente_ripiega_su_riga_per_riga(stub_url, monkeypatch):
+    monkeypatch.setattr(stub_server, 'NO_BULK', True)
+    client = _client(stub_url)
+    id_ddt = _nuovo_ddt(client)
+    richieste_prima = stub_server.contatori['richieste']
+
+    risultati = client.movimenta_prodotti_ddt(id_ddt, RIGHE)
+
+    # Una richiesta bulk (404) + una per riga
+    assert stub_server.contatori['richieste'] - richieste_prima == 1 + len(RIGHE)
+    assert _esiti(risultati) == [(1, True), (2, False), (3, True)]
+    assert sorted(stub_server.ddt[id_ddt]['righe']) == ['1', '3']
+    assert client.bulk_movement_path == ''
+
+    # Endpoint disattivato fino al riavvio: il DDT successivo va subito riga per riga
+    richieste_prima = stub_server.contatori['richieste']
+    client.movimenta_prodotti_ddt(_nuovo_ddt(client), RIGHE[:1])
+    assert stub_server.contatori['richieste'] - richieste_prima == 2  # creazione DDT + una riga
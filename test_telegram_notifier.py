@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Test notifiche Telegram contro lo stub locale (digest, 429 retry_after, retry sicuri)
+
+Uso:
+    python -m pytest test_telegram_notifier.py
+"""
+import socket
+
+import pytest
+
+import stub_server
+from clients.telegram import TelegramClient
+from services.telegram_notifier import TelegramNotifier
+
+
+@pytest.fixture(scope='module')
+def stub_url():
+    server, url = stub_server.avvia_in_background()
+    yield url
+    server.shutdown()
+
+
+@pytest.fixture(autouse=True)
+def stub_pulito(monkeypatch):
+    stub_server.azzera()
+    monkeypatch.setattr(stub_server, 'LATENCY', 0)
+    monkeypatch.setattr(stub_server, 'TELEGRAM_INTERVAL', 0)
+
+
+def _notifier(api_url: str, **options) -> TelegramNotifier:
+    options.setdefault('digest_window', 0)
+    options.setdefault('min_interval', 0)
+    options.setdefault('max_retries', 2)
+    return TelegramNotifier(TelegramClient('token-test', '42', api_url=api_url), **options)
+
+
+def _porta_chiusa() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def test_eventi_ravvicinati_in_un_solo_messaggio(stub_url):
+    notifier = _notifier(f"{stub_url}/telegram", digest_window=0.5)
+
+    for i in range(3):
+        assert notifier.notify(f"Ordine {i} processato")
+    assert notifier.flush(timeout=10)
+
+    messaggi = stub_server.telegram['messaggi']
+    assert len(messaggi) == 1
+    assert all(f"Ordine {i} processato" in messaggi[0]['text'] for i in range(3))
+    assert messaggi[0]['chat_id'] == '42'
+
+    stats = notifier.get_stats()
+    assert stats['messages_sent'] == 1
+    assert stats['events_sent'] == 3
+
+
+def test_429_attende_retry_after_e_reinvia(stub_url, monkeypatch):
+    monkeypatch.setattr(stub_server, 'TELEGRAM_INTERVAL', 1)
+    notifier = _notifier(f"{stub_url}/telegram")
+
+    notifier.notify("primo")
+    assert notifier.flush(timeout=10)
+    notifier.notify("secondo")
+    assert notifier.flush(timeout=10)
+
+    assert [m['text'] for m in stub_server.telegram['messaggi']] == ["primo", "secondo"]
+    assert stub_server.telegram['rifiutati_429'] >= 1
+    assert notifier.get_stats()['failed'] == 0
+
+
+def test_connessione_rifiutata_viene_ritentata():
+    notifier = _notifier(f"http://127.0.0.1:{_porta_chiusa()}/telegram", max_retries=1)
+
+    notifier.notify("mai arrivato")
+    assert notifier.flush(timeout=10)
+
+    stats = notifier.get_stats()
+    assert stats['retries'] == 1
+    assert stats['failed'] == 1
+
+
+def test_read_timeout_non_viene_ritentato(stub_url, monkeypatch):
+    # Telegram potrebbe aver già consegnato il messaggio: un nuovo invio lo duplicherebbe
+    monkeypatch.setattr(stub_server, 'LATENCY', 1)
+    notifier = _notifier(f"{stub_url}/telegram")
+    monkeypatch.setattr(notifier.client.http, 'timeout', 0.2)
+
+    notifier.notify("esito incerto")
+    assert notifier.flush(timeout=10)
+
+    assert stub_server.contatori['richieste'] == 1
+    stats = notifier.get_stats()
+    assert stats['retries'] == 0
+    assert stats['failed'] == 1
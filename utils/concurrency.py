@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Esecuzione parallela (fan-out) di chiamate verso i marketplace
+"""
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TIMEOUT = 30
+
+
+def run_parallel(
+    tasks: Dict[str, Callable],
+    timeouts: Optional[Dict[str, float]] = None,
+    default_timeout: float = DEFAULT_TIMEOUT,
+    max_workers: Optional[int] = None
+) -> Dict[str, Dict]:
+    """
+    Esegue tutte le funzioni contemporaneamente, con un timeout per ogni task.
+    Un task lento o in errore non blocca gli altri: viene marcato come degradato.
+
+    Args:
+        tasks: Dict nome -> funzione senza argomenti da eseguire
+        timeouts: Timeout (secondi) per nome task, opzionale
+        default_timeout: Timeout usato se il task non ha un valore dedicato
+        max_workers: Numero massimo di thread (default: uno per task)
+
+    Returns:
+        Dict nome -> {'result', 'degraded', 'error', 'elapsed_ms'}
+    """
+    results = {}
+    if not tasks:
+        return results
+
+    timeouts = timeouts or {}
+    durations = {}
+
+    def _timed(name: str, func: Callable):
+        task_start = time.monotonic()
+        try:
+            return func()
+        finally:
+            durations[name] = int((time.monotonic() - task_start) * 1000)
+
+    executor = ThreadPoolExecutor(
+        max_workers=max_workers or len(tasks),
+        thread_name_prefix='fanout'
+    )
+    start = time.monotonic()
+
+    try:
+        futures = {name: executor.submit(_timed, name, func) for name, func in tasks.items()}
+
+        for name, future in futures.items():
+            timeout = timeouts.get(name, default_timeout)
+            remaining = max(0, start + timeout - time.monotonic())
+
+            try:
+                result = future.result(timeout=remaining)
+                results[name] = {
+                    'result': result,
+                    'degraded': False,
+                    'error': None,
+                    'elapsed_ms': durations.get(name, 0)
+                }
+            except FutureTimeout:
+                logger.warning(f"⏱️ [FANOUT] Task '{name}' oltre il timeout di {timeout}s, risultato parziale")
+                results[name] = {
+                    'result': None,
+                    'degraded': True,
+                    'error': f'Timeout dopo {timeout}s',
+                    'elapsed_ms': int((time.monotonic() - start) * 1000)
+                }
+            except Exception as e:
+                logger.error(f"❌ [FANOUT] Task '{name}' fallito: {e}")
+                results[name] = {
+                    'result': None,
+                    'degraded': True,
+                    'error': str(e),
+                    'elapsed_ms': durations.get(name, 0)
+                }
+    finally:
+        # Non aspettiamo i task andati in timeout: finiranno in background
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    return results
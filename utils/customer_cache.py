@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Cache email -> codice cliente InvoiceX (LRU in memoria + SQLite locale)
+"""
+import threading
+import time
+import logging
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from config import (
+    INVOICEX_CUSTOMER_CACHE_SIZE,
+    INVOICEX_CUSTOMER_CACHE_TTL,
+    INVOICEX_CUSTOMER_NEGATIVE_TTL
+)
+from utils.local_db import get_local_db
+
+logger = logging.getLogger(__name__)
+
+
+class CustomerCodeCache:
+    """
+    Ricorda il codice cliente InvoiceX per email
+
+    Le voci negative (cliente non trovato) hanno un TTL breve, quelle
+    positive un TTL lungo: un codice cliente non cambia nel tempo.
+    Le email vengono normalizzate (minuscole, senza spazi).
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS invoicex_customers (
+            email TEXT PRIMARY KEY,
+            codice TEXT,
+            cached_at REAL NOT NULL
+        );
+    """
+
+    def __init__(self, db_path: str = None, max_size: int = INVOICEX_CUSTOMER_CACHE_SIZE):
+        self.db = get_local_db(db_path)
+        self.db.executescript(self.SCHEMA)
+        self.max_size = max_size
+
+        self._lru: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'negative_hits': 0, 'misses': 0}
+
+    def get(self, email: str) -> Tuple[bool, Optional[str]]:
+        """
+        Returns:
+            (trovato in cache, codice cliente o None se voce negativa)
+        """
+        key = self._key(email)
+
+        with self._lock:
+            entry = self._lru.get(key)
+            if entry is not None:
+                self._lru.move_to_end(key)
+
+        if entry is None:
+            row = self.db.query_one(
+                "SELECT codice, cached_at FROM invoicex_customers WHERE email = ?", (key,)
+            )
+            if row is not None:
+                entry = (row['codice'], row['cached_at'])
+                self._remember(key, entry)
+
+        if entry is None or self._expired(entry):
+            with self._lock:
+                self._stats['misses'] += 1
+            return False, None
+
+        codice = entry[0]
+        with self._lock:
+            self._stats['hits' if codice else 'negative_hits'] += 1
+        return True, codice
+
+    def put(self, email: str, codice: str):
+        """Salva il codice cliente (da ricerca o da creazione)"""
+        self._store(self._key(email), codice)
+
+    def put_negative(self, email: str):
+        """Ricorda che il cliente non esiste su InvoiceX"""
+        self._store(self._key(email), None)
+
+    def invalidate(self, email: str):
+        key = self._key(email)
+        with self._lock:
+            self._lru.pop(key, None)
+        self.db.execute("DELETE FROM invoicex_customers WHERE email = ?", (key,))
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['memory_entries'] = len(self._lru)
+        return stats
+
+    def _store(self, key: str, codice: Optional[str]):
+        entry = (codice, time.time())
+        self._remember(key, entry)
+        self.db.execute(
+            """
+            INSERT INTO invoicex_customers (email, codice, cached_at) VALUES (?, ?, ?)
+            ON CONFLICT (email) DO UPDATE SET codice = excluded.codice, cached_at = excluded.cached_at
+            """,
+            (key, codice, entry[1])
+        )
+
+    def _remember(self, key: str, entry: tuple):
+        with self._lock:
+            self._lru[key] = entry
+            self._lru.move_to_end(key)
+            while len(self._lru) > self.max_size:
+                self._lru.popitem(last=False)
+
+    @staticmethod
+    def _expired(entry: tuple) -> bool:
+        codice, cached_at = entry
+        ttl = INVOICEX_CUSTOMER_CACHE_TTL if codice else INVOICEX_CUSTOMER_NEGATIVE_TTL
+        return time.time() - cached_at > ttl
+
+    @staticmethod
+    def _key(email: str) -> str:
+        return (email or '').strip().lower()
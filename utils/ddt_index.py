@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Indice locale dei DDT per riferimento (MARKETPLACE-orderid) per la creazione idempotente
+"""
+import threading
+import time
+import logging
+from typing import Dict, Iterable, Optional
+
+from utils.local_db import get_local_db
+
+logger = logging.getLogger(__name__)
+
+STATUS_PENDING = 'pending'
+STATUS_CREATED = 'created'
+
+
+class DDTReferenceIndex:
+    """
+    Registro riferimento -> DDT scritto prima e dopo crea_ddt_vendita
+
+    - begin(): intento registrato prima della chiamata a InvoiceX
+    - commit(): DDT creato, con il suo ID
+    - un intento rimasto 'pending' (crash o timeout a metà) va verificato
+      su InvoiceX prima di creare di nuovo il DDT
+
+    Un riferimento assente dall'indice viene verificato su InvoiceX. Solo se
+    il warm-up ha dimostrato che l'elenco di InvoiceX è completo (contiene i
+    DDT recenti già noti all'indice) il riferimento assente è considerato
+    senza DDT e il controllo duplicati diventa una lettura locale.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS ddt_references (
+            riferimento TEXT PRIMARY KEY,
+            status TEXT NOT NULL,
+            ddt_id TEXT,
+            updated_at REAL NOT NULL
+        );
+    """
+
+    def __init__(self, db_path: str = None):
+        self.db = get_local_db(db_path)
+        self.db.executescript(self.SCHEMA)
+        self._warmed = threading.Event()
+        self._stats = {'hits': 0, 'misses': 0, 'intents': 0, 'commits': 0, 'warmed_entries': 0}
+        self._stats_lock = threading.Lock()
+
+    @property
+    def warmed(self) -> bool:
+        """True se l'indice è allineato con un elenco InvoiceX verificato come completo"""
+        return self._warmed.is_set()
+
+    def lookup(self, riferimento: str) -> Optional[Dict]:
+        """
+        Returns:
+            Dict con 'status' e 'ddt_id', o None se il riferimento non è indicizzato
+        """
+        row = self.db.query_one(
+            "SELECT status, ddt_id FROM ddt_references WHERE riferimento = ?", (riferimento,)
+        )
+        self._count('hits' if row else 'misses')
+        return {'status': row['status'], 'ddt_id': row['ddt_id']} if row else None
+
+    def begin(self, riferimento: str) -> bool:
+        """
+        Registra l'intento di creare il DDT
+
+        Returns:
+            False se il riferimento è già presente (DDT creato o intento aperto)
+        """
+        created = self.db.execute(
+            "INSERT OR IGNORE INTO ddt_references (riferimento, status, updated_at) VALUES (?, ?, ?)",
+            (riferimento, STATUS_PENDING, time.time())
+        )
+        if created:
+            self._count('intents')
+        return bool(created)
+
+    def commit(self, riferimento: str, ddt_id: Optional[str]):
+        """Segna il DDT come creato (ddt_id None se noto solo che esiste)"""
+        self.db.execute(
+            """
+            INSERT INTO ddt_references (riferimento, status, ddt_id, updated_at) VALUES (?, ?, ?, ?)
+            ON CONFLICT (riferimento) DO UPDATE SET
+                status = excluded.status,
+                ddt_id = COALESCE(excluded.ddt_id, ddt_references.ddt_id),
+                updated_at = excluded.updated_at
+            """,
+            (riferimento, STATUS_CREATED, ddt_id, time.time())
+        )
+        self._count('commits')
+
+    def warm(self, ddt_list: Iterable[Dict], since: float) -> int:
+        """
+        Allinea l'indice con i DDT già presenti su InvoiceX
+
+        L'elenco viene considerato affidabile (warmed) solo se contiene tutti
+        i riferimenti creati localmente da `since` in poi: un elenco vuoto,
+        filtrato male o parziale lascia attiva la verifica remota.
+
+        Args:
+            ddt_list: Dict con 'riferimento' e 'id' (formato /ddt-vendita)
+            since: Timestamp Unix di inizio della finestra dell'elenco
+
+        Returns:
+            Numero di riferimenti indicizzati
+        """
+        known = {
+            row['riferimento'] for row in self.db.query(
+                "SELECT riferimento FROM ddt_references WHERE status = ? AND updated_at >= ?",
+                (STATUS_CREATED, since)
+            )
+        }
+
+        now = time.time()
+        rows = [
+            (str(d['riferimento']), STATUS_CREATED, str(d['id']) if d.get('id') else None, now)
+            for d in ddt_list
+            if d.get('riferimento')
+        ]
+        if rows:
+            self.db.executemany(
+                """
+                INSERT INTO ddt_references (riferimento, status, ddt_id, updated_at) VALUES (?, ?, ?, ?)
+                ON CONFLICT (riferimento) DO UPDATE SET
+                    status = excluded.status,
+                    ddt_id = COALESCE(excluded.ddt_id, ddt_references.ddt_id),
+                    updated_at = excluded.updated_at
+                """,
+                rows
+            )
+        with self._stats_lock:
+            self._stats['warmed_entries'] = len(rows)
+
+        missing = known - {row[0] for row in rows}
+        if not known or missing:
+            logger.warning(
+                f"⚠️ Elenco DDT InvoiceX non verificabile ({len(rows)} riferimenti, "
+                f"{len(missing)}/{len(known)} DDT recenti noti assenti): "
+                f"i riferimenti sconosciuti restano verificati su InvoiceX"
+            )
+            return len(rows)
+
+        self._warmed.set()
+        logger.info(f"🗂️ Indice DDT allineato con InvoiceX: {len(rows)} riferimenti")
+        return len(rows)
+
+    def get_stats(self) -> Dict:
+        row = self.db.query_one(
+            "SELECT COUNT(*) AS total, "
+            "SUM(CASE WHEN status = ? THEN 1 ELSE 0 END) AS pending FROM ddt_references",
+            (STATUS_PENDING,)
+        )
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats['entries'] = row['total']
+        stats['pending_intents'] = row['pending'] or 0
+        stats['warmed'] = self.warmed
+        return stats
+
+    def _count(self, key: str):
+        with self._stats_lock:
+            self._stats[key] += 1
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Database SQLite locale (WAL) condiviso da tracker, cache e indici locali
+"""
+import os
+import sqlite3
+import threading
+import logging
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional
+
+from config import LOCAL_DB_PATH
+
+logger = logging.getLogger(__name__)
+
+_databases: Dict[str, 'LocalDB'] = {}
+_databases_lock = threading.Lock()
+
+
+class LocalDB:
+    """
+    Connessione SQLite thread-safe in modalità WAL
+
+    Una sola connessione per file, serializzata da un lock: le scritture sono
+    piccole e frequenti, le letture avvengono sugli indici.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=10)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        logger.info(f"🗄️ Database locale aperto: {path}")
+
+    def execute(self, sql: str, params: Iterable = ()) -> int:
+        """Esegue uno statement e ritorna il numero di righe modificate"""
+        with self.lock:
+            return self.conn.execute(sql, tuple(params)).rowcount
+
+    def executemany(self, sql: str, rows: Iterable[Iterable]) -> int:
+        """Esegue lo stesso statement su più righe in un'unica transazione"""
+        with self.transaction() as conn:
+            return conn.executemany(sql, [tuple(r) for r in rows]).rowcount
+
+    def executescript(self, script: str):
+        """Esegue più statement (creazione schema)"""
+        with self.lock:
+            self.conn.executescript(script)
+
+    def query(self, sql: str, params: Iterable = ()) -> List[sqlite3.Row]:
+        """Esegue una SELECT e ritorna tutte le righe"""
+        with self.lock:
+            return self.conn.execute(sql, tuple(params)).fetchall()
+
+    def query_one(self, sql: str, params: Iterable = ()) -> Optional[sqlite3.Row]:
+        """Esegue una SELECT e ritorna la prima riga (o None)"""
+        with self.lock:
+            return self.conn.execute(sql, tuple(params)).fetchone()
+
+    @contextmanager
+    def transaction(self):
+        """Transazione esplicita: commit a fine blocco, rollback in caso di errore"""
+        with self.lock:
+            self.conn.execute("BEGIN")
+            try:
+                yield self.conn
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.conn.execute("COMMIT")
+
+
+def get_local_db(path: str = None) -> LocalDB:
+    """Ritorna il database locale condiviso per il path indicato (default LOCAL_DB_PATH)"""
+    path = path or LOCAL_DB_PATH
+    with _databases_lock:
+        db = _databases.get(path)
+        if db is None:
+            db = LocalDB(path)
+            _databases[path] = db
+        return db
@@ -1,117 +1,384 @@
 #!/usr/bin/env python3
 """
-Tracker ordini processati usando file JSON locale
+Tracker ordini processati
+Backend SQLite (default) o file JSON locale
 """
 import json
 import os
+from abc import ABC, abstractmethod
+import threading
+import time
 from datetime import datetime, timedelta
-from typing import Dict, Set
+from typing import Dict, Iterable, List, Optional, Set, Tuple
 import logging
 
+from config import ORDER_TRACKER_BACKEND
+from utils.local_db import get_local_db
+
 logger = logging.getLogger(__name__)
 
 TRACKER_FILE = "/tmp/ordini_processati.json"
 
+# Giorni di conservazione degli ordini processati
+RETENTION_DAYS = 7
 
-class OrderTracker:
-    """Traccia ordini già processati per evitare duplicati"""
-    
-    def __init__(self):
+# Intervallo minimo (secondi) tra due pulizie incrementali
+CLEANUP_INTERVAL = 3600
+
+# Righe eliminate per ogni DELETE della pulizia incrementale
+CLEANUP_BATCH_SIZE = 500
+
+# ID per singola query IN (...) nelle ricerche bulk
+LOOKUP_CHUNK_SIZE = 500
+
+
+class TrackerBackend(ABC):
+    """Interfaccia comune dei backend di storage del tracker"""
+
+    location = ''
+
+    @abstractmethod
+    def contains(self, marketplace: str, order_id: str) -> bool:
+        """True se l'ordine è già stato processato"""
+
+    @abstractmethod
+    def processed_among(self, marketplace: str, order_ids: List[str]) -> Set[str]:
+        """Ritorna il sottoinsieme di order_ids già processati"""
+
+    @abstractmethod
+    def upsert_many(self, entries: List[Tuple[str, str, str, Optional[str]]]):
+        """Inserisce/aggiorna righe (marketplace, order_id, processed_at, ddt_id)"""
+
+    @abstractmethod
+    def cleanup(self, cutoff: str) -> int:
+        """Rimuove ordini processati prima di cutoff (ISO), ritorna quanti"""
+
+    @abstractmethod
+    def stats(self) -> Dict[str, int]:
+        """Numero di ordini processati per marketplace"""
+
+    @abstractmethod
+    def export(self) -> Dict[str, Dict]:
+        """Contenuto completo nel formato {marketplace: {order_id: {...}}}"""
+
+
+class JSONTrackerBackend(TrackerBackend):
+    """Backend storico: intero tracker in un file JSON riscritto ad ogni modifica"""
+
+    def __init__(self, path: str = TRACKER_FILE):
+        self.location = path
+        self._lock = threading.Lock()
         self.data = self._load_data()
-        logger.info("✅ OrderTracker inizializzato")
-    
+
     def _load_data(self) -> Dict[str, Dict]:
         """Carica dati da file JSON"""
-        if not os.path.exists(TRACKER_FILE):
+        if not os.path.exists(self.location):
             return {}
-        
+
         try:
-            with open(TRACKER_FILE, 'r') as f:
-                data = json.load(f)
-            
-            # Pulisci ordini vecchi (più di 7 giorni)
-            self._cleanup_old_orders(data)
-            
-            logger.info(f"📂 Caricati {self._count_orders(data)} ordini dal tracker")
-            return data
+            with open(self.location, 'r') as f:
+                return json.load(f)
         except Exception as e:
             logger.error(f"❌ Errore caricamento tracker: {e}")
             return {}
-    
+
     def _save_data(self):
         """Salva dati su file JSON"""
         try:
-            with open(TRACKER_FILE, 'w') as f:
+            with open(self.location, 'w') as f:
                 json.dump(self.data, f, indent=2)
-            logger.debug(f"💾 Tracker salvato ({self._count_orders(self.data)} ordini)")
         except Exception as e:
             logger.error(f"❌ Errore salvataggio tracker: {e}")
-    
+
+    def contains(self, marketplace: str, order_id: str) -> bool:
+        return order_id in self.data.get(marketplace, {})
+
+    def processed_among(self, marketplace: str, order_ids: List[str]) -> Set[str]:
+        return set(order_ids) & self.data.get(marketplace, {}).keys()
+
+    def upsert_many(self, entries: List[Tuple[str, str, str, Optional[str]]]):
+        with self._lock:
+            for marketplace, order_id, processed_at, ddt_id in entries:
+                self.data.setdefault(marketplace, {})[order_id] = {
+                    'processed_at': processed_at,
+                    'ddt_id': ddt_id
+                }
+            self._save_data()
+
+    def cleanup(self, cutoff: str) -> int:
+        removed = 0
+        with self._lock:
+            for marketplace in list(self.data.keys()):
+                for order_id in list(self.data[marketplace].keys()):
+                    processed_at = self.data[marketplace][order_id].get('processed_at', '')
+                    if processed_at < cutoff:
+                        del self.data[marketplace][order_id]
+                        removed += 1
+
+                # Rimuovi marketplace vuoti
+                if not self.data[marketplace]:
+                    del self.data[marketplace]
+
+            if removed:
+                self._save_data()
+        return removed
+
+    def stats(self) -> Dict[str, int]:
+        return {marketplace: len(orders) for marketplace, orders in self.data.items()}
+
+    def export(self) -> Dict[str, Dict]:
+        return self.data
+
+
+class SQLiteTrackerBackend(TrackerBackend):
+    """
+    Backend SQLite (WAL): una riga per ordine con chiave (marketplace, order_id).
+    Ogni scrittura tocca solo le righe interessate invece di riscrivere tutto il file.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS processed_orders (
+            marketplace TEXT NOT NULL,
+            order_id TEXT NOT NULL,
+            processed_at TEXT NOT NULL,
+            ddt_id TEXT,
+            PRIMARY KEY (marketplace, order_id)
+        );
+        CREATE INDEX IF NOT EXISTS idx_processed_orders_processed_at
+            ON processed_orders (processed_at);
+        CREATE TABLE IF NOT EXISTS tracker_meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        );
+    """
+
+    def __init__(self, db_path: str = None, json_path: str = TRACKER_FILE):
+        self.db = get_local_db(db_path)
+        self.location = self.db.path
+        self.db.executescript(self.SCHEMA)
+        self._migrate_from_json(json_path)
+
+    def _migrate_from_json(self, json_path: str):
+        """Importa una sola volta il vecchio file JSON, se presente"""
+        if self.db.query_one("SELECT value FROM tracker_meta WHERE key = 'json_migrated'"):
+            return
+        if os.path.exists(json_path):
+            try:
+                with open(json_path, 'r') as f:
+                    data = json.load(f)
+
+                entries = []
+                for marketplace, orders in data.items():
+                    for order_id, info in orders.items():
+                        entries.append((
+                            marketplace,
+                            order_id,
+                            info.get('processed_at', ''),
+                            info.get('ddt_id')
+                        ))
+
+                self.upsert_many(entries)
+                os.replace(json_path, f"{json_path}.migrated")
+                logger.info(f"📦 Migrati {len(entries)} ordini dal tracker JSON a SQLite")
+            except Exception as e:
+                logger.error(f"❌ Errore migrazione tracker JSON: {e}")
+                return
+
+        self.db.execute(
+            "INSERT OR REPLACE INTO tracker_meta (key, value) VALUES ('json_migrated', ?)",
+            (datetime.now().isoformat(),)
+        )
+
+    def contains(self, marketplace: str, order_id: str) -> bool:
+        row = self.db.query_one(
+            "SELECT 1 FROM processed_orders WHERE marketplace = ? AND order_id = ?",
+            (marketplace, order_id)
+        )
+        return row is not None
+
+    def processed_among(self, marketplace: str, order_ids: List[str]) -> Set[str]:
+        processed = set()
+        for i in range(0, len(order_ids), LOOKUP_CHUNK_SIZE):
+            chunk = order_ids[i:i + LOOKUP_CHUNK_SIZE]
+            placeholders = ','.join('?' * len(chunk))
+            rows = self.db.query(
+                f"SELECT order_id FROM processed_orders WHERE marketplace = ? AND order_id IN ({placeholders})",
+                [marketplace, *chunk]
+            )
+            processed.update(row['order_id'] for row in rows)
+        return processed
+
+    def upsert_many(self, entries: List[Tuple[str, str, str, Optional[str]]]):
+        if not entries:
+            return
+        self.db.executemany(
+            """
+            INSERT INTO processed_orders (marketplace, order_id, processed_at, ddt_id)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT (marketplace, order_id)
+            DO UPDATE SET processed_at = excluded.processed_at, ddt_id = excluded.ddt_id
+            """,
+            entries
+        )
+
+    def cleanup(self, cutoff: str) -> int:
+        # DELETE a blocchi per non tenere il lock a lungo
+        removed = 0
+        while True:
+            deleted = self.db.execute(
+                """
+                DELETE FROM processed_orders WHERE rowid IN (
+                    SELECT rowid FROM processed_orders WHERE processed_at < ? LIMIT ?
+                )
+                """,
+                (cutoff, CLEANUP_BATCH_SIZE)
+            )
+            removed += deleted
+            if deleted < CLEANUP_BATCH_SIZE:
+                return removed
+
+    def stats(self) -> Dict[str, int]:
+        rows = self.db.query(
+            "SELECT marketplace, COUNT(*) AS total FROM processed_orders GROUP BY marketplace"
+        )
+        return {row['marketplace']: row['total'] for row in rows}
+
+    def export(self) -> Dict[str, Dict]:
+        data = {}
+        for row in self.db.query("SELECT marketplace, order_id, processed_at, ddt_id FROM processed_orders"):
+            data.setdefault(row['marketplace'], {})[row['order_id']] = {
+                'processed_at': row['processed_at'],
+                'ddt_id': row['ddt_id']
+            }
+        return data
+
+
+def create_backend(kind: str = None) -> TrackerBackend:
+    """Crea il backend configurato (ORDER_TRACKER_BACKEND: 'sqlite' o 'json')"""
+    kind = (kind or ORDER_TRACKER_BACKEND).lower()
+    if kind == 'json':
+        return JSONTrackerBackend()
+    return SQLiteTrackerBackend()
+
+
+class OrderTracker:
+    """Traccia ordini già processati per evitare duplicati"""
+
+    def __init__(self, backend: TrackerBackend = None):
+        self.backend = backend or create_backend()
+        self._last_cleanup = 0.0
+        self.filter_metrics = {}
+        self._cleanup_old_orders()
+        logger.info(f"✅ OrderTracker inizializzato ({type(self.backend).__name__}: {self.backend.location})")
+
+    @property
+    def data(self) -> Dict[str, Dict]:
+        """Contenuto completo del tracker (per debug / endpoint di stato)"""
+        return self.backend.export()
+
     def _count_orders(self, data: Dict) -> int:
         """Conta totale ordini nel tracker"""
         count = 0
         for marketplace in data.values():
             count += len(marketplace)
         return count
-    
-    def _cleanup_old_orders(self, data: Dict):
-        """Rimuove ordini più vecchi di 7 giorni"""
-        cutoff = (datetime.now() - timedelta(days=7)).isoformat()
-        
-        for marketplace in list(data.keys()):
-            for order_id in list(data[marketplace].keys()):
-                processed_at = data[marketplace][order_id].get('processed_at', '')
-                if processed_at < cutoff:
-                    del data[marketplace][order_id]
-            
-            # Rimuovi marketplace vuoti
-            if not data[marketplace]:
-                del data[marketplace]
-    
+
+    def _cleanup_old_orders(self):
+        """Rimuove ordini più vecchi di 7 giorni (al massimo una volta ogni CLEANUP_INTERVAL)"""
+        now = time.monotonic()
+        if self._last_cleanup and now - self._last_cleanup < CLEANUP_INTERVAL:
+            return
+        self._last_cleanup = now
+
+        cutoff = (datetime.now() - timedelta(days=RETENTION_DAYS)).isoformat()
+        try:
+            removed = self.backend.cleanup(cutoff)
+            if removed:
+                logger.info(f"🧹 Tracker: rimossi {removed} ordini più vecchi di {RETENTION_DAYS} giorni")
+        except Exception as e:
+            logger.error(f"❌ Errore pulizia tracker: {e}")
+
     def is_processed(self, marketplace: str, order_id: str) -> bool:
         """
         Verifica se ordine è già stato processato
-        
+
         Args:
             marketplace: 'backmarket', 'refurbed', 'magento'
             order_id: ID ordine
-            
+
         Returns:
             True se già processato
         """
-        if marketplace not in self.data:
-            return False
-        
-        is_processed = order_id in self.data[marketplace]
-        
+        is_processed = self.backend.contains(marketplace, order_id)
+
         if is_processed:
             logger.info(f"⏭️ Ordine {marketplace} {order_id} già processato, skip")
-        
+
         return is_processed
-    
+
+    def partition(self, marketplace: str, order_ids: Iterable[str]) -> Tuple[List[str], List[str]]:
+        """
+        Divide una pagina di ordini in (da processare, già processati) con una sola ricerca
+
+        Args:
+            marketplace: 'backmarket', 'refurbed', 'magento'
+            order_ids: ID ordine da verificare
+
+        Returns:
+            Tuple[List[str], List[str]]: (non processati, già processati), ordine originale preservato
+        """
+        order_ids = [str(order_id) for order_id in order_ids]
+        processed = self.backend.processed_among(marketplace, list(dict.fromkeys(order_ids)))
+
+        unprocessed = [order_id for order_id in order_ids if order_id not in processed]
+        already = [order_id for order_id in order_ids if order_id in processed]
+
+        self.filter_metrics[marketplace] = {
+            'checked': len(order_ids),
+            'already_processed': len(already),
+            'to_process': len(unprocessed),
+            'at': datetime.now().isoformat()
+        }
+        logger.info(
+            f"📊 Tracker {marketplace}: {len(order_ids)} ordini controllati, "
+            f"{len(already)} già processati, {len(unprocessed)} da processare"
+        )
+        return unprocessed, already
+
+    def filter_unprocessed(self, marketplace: str, order_ids: Iterable[str]) -> List[str]:
+        """Ritorna solo gli ID non ancora processati (vedi partition)"""
+        return self.partition(marketplace, order_ids)[0]
+
     def mark_processed(self, marketplace: str, order_id: str, ddt_id: str = None):
         """
         Segna ordine come processato
-        
+
         Args:
             marketplace: 'backmarket', 'refurbed', 'magento'
             order_id: ID ordine
             ddt_id: ID DDT creato (opzionale)
         """
-        if marketplace not in self.data:
-            self.data[marketplace] = {}
-        
-        self.data[marketplace][order_id] = {
-            'processed_at': datetime.now().isoformat(),
-            'ddt_id': ddt_id
-        }
-        
-        self._save_data()
+        self.mark_processed_many(marketplace, [(order_id, ddt_id)])
         logger.info(f"✅ Ordine {marketplace} {order_id} segnato come processato (DDT: {ddt_id})")
-    
+
+    def mark_processed_many(self, marketplace: str, orders: List[Tuple[str, Optional[str]]]):
+        """
+        Segna più ordini come processati con un'unica scrittura
+
+        Args:
+            marketplace: 'backmarket', 'refurbed', 'magento'
+            orders: Lista di (order_id, ddt_id)
+        """
+        processed_at = datetime.now().isoformat()
+        entries = [(marketplace, order_id, processed_at, ddt_id) for order_id, ddt_id in orders]
+
+        try:
+            self.backend.upsert_many(entries)
+        except Exception as e:
+            logger.error(f"❌ Errore salvataggio tracker: {e}")
+
+        self._cleanup_old_orders()
+
     def get_stats(self) -> Dict:
         """Ritorna statistiche tracker"""
-        stats = {}
-        for marketplace, orders in self.data.items():
-            stats[marketplace] = len(orders)
-        return stats
\ No newline at end of file
+        return self.backend.stats()
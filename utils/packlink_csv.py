@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+CSV Packlink Pro generato in streaming dagli ordini normalizzati
+"""
+import csv
+import io
+from typing import Dict, Iterable, Iterator, List
+
+# Mittente fisso (magazzino ReflexMania)
+SENDER = {
+    'nome mittente': 'ReflexMania',
+    'Cognome mittente': 'SRL',
+    'Azienda mittente': 'ReflexMania SRL',
+    'Indirizzo Di Spedizione 1': 'Via primo maggio 16',
+    'Indirizzo Di Spedizione 2': '',
+    'CAP Spedizione': '60131',
+    'citta Spedizione': 'Ancona',
+    'provincia di Spedizione': 'AN',
+    'Paese di spedizione': 'IT',
+    'Telefono spedizione': '0712916347',
+    'Email Spedizione': 'info@reflexmania.it',
+}
+
+# Colonne nell'ordine atteso dall'import Packlink (nomi come da template, refusi inclusi)
+COLUMNS = [
+    'Numero di ordine',
+    *SENDER,
+    'Nome destinatario',
+    'Cognome destinatario',
+    'Azienda destinatario',
+    'Indirizzo di consegna 1',
+    'Indirizzo di consegna 2',
+    'CAP di consegna',
+    'citta di consegna',
+    'provincia di consegna',
+    'Paese di consegna',
+    'Telefono di consegna',
+    'Email di consegna',
+    'assicurazione',
+    'Titolo dell\'oggetto',
+    'Valore merce',
+    'Larghezza oggetto',
+    'Altezza oggetto',
+    'Lughezza oggetto',
+    'Peso dell\'oggetto',
+]
+
+# Righe scritte nel buffer prima di emettere un blocco
+CHUNK_ROWS = 200
+
+
+def packlink_row(order: Dict) -> list:
+    """Riga CSV (valori nell'ordine di COLUMNS) per un ordine normalizzato"""
+    name_parts = order['customer_name'].split()
+    first_name = name_parts[0] if name_parts else ''
+    last_name = ' '.join(name_parts[1:]) if len(name_parts) > 1 else ''
+
+    return [
+        f"{order['source']}-{order['order_id']}",
+        *SENDER.values(),
+        first_name,
+        last_name,
+        '',
+        order['address'],
+        '',
+        order['postal_code'],
+        order['city'],
+        '',
+        order['country'],
+        order['customer_phone'],
+        order['customer_email'],
+        'NO',
+        order['items'][0]['name'] if order['items'] else 'Prodotto',
+        str(int(order['total'])),
+        '20',
+        '25',
+        '29',
+        '3',
+    ]
+
+
+def packlink_rows(orders: Iterable[Dict]) -> List[list]:
+    """
+    Righe CSV per tutti gli ordini, calcolate prima di iniziare la risposta
+
+    Raises:
+        ValueError: se uno o più ordini hanno campi mancanti o non validi
+            (come prima con pandas: errore per l'intero file, nessun ordine perso)
+    """
+    rows = []
+    invalid = []
+    for order in orders:
+        try:
+            rows.append(packlink_row(order))
+        except (KeyError, TypeError, ValueError, AttributeError) as e:
+            invalid.append(f"{order.get('source')}-{order.get('order_id')} ({e!r})")
+
+    if invalid:
+        raise ValueError(f"Ordini non validi per il CSV Packlink: {', '.join(invalid)}")
+    return rows
+
+
+def iter_packlink_csv(rows: Iterable[list]) -> Iterator[bytes]:
+    """CSV Packlink (separatore ';', UTF-8) a blocchi di CHUNK_ROWS righe già validate"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=';', lineterminator='\n')
+    writer.writerow(COLUMNS)
+
+    pending = 0
+    for row in rows:
+        writer.writerow(row)
+        pending += 1
+        if pending >= CHUNK_ROWS:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
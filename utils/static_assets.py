@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Asset statici della dashboard: fingerprint, precompressione e cache HTTP
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+import threading
+import logging
+from typing import Callable, Dict, Optional
+
+try:
+    import brotli
+except ImportError:  # opzionale: senza il pacchetto si serve solo gzip
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Asset con fingerprint nel nome: il contenuto a quell'URL non cambia mai
+IMMUTABLE_CACHE = 'public, max-age=31536000, immutable'
+# Pagina HTML: sempre rivalidata (ETag -> 304 se invariata)
+REVALIDATE_CACHE = 'no-cache'
+
+
+class _Variant:
+    """Un contenuto con le sue versioni precompresse"""
+
+    __slots__ = ('raw', 'encoded', 'etag', 'mimetype')
+
+    def __init__(self, raw: bytes, mimetype: str):
+        self.raw = raw
+        self.mimetype = mimetype
+        self.etag = hashlib.sha256(raw).hexdigest()[:16]
+        self.encoded = {'gzip': gzip.compress(raw, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            self.encoded['br'] = brotli.compress(raw, quality=11)
+
+
+class StaticBundle:
+    """
+    Legge gli asset da static_dir una volta sola (al primo utilizzo) e li tiene
+    in memoria già compressi con gzip (e brotli se disponibile).
+
+    - asset_url('dashboard.js') -> '/static/dashboard.<hash>.js'
+    - la pagina HTML viene renderizzata una volta e servita con ETag
+    """
+
+    def __init__(self, static_dir: str, url_prefix: str = '/static'):
+        self.static_dir = static_dir
+        self.url_prefix = url_prefix.rstrip('/')
+        self._assets: Optional[Dict[str, _Variant]] = None
+        self._pages: Dict[str, _Variant] = {}
+        # Rientrante: il render della pagina chiama asset_url() con il lock preso
+        self._lock = threading.RLock()
+
+    def asset_url(self, name: str) -> str:
+        """URL con fingerprint del contenuto per un asset (es. 'dashboard.css')"""
+        variant = self._load()[name]
+        base, ext = os.path.splitext(name)
+        return f"{self.url_prefix}/{base}.{variant.etag}{ext}"
+
+    def page(self, key: str, render: Callable[[], str]) -> _Variant:
+        """Pagina HTML renderizzata al primo accesso e poi riusata"""
+        variant = self._pages.get(key)
+        if variant is None:
+            with self._lock:
+                variant = self._pages.get(key)
+                if variant is None:
+                    variant = _Variant(render().encode('utf-8'), 'text/html; charset=utf-8')
+                    self._pages[key] = variant
+        return variant
+
+    def resolve(self, filename: str):
+        """
+        Asset per un nome richiesto
+
+        Returns:
+            (variant, fingerprint corretto) oppure (None, False) se sconosciuto
+        """
+        assets = self._load()
+        base, ext = os.path.splitext(filename)
+        name, _, fingerprint = base.rpartition('.')
+
+        if name and f"{name}{ext}" in assets:
+            variant = assets[f"{name}{ext}"]
+            return variant, fingerprint == variant.etag
+        if filename in assets:
+            return assets[filename], False
+        return None, False
+
+    def _load(self) -> Dict[str, _Variant]:
+        if self._assets is None:
+            with self._lock:
+                if self._assets is None:
+                    assets = {}
+                    for filename in sorted(os.listdir(self.static_dir)):
+                        path = os.path.join(self.static_dir, filename)
+                        if not os.path.isfile(path):
+                            continue
+                        with open(path, 'rb') as f:
+                            raw = f.read()
+                        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+                        if mimetype.startswith('text/') or mimetype.endswith('javascript'):
+                            mimetype += '; charset=utf-8'
+                        assets[filename] = _Variant(raw, mimetype)
+                    self._assets = assets
+                    logger.info(
+                        "📦 Asset statici pronti: "
+                        + ', '.join(f"{n} ({len(v.raw)}B, gzip {len(v.encoded['gzip'])}B)" for n, v in assets.items())
+                    )
+        return self._assets
+
+
+def make_response_for(variant: _Variant, request, cache_control: str):
+    """
+    Risposta Flask per un contenuto precompresso: sceglie br/gzip in base ad
+    Accept-Encoding, imposta ETag e risponde 304 se il client ha già la versione
+    """
+    from flask import Response
+
+    accepted = request.accept_encodings
+    encoding = None
+    for candidate in ('br', 'gzip'):
+        if candidate in variant.encoded and accepted[candidate]:
+            encoding = candidate
+            break
+
+    body = variant.encoded[encoding] if encoding else variant.raw
+    response = Response(body, mimetype=None, content_type=variant.mimetype)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Cache-Control'] = cache_control
+    response.set_etag(f"{variant.etag}-{encoding or 'identity'}")
+    return response.make_conditional(request)
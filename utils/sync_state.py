@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Cursori di sincronizzazione incrementale (high-water mark) per canale
+"""
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+import logging
+
+from config import SYNC_FULL_RECONCILE_MINUTES, SYNC_OVERLAP_MINUTES
+from utils.local_db import get_local_db
+
+logger = logging.getLogger(__name__)
+
+
+class SyncState:
+    """
+    Memorizza per ogni canale l'ultimo punto sincronizzato (data di modifica
+    o cursore di paginazione) e quando è stata fatta l'ultima riconciliazione completa.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS sync_cursors (
+            channel TEXT PRIMARY KEY,
+            cursor TEXT,
+            last_full_sync TEXT,
+            updated_at TEXT NOT NULL
+        );
+    """
+
+    def __init__(self, db_path: str = None):
+        self.db = get_local_db(db_path)
+        self.db.executescript(self.SCHEMA)
+
+    def get_cursor(self, channel: str) -> Optional[str]:
+        """Ritorna l'ultimo cursore salvato per il canale (None se mai sincronizzato)"""
+        row = self.db.query_one("SELECT cursor FROM sync_cursors WHERE channel = ?", (channel,))
+        return row['cursor'] if row else None
+
+    def needs_full_sync(self, channel: str) -> bool:
+        """
+        True se serve una riconciliazione completa: nessun cursore salvato
+        oppure ultima riconciliazione più vecchia di SYNC_FULL_RECONCILE_MINUTES
+        """
+        row = self.db.query_one(
+            "SELECT cursor, last_full_sync FROM sync_cursors WHERE channel = ?", (channel,)
+        )
+        # Un cursore vuoto dopo una riconciliazione (canale senza ordini) non
+        # obbliga a ripeterla ad ogni giro: conta solo last_full_sync
+        if not row or not row['last_full_sync']:
+            return True
+
+        cutoff = (datetime.now() - timedelta(minutes=SYNC_FULL_RECONCILE_MINUTES)).isoformat()
+        return row['last_full_sync'] < cutoff
+
+    def set_cursor(self, channel: str, cursor: Optional[str], full_sync: bool = False):
+        """
+        Aggiorna il cursore del canale
+
+        Args:
+            channel: 'backmarket', 'refurbed', 'magento'
+            cursor: Nuovo cursore (se None viene mantenuto quello attuale)
+            full_sync: True se il cursore deriva da una riconciliazione completa
+        """
+        now = datetime.now().isoformat()
+        self.db.execute(
+            """
+            INSERT INTO sync_cursors (channel, cursor, last_full_sync, updated_at)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT (channel) DO UPDATE SET
+                cursor = COALESCE(excluded.cursor, sync_cursors.cursor),
+                last_full_sync = COALESCE(excluded.last_full_sync, sync_cursors.last_full_sync),
+                updated_at = excluded.updated_at
+            """,
+            (channel, cursor, now if full_sync else None, now)
+        )
+        logger.info(f"🔖 Cursore sync {channel}: {cursor} ({'completa' if full_sync else 'incrementale'})")
+
+
+def latest_timestamp(values) -> Optional[str]:
+    """Ritorna il timestamp più recente tra le stringhe ISO/MySQL fornite (ignora i vuoti)"""
+    return _pick_timestamp(values, latest=True)
+
+
+def earliest_timestamp(values) -> Optional[str]:
+    """Ritorna il timestamp più vecchio tra le stringhe ISO/MySQL fornite (ignora i vuoti)"""
+    return _pick_timestamp(values, latest=False)
+
+
+def _pick_timestamp(values, latest: bool) -> Optional[str]:
+    chosen = None
+    chosen_dt = None
+    for value in values:
+        parsed = _parse_timestamp(value)
+        if parsed is None:
+            continue
+        if parsed.tzinfo is not None:
+            parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+        if chosen_dt is None or (parsed > chosen_dt if latest else parsed < chosen_dt):
+            chosen, chosen_dt = value, parsed
+    return chosen
+
+
+def with_overlap(cursor: str) -> str:
+    """
+    Arretra il cursore di SYNC_OVERLAP_MINUTES per non perdere ordini
+    modificati a cavallo dell'ultima sincronizzazione
+
+    Returns:
+        Data in formato 'YYYY-MM-DD HH:MM:SS'
+    """
+    parsed = _parse_timestamp(cursor)
+    if parsed is None:
+        return cursor
+    return (parsed - timedelta(minutes=SYNC_OVERLAP_MINUTES)).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _parse_timestamp(value) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(str(value).replace(' ', 'T').replace('Z', '+00:00'))
+    except ValueError:
+        return None